@@ -0,0 +1,149 @@
+"""
+Latency and accuracy parity of the inference backends.
+
+Each configuration (see `core_server.backends`) parses the same screenshots. Latency is
+reported per stage from the parse traces. Parity is measured against the first
+configuration on identical inputs:
+- detection: detector boxes greedily matched at --match-iou, recall / precision / mean IoU
+- captions: the reference's icon crops captioned by each configuration, exact-match rate
+
+    python -m benchmarks.bench_backends --images path/to/screenshots
+    python -m benchmarks.bench_backends --configs torch onnx onnx-int8 --output backends.json
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import argparse
+import gc
+import json
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.ops import box_iou
+
+from core_server.core import ImageProcessor, ParseJob
+from core_server.imaging import load_image
+from core_server.metrics import Trace
+from core_server.constants import ICON_DETECT_MODEL_PATH
+from benchmarks.bench_batching import percentile
+from benchmarks.synthetic import RESOLUTIONS, DENSITIES, make_screenshot
+
+CONFIGS = {
+    "torch": ("torch", False),
+    "torch-int8": ("torch", True),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True)
+}
+
+
+def match_boxes(reference: torch.Tensor, candidate: torch.Tensor, min_iou: float) -> Tuple[int, List[float]]:
+    """
+    Greedy one-to-one matching by descending IoU, returns the match count and matched IoUs
+    """
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0, []
+    iou = box_iou(reference, candidate)
+    pairs = (iou >= min_iou).nonzero().tolist()
+    pairs.sort(key=lambda pair: -iou[pair[0], pair[1]].item())
+    used_ref, used_cand, matched = set(), set(), []
+    for r, c in pairs:
+        if r not in used_ref and c not in used_cand:
+            used_ref.add(r)
+            used_cand.add(c)
+            matched.append(iou[r, c].item())
+    return len(matched), matched
+
+
+def run_config(processor: ImageProcessor, images: List[Image.Image], iterations: int) -> Dict[str, Any]:
+    timings: Dict[str, List[float]] = {}
+    end_to_end = []
+    for _ in range(iterations):
+        for image in images:
+            trace = Trace()
+            start = time.perf_counter()
+            result = processor.process_batch([ParseJob(image=image, trace=trace, render=False)])[0]
+            if isinstance(result, Exception):
+                raise result
+            end_to_end.append(time.perf_counter() - start)
+            for stage, seconds in trace.stages.items():
+                timings.setdefault(stage, []).append(seconds)
+    return {
+        "end_to_end_p50_ms": percentile(end_to_end, 50) * 1000,
+        "end_to_end_p90_ms": percentile(end_to_end, 90) * 1000,
+        "stages_p50_ms": {stage: percentile(values, 50) * 1000 for stage, values in timings.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help="Directory of screenshots, synthetic 1080p screenshots when omitted")
+    parser.add_argument('--synthetic', type=int, default=4, help="Number of synthetic screenshots")
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=['torch', 'onnx', 'onnx-int8'])
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--box-threshold', type=float, default=0.01)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--match-iou', type=float, default=0.9)
+    parser.add_argument('--output', default='bench_backends.json')
+    args = parser.parse_args()
+
+    if args.images:
+        paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in ('.png', '.jpg', '.jpeg'))
+        images = [load_image(p) for p in paths]
+    else:
+        images = [make_screenshot(*RESOLUTIONS['1080p'], DENSITIES['normal'], seed=seed)[0] for seed in range(args.synthetic)]
+    weights = str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH)
+
+    report, reference = {"images": len(images), "configs": {}}, None
+    for name in args.configs:
+        backend, quantize = CONFIGS[name]
+        processor = ImageProcessor(icon_detect_model_path=weights, backend=backend, quantize=quantize)
+        processor.process_batch([ParseJob(image=images[0], render=False)])
+
+        entry = run_config(processor, images, args.iterations)
+        detections = [processor._detect_icons([image], args.box_threshold, args.imgsz)[0] for image in images]
+        if reference is None:
+            # Captions are compared on the reference's crops so detector differences don't leak in
+            crops = []
+            for image, boxes in zip(images, detections):
+                w, h = image.size
+                elements = [{'bbox': box} for box in (boxes / torch.Tensor([w, h, w, h])).tolist()]
+                crops.extend(processor._crop_icons(np.asarray(image), elements))
+            captions = processor._caption_crops(crops, 32)
+            reference = {"detections": detections, "crops": crops, "captions": captions}
+        else:
+            captions = processor._caption_crops(reference["crops"], 32)
+            matched, ious, ref_total, cand_total = 0, [], 0, 0
+            for ref_boxes, boxes in zip(reference["detections"], detections):
+                count, matched_ious = match_boxes(ref_boxes, boxes, args.match_iou)
+                matched += count
+                ious.extend(matched_ious)
+                ref_total += len(ref_boxes)
+                cand_total += len(boxes)
+            entry["parity"] = {
+                "detection_recall": matched / ref_total if ref_total else 1.0,
+                "detection_precision": matched / cand_total if cand_total else 1.0,
+                "detection_mean_iou": statistics.mean(ious) if ious else None,
+                "caption_exact_match": (
+                    sum(a == b for a, b in zip(reference["captions"], captions)) / len(captions) if captions else 1.0
+                )
+            }
+        report["configs"][name] = entry
+
+        stages = ' '.join(f"{stage}={ms:.0f}" for stage, ms in entry["stages_p50_ms"].items())
+        parity = entry.get("parity")
+        print(f"{name:<11} e2e p50={entry['end_to_end_p50_ms']:.0f}ms {stages}" + (
+            f" | recall={parity['detection_recall']:.3f} precision={parity['detection_precision']:.3f}"
+            f" captions={parity['caption_exact_match']:.3f}" if parity else " | reference"
+        ))
+        del processor
+        gc.collect()
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Throughput vs. latency of the cross-request micro-batcher.
+
+Runs N concurrent clients against `MicroBatcher(ImageProcessor.process_batch)` for several
+max batch sizes / wait times and prints requests per second and latency percentiles.
+
+    python -m benchmarks.bench_batching --images path/to/screenshots
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+import argparse
+import json
+import statistics
+import time
+
+from core_server.batching import MicroBatcher
+from core_server.core import ImageProcessor, ParseJob
+from core_server.constants import ICON_DETECT_MODEL_PATH
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_level(batcher: MicroBatcher, image_paths: List[str], concurrency: int, requests_per_client: int) -> dict:
+    def client(client_id: int) -> List[float]:
+        latencies = []
+        for n in range(requests_per_client):
+            image_path = image_paths[(client_id + n) % len(image_paths)]
+            job = ParseJob(image=image_path)
+            start = time.perf_counter()
+            batcher.submit(job).result()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [lat for client_lats in pool.map(client, range(concurrency)) for lat in client_lats]
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_p50_s": statistics.median(latencies),
+        "latency_p95_s": percentile(latencies, 95),
+        "mean_batch_size": batcher.stats()["mean_batch_size"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help="Directory of screenshots to parse")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--max-wait-ms', type=float, nargs='+', default=[10, 30])
+    parser.add_argument('--requests-per-client', type=int, default=4)
+    args = parser.parse_args()
+
+    image_paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in ('.png', '.jpg', '.jpeg'))
+    processor = ImageProcessor(icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH))
+    # Warm up so lazy model initialisation is not counted
+    processor.process_batch([ParseJob(image=image_paths[0])])
+
+    rows = []
+    for max_batch_size in args.batch_sizes:
+        for max_wait_ms in (args.max_wait_ms if max_batch_size > 1 else [0]):
+            for concurrency in args.concurrency:
+                batcher = MicroBatcher(processor.process_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+                row = run_level(batcher, image_paths, concurrency, args.requests_per_client)
+                batcher.close()
+                row.update(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+                rows.append(row)
+                print(f"batch={max_batch_size:<3} wait={max_wait_ms:<5} clients={concurrency:<3} "
+                      f"rps={row['throughput_rps']:.2f} p50={row['latency_p50_s']:.2f}s "
+                      f"p95={row['latency_p95_s']:.2f}s mean_batch={row['mean_batch_size']:.1f}")
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Speedup of session-mode incremental parsing on mostly-static frame sequences.
+
+Builds a sequence from one screenshot by opening a small "dropdown" (a filled box with text)
+at a different spot on every frame, then times a full parse of each frame against
+`IncrementalParser.parse` over the same sequence.
+
+    python -m benchmarks.bench_incremental --image path/to/screenshot.png --frames 10
+"""
+from pathlib import Path
+from typing import List
+import argparse
+import json
+import random
+import statistics
+import time
+
+from PIL import Image, ImageDraw
+
+from core_server.core import ImageProcessor, ParseJob
+from core_server.sessions import IncrementalParser, SessionStore
+from core_server.constants import ICON_DETECT_MODEL_PATH
+
+
+def make_frames(base: Image.Image, count: int, changed_fraction: float, seed: int = 0) -> List[Image.Image]:
+    rng = random.Random(seed)
+    w, h = base.size
+    box_w = int(w * changed_fraction ** 0.5)
+    box_h = int(h * changed_fraction ** 0.5)
+    frames = [base]
+    for n in range(1, count):
+        frame = base.copy()
+        x, y = rng.randint(0, w - box_w), rng.randint(0, h - box_h)
+        draw = ImageDraw.Draw(frame)
+        draw.rectangle([x, y, x + box_w, y + box_h], fill=(245, 245, 245), outline=(90, 90, 90))
+        for line in range(min(5, box_h // 24)):
+            draw.text((x + 10, y + 8 + line * 24), f"Menu item {n}.{line}", fill=(20, 20, 20))
+        frames.append(frame)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="Base screenshot")
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--changed-fraction', type=float, default=0.03, help="Share of the frame changed per step")
+    args = parser.parse_args()
+
+    processor = ImageProcessor(icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH))
+    frames = make_frames(Image.open(args.image).convert('RGB'), args.frames, args.changed_fraction)
+    # Warm up so lazy model initialisation is not counted
+    processor.parse_batch([ParseJob(image=frames[0])])
+
+    full_times = []
+    for frame in frames[1:]:
+        start = time.perf_counter()
+        processor.process_image(frame)
+        full_times.append(time.perf_counter() - start)
+
+    incremental = IncrementalParser(processor, SessionStore())
+    incremental.parse('bench', ParseJob(image=frames[0]))
+    incremental_times, reused_ratios = [], []
+    for frame in frames[1:]:
+        start = time.perf_counter()
+        _, _, elements, info = incremental.parse('bench', ParseJob(image=frame))
+        incremental_times.append(time.perf_counter() - start)
+        reused_ratios.append(info['reused'] / max(1, len(elements)))
+
+    summary = {
+        "frames": len(frames) - 1,
+        "changed_fraction": args.changed_fraction,
+        "full_mean_s": statistics.mean(full_times),
+        "incremental_mean_s": statistics.mean(incremental_times),
+        "speedup": statistics.mean(full_times) / statistics.mean(incremental_times),
+        "mean_reused_ratio": statistics.mean(reused_ratios)
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
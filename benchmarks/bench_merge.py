@@ -0,0 +1,158 @@
+"""
+Parity and scaling of the vectorized box merge (`core_server.overlap`) against
+OmniParser's `remove_overlap_new`.
+
+Parity: randomized cases compared for exact equality with the reference. The cases
+cover nested and duplicate boxes, boxes snapped to a coarse grid so edges coincide,
+empty OCR text, and negative thresholds, on both the dense and the grid-prefiltered
+path. Any mismatch is printed and the exit status is 1.
+
+Scaling: dense-screen layouts (rows of OCR words plus icons) from 100 to 10k boxes. The
+Python reference is only timed up to --reference-max boxes, because it is quadratic.
+
+    python -m benchmarks.bench_merge
+    python -m benchmarks.bench_merge --cases 20000 --sizes 1000 5000 10000 --output merge.json
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import copy
+import json
+import random
+import sys
+import time
+
+from OmniParser.utils import remove_overlap_new
+
+from core_server import overlap
+from core_server.overlap import merge_elements
+
+
+def reference_merge(icons: List[Dict[str, Any]], ocr: List[Dict[str, Any]], iou_threshold: float) -> List[Dict[str, Any]]:
+    # remove_overlap_new mutates nothing it returns, but copy anyway so both sides see pristine input
+    result = remove_overlap_new(boxes=copy.deepcopy(icons), iou_threshold=iou_threshold, ocr_bbox=copy.deepcopy(ocr) or None)
+    return [
+        elem if isinstance(elem, dict) else
+        {'type': 'icon', 'bbox': elem, 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'}
+        for elem in result
+    ]
+
+
+def random_case(rng: random.Random) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], float]:
+    snapped = rng.random() < 0.5
+
+    def coord() -> float:
+        return rng.randint(0, 20) / 20 if snapped else rng.random()
+
+    def box() -> List[float]:
+        x1, x2 = sorted((coord(), coord()))
+        y1, y2 = sorted((coord(), coord()))
+        if x2 - x1 < 0.01 or y2 - y1 < 0.01:
+            return [0.1, 0.1, 0.2, 0.2]
+        return [x1, y1, x2, y2]
+
+    icons = [{'type': 'icon', 'bbox': box(), 'interactivity': True, 'content': None} for _ in range(rng.randint(0, 30))]
+    ocr = [
+        {'type': 'text', 'bbox': box(), 'interactivity': False, 'content': rng.choice(['a', 'b', '']), 'source': 'box_ocr_content_ocr'}
+        for _ in range(rng.randint(0, 30))
+    ]
+    if icons and rng.random() < 0.3:
+        icons.append(copy.deepcopy(rng.choice(icons)))
+    if ocr and rng.random() < 0.3:
+        ocr.append(copy.deepcopy(rng.choice(ocr)))
+    for icon in icons[:rng.randint(0, 3)]:
+        x1, y1, x2, y2 = icon['bbox']
+        inset = min(x2 - x1, y2 - y1) / 10
+        ocr.insert(rng.randint(0, len(ocr)), {
+            'type': 'text', 'bbox': [x1 + inset, y1 + inset, x2 - inset, y2 - inset],
+            'interactivity': False, 'content': 'inside', 'source': 'box_ocr_content_ocr'
+        })
+    return icons, ocr, rng.choice([0.9, 0.7, 0.5, 0.1, 0.0, -0.1])
+
+
+def check_parity(cases: int, seed: int) -> int:
+    dense_max_pairs = overlap.DENSE_MAX_PAIRS
+    mismatches = 0
+    try:
+        for case in range(cases):
+            rng = random.Random(seed + case)
+            icons, ocr, iou_threshold = random_case(rng)
+            expected = reference_merge(icons, ocr, iou_threshold)
+            # Alternate between the dense path and the grid prefilter
+            overlap.DENSE_MAX_PAIRS = dense_max_pairs if case % 2 else 0
+            if merge_elements(icons, ocr, iou_threshold) != expected:
+                mismatches += 1
+                print(f"Mismatch in case {case} (seed {seed + case}, {len(icons)} icons, {len(ocr)} OCR boxes, iou_threshold={iou_threshold})")
+    finally:
+        overlap.DENSE_MAX_PAIRS = dense_max_pairs
+    return mismatches
+
+
+def dense_screen(total: int, seed: int = 0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Spreadsheet/IDE-like layout: rows of OCR words, with every fifth box an icon
+    detected around a word or standing alone
+    """
+    rng = random.Random(seed)
+    rows = max(1, int((total / 12) ** 0.5 * 1.5))
+    per_row = max(1, total // rows)
+    icons, ocr = [], []
+    for n in range(total):
+        row, col = divmod(n, per_row)
+        x = col / per_row + rng.random() * 0.2 / per_row
+        y = row / rows + rng.random() * 0.2 / rows
+        w, h = 0.7 / per_row * rng.uniform(0.6, 1.0), 0.6 / rows
+        if n % 5 == 0:
+            pad = rng.choice([0.0, 0.1]) * w
+            icons.append({'type': 'icon', 'bbox': [x - pad, y - pad, x + w + pad, y + h + pad], 'interactivity': True, 'content': None})
+        else:
+            ocr.append({'type': 'text', 'bbox': [x, y, x + w, y + h], 'interactivity': False, 'content': f"w{n}", 'source': 'box_ocr_content_ocr'})
+    return icons, ocr
+
+
+def time_call(fn, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=5000, help="Randomized parity cases")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument('--reference-max', type=int, default=3000, help="Largest box count the Python reference is timed on")
+    parser.add_argument('--iou-threshold', type=float, default=0.7)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    mismatches = check_parity(args.cases, args.seed)
+    print(f"Parity: {args.cases - mismatches}/{args.cases} randomized cases identical to remove_overlap_new")
+
+    rows = []
+    for total in args.sizes:
+        icons, ocr = dense_screen(total)
+        row = {"boxes": total, "icons": len(icons), "ocr": len(ocr)}
+        row["vectorized_ms"] = time_call(merge_elements, icons, ocr, args.iou_threshold) * 1000
+        if total <= args.reference_max:
+            expected = reference_merge(icons, ocr, args.iou_threshold)
+            row["identical"] = merge_elements(icons, ocr, args.iou_threshold) == expected
+            mismatches += not row["identical"]
+            row["reference_ms"] = time_call(reference_merge, icons, ocr, args.iou_threshold, repeat=1) * 1000
+            row["speedup"] = row["reference_ms"] / row["vectorized_ms"]
+        rows.append(row)
+        print(f"{total:>6} boxes  vectorized={row['vectorized_ms']:9.2f}ms" + (
+            f"  reference={row['reference_ms']:10.1f}ms  speedup={row['speedup']:7.1f}x  identical={row['identical']}"
+            if "reference_ms" in row else ""
+        ))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"parity_cases": args.cases, "mismatches": mismatches, "scaling": rows}, f, indent=2)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
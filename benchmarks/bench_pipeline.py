@@ -0,0 +1,230 @@
+"""
+End-to-end pipeline benchmark on synthetic screenshots.
+
+For every (resolution, density) scenario this collects the per-stage trace of each parse
+(decode, OCR, detection, overlap merge, captioning, rendering) over repeated parses, then
+drives the FastAPI app in-process with N concurrent clients for throughput and latency.
+Results, including peak memory, are written as JSON; `--compare` diffs two such files.
+
+    python -m benchmarks.bench_pipeline --models stub --output bench.json
+    python -m benchmarks.bench_pipeline --models real --resolutions 1080p --concurrency 1 4
+    python -m benchmarks.bench_pipeline --compare before.json after.json
+
+`--models auto` (the default) uses the real weights when they are present and the
+stand-ins from `benchmarks.stubs` otherwise.
+"""
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import time
+
+from core_server.core import ImageProcessor, ParseJob
+from core_server.metrics import Trace
+from core_server.constants import ICON_DETECT_MODEL_PATH
+from core_server import runtime
+from benchmarks.bench_batching import percentile
+from benchmarks.synthetic import RESOLUTIONS, DENSITIES, make_screenshot, scenarios
+
+STAGES = ["decode", "ocr", "detection", "merge", "captioning", "render"]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.mean(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p90_ms": percentile(values, 90) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000
+    }
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+def build_processor(models: str, args) -> ImageProcessor:
+    weights = Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH
+    if models == 'auto':
+        models = 'real' if weights.exists() else 'stub'
+    if models == 'real':
+        return ImageProcessor(icon_detect_model_path=str(weights))
+    from benchmarks.stubs import StubImageProcessor
+    return StubImageProcessor(ocr_ms=args.stub_ocr_ms, detect_ms=args.stub_detect_ms, caption_ms=args.stub_caption_ms)
+
+
+def encode_png(image) -> bytes:
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def run_stages(processor: ImageProcessor, images: List[bytes], iterations: int) -> Dict[str, Any]:
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    end_to_end, elements = [], []
+    for _ in range(iterations):
+        for image_bytes in images:
+            trace = Trace()
+            start = time.perf_counter()
+            result = processor.process_batch([ParseJob(image=image_bytes, trace=trace)])[0]
+            if isinstance(result, Exception):
+                raise result
+            end_to_end.append(time.perf_counter() - start)
+            elements.append(len(result[2]))
+            for stage, seconds in trace.stages.items():
+                timings.setdefault(stage, []).append(seconds)
+    return {
+        "stages": {stage: summarize(values) for stage, values in timings.items()},
+        "end_to_end": summarize(end_to_end),
+        "mean_elements": statistics.mean(elements)
+    }
+
+
+async def run_clients(app, images: List[bytes], concurrency: int, requests_per_client: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies, errors = [], 0
+
+    async def client(client_id: int, http: "httpx.AsyncClient") -> None:
+        nonlocal errors
+        for n in range(requests_per_client):
+            image_bytes = images[(client_id + n) % len(images)]
+            start = time.perf_counter()
+            response = await http.post(
+                "/parse-screenshot",
+                files={"file": ("bench.png", image_bytes, "image/png")},
+                params={"use_cache": "false"}
+            )
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(c, http) for c in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency": summarize(latencies)
+    }
+
+
+def metadata(models: str) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import torch
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": commit or None,
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpus": os.cpu_count(),
+        "models": models
+    }
+
+
+def compare(baseline_path: str, current_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {s["name"]: s for s in json.load(f)["scenarios"]}
+    with open(current_path) as f:
+        current = {s["name"]: s for s in json.load(f)["scenarios"]}
+
+    def row(label: str, before: Dict[str, float], after: Dict[str, float]) -> None:
+        if not before.get("count") or not after.get("count"):
+            return
+        ratio = after["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float('inf')
+        print(f"  {label:<22} p50 {before['p50_ms']:9.1f} -> {after['p50_ms']:9.1f} ms  ({ratio:5.2f}x)")
+
+    for name in [n for n in current if n in baseline]:
+        print(name)
+        for stage, after in current[name]["stages"].items():
+            row(stage, baseline[name]["stages"].get(stage, {}), after)
+        row("end_to_end", baseline[name]["end_to_end"], current[name]["end_to_end"])
+        before_levels = {level["concurrency"]: level for level in baseline[name].get("app", [])}
+        for level in current[name].get("app", []):
+            before = before_levels.get(level["concurrency"])
+            if before:
+                print(f"  clients={level['concurrency']:<3}            rps {before['throughput_rps']:9.2f} -> {level['throughput_rps']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', choices=['auto', 'real', 'stub'], default='auto')
+    parser.add_argument('--resolutions', nargs='+', choices=list(RESOLUTIONS), default=['720p', '1080p', '1440p'])
+    parser.add_argument('--densities', nargs='+', choices=list(DENSITIES), default=['sparse', 'normal', 'dense'])
+    parser.add_argument('--images', type=int, default=3, help="Distinct screenshots per scenario")
+    parser.add_argument('--iterations', type=int, default=3, help="Parses of each screenshot for the stage timings")
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 4, 8], help="Client counts against the app, none to skip")
+    parser.add_argument('--requests-per-client', type=int, default=4)
+    parser.add_argument('--stub-ocr-ms', type=float, default=150)
+    parser.add_argument('--stub-detect-ms', type=float, default=60)
+    parser.add_argument('--stub-caption-ms', type=float, default=10)
+    parser.add_argument('--output', default='bench_pipeline.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Print the difference of two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    processor = build_processor(args.models, args)
+    models = 'real' if type(processor) is ImageProcessor else 'stub'
+    app = None
+    if args.concurrency:
+        # The server module picks up an already built processor instead of loading its own
+        runtime.PRELOADED_PROCESSOR = processor
+        from core_server import server
+        server.UPLOAD_ARTIFACTS = None
+        server.CAPTION_CACHE = processor.caption_cache = None
+        app = server.app
+
+    report = {"meta": metadata(models), "scenarios": []}
+    for name, (width, height), density in scenarios(args.resolutions, args.densities):
+        images = [encode_png(make_screenshot(width, height, density, seed=seed)[0]) for seed in range(args.images)]
+        # Warm up so lazy initialisation is not counted
+        processor.process_batch([ParseJob(image=images[0])])
+
+        scenario = {"name": name, "width": width, "height": height, "density": density}
+        scenario.update(run_stages(processor, images, args.iterations))
+        if app is not None:
+            scenario["app"] = [
+                asyncio.run(run_clients(app, images, concurrency, args.requests_per_client))
+                for concurrency in args.concurrency
+            ]
+        scenario["peak_rss_mib"] = peak_rss_mib()
+        report["scenarios"].append(scenario)
+
+        stages = scenario["stages"]
+        print(f"{name:<16} e2e p50={scenario['end_to_end']['p50_ms']:.0f}ms "
+              + ' '.join(f"{stage}={stages[stage]['p50_ms']:.0f}" for stage in stages if stages[stage]["count"])
+              + f" elements={scenario['mean_elements']:.0f} peak_rss={scenario['peak_rss_mib']:.0f}MiB")
+        for level in scenario.get("app", []):
+            print(f"{'':<16} clients={level['concurrency']:<3} rps={level['throughput_rps']:.2f} "
+                  f"p50={level['latency']['p50_ms']:.0f}ms p99={level['latency']['p99_ms']:.0f}ms errors={level['errors']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Stand-in models for benchmarking without weights.
+
+`StubImageProcessor` runs the real pipeline (decode, overlap merge, cropping, caption cache,
+rendering) but replaces EasyOCR, YOLO and Florence with connected components on the
+synthetic screenshots plus a fixed simulated latency, so stage costs outside the models
+can be measured anywhere.
+"""
+from typing import Callable, List, Optional, Tuple
+import time
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from core_server.core import ImageProcessor
+
+
+def find_components(image: Image.Image) -> List[List[int]]:
+    """
+    xyxy pixel boxes of the foreground blobs, glyphs of one word joined by a horizontal dilation
+    """
+    gray = np.asarray(image.convert('L'))
+    mask = (gray < 200).astype(np.uint8)
+    mask = cv2.dilate(mask, np.ones((3, 9), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    boxes = []
+    for x, y, w, h, area in stats[1:count]:
+        if area >= 20:
+            boxes.append([int(x), int(y), int(x + w), int(y + h)])
+    return boxes
+
+
+class StubImageProcessor(ImageProcessor):
+    """
+    ImageProcessor with model stages replaced by `find_components` and sleeps
+
+    Args:
+        ocr_ms: Simulated OCR latency per image
+        detect_ms: Simulated detector latency per image
+        caption_ms: Simulated caption latency per icon crop
+    """
+
+    def __init__(self, ocr_ms: float = 150, detect_ms: float = 60, caption_ms: float = 10, caption_cache=None):
+        self.ocr_ms = ocr_ms
+        self.detect_ms = detect_ms
+        self.caption_ms = caption_ms
+        super().__init__(icon_detect_model_path='', device=torch.device('cpu'), caption_cache=caption_cache)
+
+    def _load_models(self, icon_detect_model_path: str, icon_caption_model_name: str, icon_caption_model_path: str) -> None:
+        self.icon_detect_model = None
+        self.icon_caption_model = None
+
+    def _run_ocr(self, image: Image.Image, use_paddleocr: bool) -> Tuple[List[str], List[List[float]]]:
+        time.sleep(self.ocr_ms / 1000)
+        # Wide, short blobs are text lines
+        boxes = [box for box in find_components(image) if box[2] - box[0] >= 3 * (box[3] - box[1])]
+        return [f"text {n}" for n in range(len(boxes))], boxes
+
+    def _detect_icons(self, images: List[Image.Image], box_threshold: float, imgsz: int) -> List[torch.Tensor]:
+        detections = []
+        for image in images:
+            time.sleep(self.detect_ms / 1000)
+            detections.append(torch.tensor(find_components(image), dtype=torch.float32).reshape(-1, 4))
+        return detections
+
+    def _caption_crops(
+        self,
+        crops: List[Image.Image],
+        batch_size: int,
+        on_batch: Optional[Callable[[List[Tuple[int, str]]], None]] = None
+    ) -> List[str]:
+        captions = []
+        for start in range(0, len(crops), batch_size):
+            batch = crops[start:start + batch_size]
+            time.sleep(self.caption_ms * len(batch) / 1000)
+            texts = [f"icon {int(np.asarray(crop).mean())}" for crop in batch]
+            captions.extend(texts)
+            if on_batch:
+                on_batch([(start + offset, text) for offset, text in enumerate(texts)])
+        return captions
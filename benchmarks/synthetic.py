@@ -0,0 +1,102 @@
+"""
+Synthetic UI screenshots for benchmarking: a title bar, a sidebar and a content grid of
+text lines, buttons and icons. `density` is the share of grid cells holding a widget.
+"""
+from typing import Dict, List, Tuple
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160)
+}
+DENSITIES = {"sparse": 0.15, "normal": 0.4, "dense": 0.85}
+
+WORDS = [
+    "File", "Edit", "View", "Settings", "Search", "Open", "Save", "Cancel", "Submit", "Profile",
+    "Messages", "Downloads", "Library", "Account", "Help", "Share", "Export", "Import", "Delete", "Next"
+]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _icon(draw: ImageDraw.ImageDraw, rng: random.Random, x: int, y: int, size: int) -> None:
+    color = tuple(rng.randint(30, 200) for _ in range(3))
+    shape = rng.randint(0, 3)
+    if shape == 0:
+        draw.ellipse([x, y, x + size, y + size], fill=color)
+    elif shape == 1:
+        draw.rectangle([x + size // 6, y + size // 6, x + size - size // 6, y + size - size // 6], outline=color, width=max(2, size // 10))
+    elif shape == 2:
+        draw.polygon([(x + size // 2, y), (x + size, y + size), (x, y + size)], fill=color)
+    else:
+        for row in range(3):
+            draw.line([x, y + size * (row + 1) // 4, x + size, y + size * (row + 1) // 4], fill=color, width=max(2, size // 8))
+
+
+def make_screenshot(width: int, height: int, density: float, seed: int = 0) -> Tuple[Image.Image, List[Dict]]:
+    """
+    Draw a synthetic screenshot
+
+    Returns:
+        The RGB image and the drawn widgets as {'type': text|button|icon, 'bbox': xyxy pixels}
+    """
+    rng = random.Random(seed)
+    # UI scaling as on a high-DPI display
+    scale = max(1, height // 1080)
+    font = ImageFont.load_default(size=13 * scale)
+    image = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    widgets = []
+
+    def text(x: int, y: int, label: str, fill) -> None:
+        draw.text((x, y), label, fill=fill, font=font)
+        widgets.append({'type': 'text', 'bbox': list(draw.textbbox((x, y), label, font=font))})
+
+    # Title bar and sidebar
+    bar_h, side_w = 40 * scale, 220 * scale
+    draw.rectangle([0, 0, width, bar_h], fill=(235, 235, 240))
+    draw.rectangle([0, bar_h, side_w, height], fill=(242, 242, 246))
+    for n, x in enumerate(range(12 * scale, 12 * scale + 5 * 70 * scale, 70 * scale)):
+        text(x, 12 * scale, WORDS[n], (30, 30, 30))
+    for y in range(bar_h + 20 * scale, height - 30 * scale, 36 * scale):
+        icon = 18 * scale
+        _icon(draw, rng, 12 * scale, y, icon)
+        widgets.append({'type': 'icon', 'bbox': [12 * scale, y, 12 * scale + icon, y + icon]})
+        text(22 * scale + icon, y + 2 * scale, _text(rng, rng.randint(1, 2)), (40, 40, 40))
+
+    # Content grid, widgets placed on a random subset of the cells
+    cell_w, cell_h = 150 * scale, 40 * scale
+    cells = [
+        (x, y)
+        for y in range(bar_h + 16 * scale, height - cell_h, cell_h)
+        for x in range(side_w + 16 * scale, width - cell_w, cell_w)
+    ]
+    rng.shuffle(cells)
+    for x, y in cells[:int(density * len(cells))]:
+        kind = rng.choices(['text', 'button', 'icon'], weights=[5, 3, 2])[0]
+        if kind == 'text':
+            text(x, y + 8 * scale, _text(rng, rng.randint(1, 2)), (20, 20, 20))
+        elif kind == 'button':
+            bw, bh = 120 * scale, 30 * scale
+            draw.rounded_rectangle([x, y, x + bw, y + bh], radius=6 * scale, fill=(66, 133, 244))
+            draw.text((x + 12 * scale, y + 7 * scale), rng.choice(WORDS), fill=(255, 255, 255), font=font)
+            widgets.append({'type': 'button', 'bbox': [x, y, x + bw, y + bh]})
+        else:
+            size = rng.choice([16, 24, 32]) * scale
+            _icon(draw, rng, x, y, size)
+            widgets.append({'type': 'icon', 'bbox': [x, y, x + size, y + size]})
+    return image, widgets
+
+
+def scenarios(resolutions: List[str], densities: List[str]) -> List[Tuple[str, Tuple[int, int], float]]:
+    return [
+        (f"{resolution}-{density}", RESOLUTIONS[resolution], DENSITIES[density])
+        for resolution in resolutions
+        for density in densities
+    ]
@@ -0,0 +1,106 @@
+"""
+Parse every screenshot in a directory through the server's bulk endpoint.
+
+Files are sent in batches of --batch-size per request, --concurrency requests at a time,
+and each image's result is appended as one JSON line to --output, keyed by its path
+relative to the directory.
+
+    python bulk_parse.py ~/datasets/screens --output results.jsonl
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+ENDPOINT = "http://localhost:8000"
+BATCH_API = "parse-screenshot/batch"
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp'}
+
+
+def find_images(root: Path, recursive: bool):
+    pattern = '**/*' if recursive else '*'
+    return sorted(p for p in root.glob(pattern) if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def already_done(output: Path):
+    done = set()
+    if output.exists():
+        with open(output) as f:
+            for line in f:
+                record = json.loads(line)
+                if 'error' not in record:
+                    done.add(record['filename'])
+    return done
+
+
+def send_batch(session: requests.Session, endpoint: str, root: Path, paths, params: dict):
+    handles = [open(path, 'rb') for path in paths]
+    try:
+        files = [
+            ('files', (path.relative_to(root).as_posix(), handle, 'application/octet-stream'))
+            for path, handle in zip(paths, handles)
+        ]
+        response = session.post(f"{endpoint}/{BATCH_API}", files=files, params=params, stream=True)
+        response.raise_for_status()
+        return [json.loads(line) for line in response.iter_lines() if line]
+    finally:
+        for handle in handles:
+            handle.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--output', type=Path, default=Path('results.jsonl'))
+    parser.add_argument('--endpoint', default=ENDPOINT)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--resume', action='store_true', help="Skip images that already have a result in --output")
+    parser.add_argument('--box-threshold', type=float, default=0.01)
+    parser.add_argument('--iou-threshold', type=float, default=0.9)
+    parser.add_argument('--imgsz', type=int, help="Detection resolution, the server's tuned default when omitted")
+    parser.add_argument('--save-labeled-images', action='store_true')
+    args = parser.parse_args()
+
+    paths = find_images(args.directory, args.recursive)
+    if args.resume:
+        done = already_done(args.output)
+        paths = [p for p in paths if p.relative_to(args.directory).as_posix() not in done]
+    batches = [paths[i:i + args.batch_size] for i in range(0, len(paths), args.batch_size)]
+    params = {
+        'box_threshold': args.box_threshold,
+        'iou_threshold': args.iou_threshold,
+        'save_labeled_images': args.save_labeled_images
+    }
+    if args.imgsz is not None:
+        params['imgsz'] = args.imgsz
+    print(f"Parsing {len(paths)} images in {len(batches)} requests")
+
+    session = requests.Session()
+    write_lock = threading.Lock()
+    parsed, errors, start = 0, 0, time.perf_counter()
+    with open(args.output, 'a') as out, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(send_batch, session, args.endpoint, args.directory, batch, params): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                records = [r for r in future.result() if 'filename' in r]
+            except Exception as e:
+                records = [{'filename': p.relative_to(args.directory).as_posix(), 'error': str(e)} for p in batch]
+            with write_lock:
+                for record in records:
+                    out.write(json.dumps(record) + "\n")
+                out.flush()
+            parsed += len(records)
+            errors += sum('error' in r for r in records)
+            rate = parsed / (time.perf_counter() - start)
+            print(f"{parsed}/{len(paths)} images, {errors} errors, {rate:.2f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Measure this host's fastest caption batch size, torch thread counts and detection resolution,
+and save them as its tuning profile (see `tuning`).
+
+Every combination of --batch-sizes, --threads and --imgsz parses the calibration screenshots
+--repeats times, recording p50/p90 latency and peak RSS. Configurations over --max-memory-mib
+are discarded, and larger batch sizes are skipped once one exceeds it. The fastest of the rest
+becomes the profile. imgsz trades accuracy for speed, so the largest candidate is kept, or with
+--target-ms the largest whose p50 meets the target. Inter-op threads can only be set before a
+process runs any parallel work, so each --interop-threads value is measured in its own
+freshly spawned process.
+
+    python -m core_server.autotune
+    python -m core_server.autotune --images path/to/screenshots --batch-sizes 8 16 32 --threads 4 8
+    python -m core_server.autotune --max-memory-mib 6000 --imgsz 640 960 1280 --target-ms 1500
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import multiprocessing
+import os
+import statistics
+import time
+
+import torch
+
+from . import runtime
+from .core import ImageProcessor, ParseJob
+from .imaging import load_image
+from .metrics import Trace
+from .backends import BACKENDS
+from .tuning import TuningProfile, host_fingerprint, profile_path, save_profile
+from .constants import (
+    ICON_DETECT_MODEL_PATH, IMAGE_BASE_PATH, INFERENCE_BACKEND, INT8_QUANTIZE,
+    AUTOTUNE_CALIBRATION_PATH, AUTOTUNE_CALIBRATION_IMAGES
+)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def calibration_images(directory: Optional[str], count: int) -> List[str]:
+    """
+    The newest `count` screenshots in the directory. Without one, recent uploads stand in for
+    real traffic, and the screenshots in IMAGE_BASE_PATH when nothing was uploaded yet.
+    """
+    for candidate in ([directory] if directory else [AUTOTUNE_CALIBRATION_PATH, IMAGE_BASE_PATH]):
+        if not os.path.isdir(candidate):
+            continue
+        paths = [p for p in Path(candidate).iterdir() if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES]
+        if paths:
+            paths.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+            return [str(p) for p in paths[:count]]
+    return []
+
+
+def thread_candidates(max_threads: int) -> List[int]:
+    return sorted({max(1, max_threads // 4), max(1, max_threads // 2), max_threads})
+
+
+def measure(processor: ImageProcessor, images: List[Any], imgsz: int, batch_size: int, repeats: int) -> Dict[str, Any]:
+    """
+    Parse every image `repeats` times with one configuration, latency per parse and peak memory over all of them.
+    Caption seconds per crop is this configuration's captioning stage time over the icons it captioned.
+    """
+    runtime.reset_peak_rss()
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+    latencies = []
+    caption_seconds, captioned = 0.0, 0
+    for _ in range(repeats):
+        for image in images:
+            trace = Trace()
+            start = time.perf_counter()
+            result = processor.process_batch([ParseJob(image=image, imgsz=imgsz, icon_process_batch_size=batch_size, render=False, trace=trace)])[0]
+            if isinstance(result, Exception):
+                raise result
+            latencies.append(time.perf_counter() - start)
+            caption_seconds += trace.stages.get('captioning', 0.0)
+            captioned += sum(1 for elem in result[2] if elem.get('source') == 'box_yolo_content_yolo')
+    ordered = sorted(latencies)
+    return {
+        "imgsz": imgsz,
+        "icon_process_batch_size": batch_size,
+        "torch_threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p90_ms": ordered[min(len(ordered) - 1, round(0.9 * (len(ordered) - 1)))] * 1000,
+        "peak_memory_mib": runtime.peak_rss_mib(),
+        "peak_gpu_memory_mib": torch.cuda.max_memory_allocated() / 2 ** 20 if torch.cuda.is_available() else None,
+        "caption_seconds_per_crop": caption_seconds / captioned if captioned else None
+    }
+
+
+def sweep(
+    image_paths: List[str],
+    interop_threads: int,
+    thread_counts: List[int],
+    batch_sizes: List[int],
+    imgsizes: List[int],
+    repeats: int,
+    backend: str,
+    quantize: bool,
+    cores: Optional[List[int]] = None,
+    max_memory_mib: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Measure every thread count x imgsz x batch size with one inter-op thread count, in a fresh process
+
+    Args:
+        cores: Pin to these cores, to tune for the slice one pre-fork worker gets
+    """
+    torch.set_num_interop_threads(interop_threads)
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    images = [load_image(path) for path in image_paths]
+    processor = ImageProcessor(
+        icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH),
+        backend=backend,
+        quantize=quantize
+    )
+    measurements = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for imgsz in imgsizes:
+            processor.warm_up(imgsz)
+            for batch_size in sorted(batch_sizes):
+                entry = measure(processor, images, imgsz, batch_size, repeats)
+                measurements.append(entry)
+                memory = entry["peak_memory_mib"]
+                print (
+                    f"interop={interop_threads} threads={threads} imgsz={imgsz} batch={batch_size}: "
+                    f"p50={entry['p50_ms']:.0f}ms p90={entry['p90_ms']:.0f}ms peak={memory or 0:.0f}MiB"
+                )
+                if max_memory_mib is not None and memory is not None and memory > max_memory_mib:
+                    # Larger caption batches only need more memory
+                    break
+    return measurements
+
+
+def choose(measurements: List[Dict[str, Any]], max_memory_mib: Optional[float] = None, target_ms: Optional[float] = None) -> Dict[str, Any]:
+    """
+    The fastest configuration within the memory limit, at the largest imgsz that meets `target_ms`
+    (the largest candidate without a target, the smallest when none meets it)
+
+    Raises:
+        ValueError: no configuration fits in `max_memory_mib`
+    """
+    fits = [
+        m for m in measurements
+        if max_memory_mib is None or m["peak_memory_mib"] is None or m["peak_memory_mib"] <= max_memory_mib
+    ]
+    if not fits:
+        raise ValueError(f"No configuration stays under {max_memory_mib} MiB")
+    best: Dict[int, Dict[str, Any]] = {}
+    for m in fits:
+        current = best.get(m["imgsz"])
+        if current is None or (m["p50_ms"], m["p90_ms"]) < (current["p50_ms"], current["p90_ms"]):
+            best[m["imgsz"]] = m
+    sizes = sorted(best)
+    if target_ms is not None:
+        within = [size for size in sizes if best[size]["p50_ms"] <= target_ms]
+        return best[within[-1] if within else sizes[0]]
+    return best[sizes[-1]]
+
+
+def main():
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help="Directory of calibration screenshots, recent uploads when omitted")
+    parser.add_argument('--count', type=int, default=AUTOTUNE_CALIBRATION_IMAGES, help="Number of calibration screenshots")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 8, 16, 32, 64])
+    parser.add_argument('--threads', type=int, nargs='+', help="Intra-op thread counts, fractions of --max-threads when omitted")
+    parser.add_argument('--max-threads', type=int, default=len(available), help="Cores to tune for, one pre-fork worker's share")
+    parser.add_argument('--interop-threads', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640])
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--max-memory-mib', type=float, help="Discard configurations whose peak RSS exceeds this")
+    parser.add_argument('--target-ms', type=float, help="Pick the largest imgsz whose p50 latency meets this")
+    parser.add_argument('--backend', choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument('--int8', action='store_true', default=INT8_QUANTIZE)
+    parser.add_argument('--output', default=profile_path())
+    args = parser.parse_args()
+
+    image_paths = calibration_images(args.images, args.count)
+    if not image_paths:
+        parser.error("No calibration screenshots found, pass --images")
+    max_threads = min(args.max_threads, len(available))
+    thread_counts = sorted(t for t in args.threads if t <= max_threads) if args.threads else thread_candidates(max_threads)
+    print (f'Tuning on {len(image_paths)} screenshots, threads {thread_counts}, batch sizes {args.batch_sizes}, imgsz {args.imgsz}')
+
+    measurements = []
+    context = multiprocessing.get_context('spawn')
+    for interop_threads in args.interop_threads:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            measurements += pool.submit(
+                sweep, image_paths, interop_threads, thread_counts, args.batch_sizes, args.imgsz, args.repeats,
+                args.backend, args.int8, available[:max_threads], args.max_memory_mib
+            ).result()
+
+    try:
+        best = choose(measurements, args.max_memory_mib, args.target_ms)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    profile = TuningProfile(
+        imgsz=best["imgsz"],
+        icon_process_batch_size=best["icon_process_batch_size"],
+        torch_threads=best["torch_threads"],
+        interop_threads=best["interop_threads"],
+        host=host_fingerprint(args.backend, args.int8),
+        p50_ms=best["p50_ms"],
+        p90_ms=best["p90_ms"],
+        peak_memory_mib=best["peak_memory_mib"],
+        caption_seconds_per_crop=best["caption_seconds_per_crop"],
+        measurements=measurements
+    )
+    save_profile(profile, args.output)
+    print (
+        f"imgsz={profile.imgsz} batch={profile.icon_process_batch_size} threads={profile.torch_threads} "
+        f"interop={profile.interop_threads}: p50={profile.p50_ms:.0f}ms, profile written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Inference backends for the icon detector and captioner.
+
+- torch: eager PyTorch, as shipped by OmniParser
+- onnx:  the YOLO detector exported once to ONNX and run with ONNX Runtime through
+         ultralytics, which keeps the same `predict` interface and post-processing
+
+With `quantize`, the exported detector gets int8 dynamic quantization (onnxruntime) and the
+Florence-2 captioner's Linear layers are quantized to int8 in PyTorch. Florence-2 generation
+stays in PyTorch on every backend: its decoder loop with KV cache does not export to a
+single ONNX graph.
+"""
+from pathlib import Path
+from typing import Any, Dict
+import hashlib
+import os
+import shutil
+
+import torch
+
+BACKENDS = ("torch", "onnx")
+
+
+def _weights_digest(path: str) -> str:
+    hasher = hashlib.blake2b(digest_size=12)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def export_detector_onnx(weights_path: str, cache_dir: str, quantize: bool = False) -> str:
+    """
+    Export the YOLO weights to ONNX once, later calls return the cached file
+
+    Artifacts are keyed on the weights' content, so replaced weights are re-exported.
+
+    Returns:
+        Path of the (optionally int8 quantized) ONNX model
+    """
+    from ultralytics import YOLO
+
+    cache = Path(cache_dir)
+    cache.mkdir(parents=True, exist_ok=True)
+    key = f"{Path(weights_path).stem}-{_weights_digest(weights_path)}"
+    fp32_path = cache / f"{key}.onnx"
+    target = cache / f"{key}.int8.onnx" if quantize else fp32_path
+    if target.exists():
+        return str(target)
+
+    if not fp32_path.exists():
+        print (f'Exporting {weights_path} to ONNX')
+        # Dynamic axes so one file serves every imgsz and batch size
+        exported = YOLO(weights_path).export(format='onnx', dynamic=True, simplify=True)
+        tmp_path = fp32_path.with_suffix('.onnx.tmp')
+        shutil.move(exported, tmp_path)
+        os.replace(tmp_path, fp32_path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print (f'Quantizing {fp32_path} to int8')
+        tmp_path = target.with_suffix('.onnx.tmp')
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QUInt8)
+        os.replace(tmp_path, target)
+    return str(target)
+
+
+def load_detector(weights_path: str, backend: str, cache_dir: str, quantize: bool = False):
+    """
+    YOLO detector for the backend, every backend is called through the same `predict`
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+    if backend == "torch":
+        from OmniParser.utils import get_yolo_model
+        return get_yolo_model(weights_path)
+    from ultralytics import YOLO
+    return YOLO(export_detector_onnx(weights_path, cache_dir, quantize), task='detect')
+
+
+def quantize_caption_model(caption_model: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    int8 dynamic quantization of the captioner's Linear layers (CPU only)
+    """
+    model = caption_model['model']
+    if model.device.type != 'cpu':
+        return caption_model
+    # In place, a copy would hold the float weights alongside the int8 ones
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return caption_model
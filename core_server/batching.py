@@ -0,0 +1,92 @@
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+import queue
+import threading
+import time
+
+
+class MicroBatcher:
+    """
+    Groups items submitted from many callers into batches for a single processing function.
+
+    A background thread waits for the first pending item, then keeps collecting until either
+    `max_batch_size` items are pending or `max_wait_ms` has passed, and runs `process_batch`
+    on the group. `process_batch` returns one entry per item; an entry that is an Exception
+    fails only that caller's future.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches_run = 0
+        self.items_processed = 0
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread = threading.Thread(target=self.__run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "batches_run": self.batches_run,
+            "items_processed": self.items_processed,
+            "mean_batch_size": self.items_processed / self.batches_run if self.batches_run else 0.0,
+            "pending": self._queue.qsize()
+        }
+
+    def __collect(self) -> Optional[List[tuple]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def __run(self) -> None:
+        while True:
+            batch = self.__collect()
+            if batch is None:
+                return
+            # Drop callers that gave up while waiting
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                results = [e] * len(items)
+            self.batches_run += 1
+            self.items_processed += len(items)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,75 @@
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+from itertools import islice
+from pathlib import PurePosixPath
+import io
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import zlib
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.bmp'}
+# What reading a malformed or truncated upload raises, a client error rather than a server one
+ARCHIVE_ERRORS = (ValueError, EOFError, OSError, zipfile.BadZipFile, tarfile.TarError, zlib.error)
+
+
+def is_image_name(name: str) -> bool:
+    path = PurePosixPath(name)
+    return path.suffix.lower() in IMAGE_EXTENSIONS and not any(part.startswith('.') for part in path.parts)
+
+
+def iter_archive_images(data: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (member name, encoded bytes) for every image in a zip or tar (optionally compressed) archive.
+    Given a seekable file, members are read from it one at a time, the archive is never held in memory.
+
+    Raises:
+        ValueError: the data is neither a zip nor a tar archive
+    """
+    buffer = io.BytesIO(data) if isinstance(data, bytes) else data
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_image_name(info.filename):
+                    yield info.filename, archive.read(info)
+        return
+
+    buffer.seek(0)
+    try:
+        archive = tarfile.open(fileobj=buffer, mode='r:*')
+    except tarfile.TarError:
+        raise ValueError("Archive must be a zip or tar file")
+    with archive:
+        for member in archive:
+            if member.isfile() and is_image_name(member.name):
+                yield member.name, archive.extractfile(member).read()
+
+
+def iter_upload_images(files: List[Tuple[str, BinaryIO]], archive: Optional[BinaryIO]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (name, encoded bytes) for every uploaded file, then every image in the archive
+    """
+    for name, file in files:
+        yield name, file.read()
+    if archive is not None:
+        yield from iter_archive_images(archive)
+
+
+def spool(file: BinaryIO) -> BinaryIO:
+    """
+    Copy a file into a temporary file of our own, on disk, so it outlives the request that uploaded it
+    """
+    copy = tempfile.TemporaryFile()
+    file.seek(0)
+    shutil.copyfileobj(file, copy)
+    copy.seek(0)
+    return copy
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
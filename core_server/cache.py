@@ -0,0 +1,165 @@
+from PIL import Image
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def image_digest(image: Image.Image) -> str:
+    """
+    Hash the decoded pixels of an image, so re-encoded uploads of the same frame share a key
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+def make_cache_key(image_hash: str, **params: Any) -> str:
+    """
+    Combine the pixel hash with every parameter that changes the parse output
+    """
+    param_str = ','.join(f"{k}={params[k]!r}" for k in sorted(params))
+    return hashlib.blake2b(f"{image_hash}|{param_str}".encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of parse results: an in-memory LRU in front of an optional on-disk tier.
+
+    Values are the JSON-serialisable response payloads, so a hit can be returned as-is.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: Optional[float] = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_path = Path(disk_path) if disk_path else None
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._disk_index: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+        if self.disk_path:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+            self.__load_disk_index()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self.__expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return value
+                del self._memory[key]
+
+            value = self.__disk_get(key, now)
+            if value is not None:
+                self.hits['disk'] += 1
+                self.__memory_put(key, value, now)
+                return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self.__memory_put(key, value, now)
+            if self.disk_path:
+                self.__disk_put(key, value, now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.hits['memory'] + self.hits['disk']
+            lookups = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_bytes,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
+
+    def __expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def __memory_put(self, key: str, value: Dict[str, Any], now: float) -> None:
+        self._memory[key] = (now, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # -- On-disk tier: one JSON file per key, evicted oldest-first by size and TTL
+
+    def __disk_file(self, key: str) -> Path:
+        return self.disk_path / f"{key}.json"
+
+    def __load_disk_index(self) -> None:
+        entries = []
+        for path in self.disk_path.glob('*.json'):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for mtime, key, size in sorted(entries):
+            self._disk_index[key] = (mtime, size)
+            self._disk_bytes += size
+        self.__disk_evict(time.time())
+
+    def __disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if not self.disk_path or key not in self._disk_index:
+            return None
+        created, _ = self._disk_index[key]
+        if self.__expired(created, now):
+            self.__disk_remove(key)
+            return None
+        try:
+            with open(self.__disk_file(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self.__disk_remove(key)
+            return None
+
+    def __disk_put(self, key: str, value: Dict[str, Any], now: float) -> None:
+        data = json.dumps(value).encode()
+        tmp_path = self.disk_path / f"{key}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.__disk_file(key))
+        if key in self._disk_index:
+            self._disk_bytes -= self._disk_index.pop(key)[1]
+        self._disk_index[key] = (now, len(data))
+        self._disk_bytes += len(data)
+        self.__disk_evict(now)
+
+    def __disk_remove(self, key: str) -> None:
+        _, size = self._disk_index.pop(key)
+        self._disk_bytes -= size
+        try:
+            self.__disk_file(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def __disk_evict(self, now: float) -> None:
+        # Index is ordered by write time, so the oldest entries are always at the front
+        while self._disk_index:
+            key, (created, _) = next(iter(self._disk_index.items()))
+            if self._disk_bytes <= self.disk_max_bytes and not self.__expired(created, now):
+                break
+            self.__disk_remove(key)
@@ -0,0 +1,169 @@
+from PIL import Image
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+_HASH_BITS = 64
+_FLAT_STD = 4.0  # grayscale thumbnail standard deviation (0-255) below which a crop has no usable hash
+
+
+def perceptual_hash(image: Image.Image) -> Optional[int]:
+    """
+    64-bit difference hash: sign of the horizontal gradient on a 9x8 grayscale thumbnail.
+
+    None for a flat crop. The hash ignores colour, so every flat crop (a plain red and a
+    plain green square alike) would hash to 0 and share one caption.
+    """
+    gray = np.asarray(image.convert('L').resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    if gray.std() < _FLAT_STD:
+        return None
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << _HASH_BITS) if value >= 1 << (_HASH_BITS - 1) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << _HASH_BITS) if value < 0 else value
+
+
+class CaptionCache:
+    """
+    Persistent icon caption cache keyed on a perceptual hash of the 64x64 icon crop.
+
+    Entries live in a SQLite file, so every worker thread and process on the host shares them.
+    Lookups accept hashes within `max_distance` bits (Hamming). Near matches are found with
+    multi-index hashing: the hash is split into `max_distance + 1` bands, and any hash within
+    the tolerance matches at least one band exactly. Least recently used entries beyond
+    `max_entries` are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, max_distance: int = 2):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        num_bands = max_distance + 1
+        widths = [_HASH_BITS // num_bands + (1 if i < _HASH_BITS % num_bands else 0) for i in range(num_bands)]
+        self._band_shifts = [(sum(widths[i + 1:]), (1 << width) - 1) for i, width in enumerate(widths)]
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.__init_schema()
+
+    def get_many(self, hashes: List[int]) -> List[Optional[str]]:
+        """
+        Look up captions for several crop hashes, None where nothing is within tolerance
+        """
+        conn = self.__connection()
+        now = time.time()
+        captions, used = [], set()
+        with conn:
+            for phash in hashes:
+                match = self.__lookup(conn, phash)
+                captions.append(match[1] if match else None)
+                if match:
+                    used.add(match[0])
+            conn.executemany("UPDATE captions SET last_used = ? WHERE phash = ?", [(now, h) for h in used])
+        found = sum(caption is not None for caption in captions)
+        with self._lock:
+            self.hits += found
+            self.misses += len(captions) - found
+        return captions
+
+    def put_many(self, entries: Dict[int, str]) -> None:
+        if not entries:
+            return
+        conn = self.__connection()
+        now = time.time()
+        with conn:
+            for phash, caption in entries.items():
+                signed = _to_signed(phash)
+                conn.execute(
+                    "INSERT OR REPLACE INTO captions (phash, caption, last_used) VALUES (?, ?, ?)",
+                    (signed, caption, now)
+                )
+                conn.execute("DELETE FROM bands WHERE phash = ?", (signed,))
+                conn.executemany(
+                    "INSERT INTO bands (band, value, phash) VALUES (?, ?, ?)",
+                    [(band, value, signed) for band, value in enumerate(self.__bands(phash))]
+                )
+            self.__evict(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.__connection().execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": count,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def __bands(self, phash: int) -> List[int]:
+        return [(phash >> shift) & mask for shift, mask in self._band_shifts]
+
+    def __lookup(self, conn: sqlite3.Connection, phash: int) -> Optional[tuple]:
+        signed = _to_signed(phash)
+        row = conn.execute("SELECT phash, caption FROM captions WHERE phash = ?", (signed,)).fetchone()
+        if row or self.max_distance == 0:
+            return row
+        best, best_distance = None, self.max_distance + 1
+        for band, value in enumerate(self.__bands(phash)):
+            candidates = conn.execute(
+                "SELECT c.phash, c.caption FROM bands b JOIN captions c ON c.phash = b.phash "
+                "WHERE b.band = ? AND b.value = ?",
+                (band, value)
+            )
+            for candidate, caption in candidates:
+                distance = bin(_to_unsigned(candidate) ^ phash).count('1')
+                if distance < best_distance:
+                    best, best_distance = (candidate, caption), distance
+        return best
+
+    def __evict(self, conn: sqlite3.Connection) -> None:
+        overflow = conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            stale = conn.execute("SELECT phash FROM captions ORDER BY last_used LIMIT ?", (overflow,)).fetchall()
+            conn.executemany("DELETE FROM captions WHERE phash = ?", stale)
+            conn.executemany("DELETE FROM bands WHERE phash = ?", stale)
+
+    def __connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __init_schema(self) -> None:
+        conn = self.__connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS captions (phash INTEGER PRIMARY KEY, caption TEXT NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS captions_last_used ON captions (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, value INTEGER NOT NULL, phash INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_phash ON bands (phash)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'num_bands'").fetchone()
+            if row is None or int(row[0]) != len(self._band_shifts):
+                # Tolerance changed since the file was written, re-split every stored hash
+                conn.execute("DELETE FROM bands")
+                hashes = [h for (h,) in conn.execute("SELECT phash FROM captions")]
+                conn.executemany(
+                    "INSERT INTO bands (band, value, phash) VALUES (?, ?, ?)",
+                    [(band, value, h) for h in hashes for band, value in enumerate(self.__bands(_to_unsigned(h)))]
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('num_bands', ?)", (str(len(self._band_shifts)),))
@@ -3,4 +3,76 @@ UPLOAD_IMG_FOLDER_NAME = "api_images"
 RESULT_IMG_FOLDER_NAME = "api_results"
 
 ICON_CAPTION_MODEL_PATH = "Omniparser/weights/icon_caption_florence"
-ICON_DETECT_MODEL_PATH = 'OmniParser/weights/icon_detect_v1_5/model_v1_5.pt'
\ No newline at end of file
+ICON_DETECT_MODEL_PATH = 'OmniParser/weights/icon_detect_v1_5/model_v1_5.pt'
+
+# Result cache for /parse-screenshot
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_TTL_SECONDS = 60 * 60
+RESULT_CACHE_DISK_PATH = None  # e.g. f"{IMAGE_BASE_PATH}/result_cache" to enable the on-disk tier
+RESULT_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024
+
+# Cross-request micro-batching, requests arriving within BATCH_MAX_WAIT_MS share one detection/caption pass
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 20
+
+# Inference worker pool, requests beyond INFERENCE_QUEUE_SIZE waiting jobs get a 503 + Retry-After
+INFERENCE_WORKERS = 8
+INFERENCE_QUEUE_SIZE = 32
+INFERENCE_TIMEOUT_SECONDS = 120
+
+# Uploads and labeled images are written in the background, either can be turned off.
+# Labeled images are only drawn when requested, PERSIST_RESULTS keeps a PNG of each one drawn
+PERSIST_UPLOADS = True
+PERSIST_RESULTS = True
+# api_images and api_results are each capped by size and age, oldest files evicted first.
+# Writes beyond ARTIFACT_QUEUE_SIZE pending are dropped rather than delaying requests
+ARTIFACT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+ARTIFACT_TTL_SECONDS = 24 * 60 * 60  # None keeps files until evicted by size
+ARTIFACT_QUEUE_SIZE = 256
+
+# Session mode: only tiles that changed since the session's previous frame are re-parsed
+SESSION_MAX_SESSIONS = 64
+SESSION_TTL_SECONDS = 15 * 60
+INCREMENTAL_TILE_SIZE = 32
+INCREMENTAL_TILE_THRESHOLD = 1.0  # mean absolute pixel difference per tile, 0-255
+INCREMENTAL_MAX_CHANGED_RATIO = 0.5
+INCREMENTAL_MARGIN = 16
+
+# Icon caption cache shared by all workers, keyed on a perceptual hash of each icon crop
+CAPTION_CACHE_PATH = f"{IMAGE_BASE_PATH}/caption_cache.sqlite3"  # None disables the cache
+CAPTION_CACHE_MAX_ENTRIES = 100_000
+CAPTION_CACHE_MAX_DISTANCE = 2  # Hamming distance (bits of 64) still treated as the same icon
+
+# Bulk endpoint, images are parsed in chunks of this many through one batched pass
+BULK_CHUNK_SIZE = 16
+
+# Parse results kept for on-demand rendering through /results/{id}, evicted LRU by count or upload bytes
+RESULT_STORE_MAX_RESULTS = 1024
+RESULT_STORE_MAX_BYTES = 256 * 1024 * 1024
+# With several pre-fork workers, results are also kept here so any worker can answer for any result_id
+RESULT_STORE_SHARED_PATH = f"{IMAGE_BASE_PATH}/results.sqlite3"
+RENDER_CACHE_SIZE = 32
+
+# Inference backend for the icon detector: "torch" or "onnx" (exported once into ONNX_CACHE_PATH).
+# INT8_QUANTIZE adds int8 dynamic quantization to the detector (onnx) and the caption model (CPU)
+INFERENCE_BACKEND = "torch"
+INT8_QUANTIZE = False
+ONNX_CACHE_PATH = "OmniParser/weights/onnx_cache"
+
+# Adaptive detection resolution: images up to ADAPTIVE_MAX_IMGSZ * ADAPTIVE_MAX_DOWNSCALE on the long side
+# are detected in one pass, larger ones (multi-monitor captures) in overlapping tiles
+ADAPTIVE_MIN_IMGSZ = 640
+ADAPTIVE_MAX_IMGSZ = 1280
+ADAPTIVE_MAX_DOWNSCALE = 2.0
+ADAPTIVE_TILE_SIZE = 1920
+ADAPTIVE_TILE_OVERLAP = 192
+
+# Per-host tuning profile written by `python -m core_server.autotune` and loaded on startup when present.
+# AUTOTUNE_ON_STARTUP runs the tuner first on hosts without a profile. The calibration set is the
+# newest uploads, the screenshots in IMAGE_BASE_PATH when there are none yet
+AUTOTUNE_PROFILE_DIR = f"{IMAGE_BASE_PATH}/autotune"
+AUTOTUNE_ON_STARTUP = False
+AUTOTUNE_CALIBRATION_PATH = f"{IMAGE_BASE_PATH}/{UPLOAD_IMG_FOLDER_NAME}"
+AUTOTUNE_CALIBRATION_IMAGES = 4
+# Run every model once per worker before serving, so the first request doesn't pay lazy initialization
+WARM_UP_ON_STARTUP = True
@@ -1,16 +1,72 @@
-from PIL import Image
+from PIL import Image, ImageDraw
 import torch
-from typing import Tuple, Dict, List, Any, Optional
+from typing import Tuple, Dict, List, Any, Optional, Union, Callable, Set
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from functools import partial
 import base64
+import io
+import time
 from pathlib import Path
 
+import cv2
+import numpy as np
+from torchvision.ops import box_convert
+
 from OmniParser.utils import (
-    get_yolo_model,
     get_caption_model_processor,
-    get_som_labeled_img,
-    check_ocr_box
+    check_ocr_box,
+    int_box_area,
+    annotate
+)
+from .constants import (
+    IMAGE_BASE_PATH, RESULT_IMG_FOLDER_NAME, ICON_CAPTION_MODEL_PATH,
+    INFERENCE_BACKEND, INT8_QUANTIZE, ONNX_CACHE_PATH,
+    ARTIFACT_MAX_BYTES, ARTIFACT_TTL_SECONDS, ARTIFACT_QUEUE_SIZE,
+    ADAPTIVE_MIN_IMGSZ, ADAPTIVE_MAX_IMGSZ, ADAPTIVE_TILE_SIZE, ADAPTIVE_TILE_OVERLAP, ADAPTIVE_MAX_DOWNSCALE
 )
-from .constants import IMAGE_BASE_PATH, RESULT_IMG_FOLDER_NAME, ICON_CAPTION_MODEL_PATH
+from .backends import load_detector, quantize_caption_model
+from .imaging import ImageSource, Region, load_image, clip_regions, merge_regions, region_to_frame
+from .persistence import ArtifactStore, BackgroundWriter
+from .caption_cache import CaptionCache, perceptual_hash
+from .metrics import Trace, timed, CAPTION_BATCH_SIZE, CAPTION_CROPS
+from .tiling import Tile, plan_detection, merge_tile_boxes
+from .overlap import merge_elements, icons_free_of_ocr
+from .tuning import TuningProfile
+
+
+# ocr: text only, no icon detection. detect: OCR and icons, icons left uncaptioned. full: everything
+FIDELITY_TIERS = ("ocr", "detect", "full")
+# Crops in the first caption batch of a deadline job when no per-crop estimate exists yet
+BUDGET_PROBE_BATCH = 2
+
+
+@dataclass
+class ParseJob:
+    """
+    One image to parse, with the same parameters `ImageProcessor.process_image` accepts.
+
+    `on_event(event, payload)` is called from the worker threads as stages finish:
+    'ocr' and 'merged' (elements so far), 'detections' (icon boxes) and 'captions'
+    (one batch of newly captioned icons). Elements use the parsed_content_list schema.
+    """
+    image: ImageSource
+    result_image_name: Optional[str] = None
+    box_threshold: float = 0.01
+    iou_threshold: float = 0.9
+    use_paddleocr: bool = False
+    imgsz: Optional[int] = None  # the processor's default when None
+    icon_process_batch_size: Optional[int] = None  # the processor's default when None
+    on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    render: bool = True  # False skips drawing, the labeled image in the result is then None
+    trace: Optional[Trace] = None  # collects per-stage durations for this job
+    adaptive: bool = False  # detection resolution from the image size, tiling for very large images
+    regions: Optional[List[Region]] = None  # pixel rectangles to parse, the whole frame when None
+    tier: str = "full"  # one of FIDELITY_TIERS
+    deadline: Optional[float] = None  # time.monotonic() after which no more icons are captioned
+
 
 class ImageProcessor:
 
@@ -19,75 +75,730 @@ class ImageProcessor:
         icon_detect_model_path: str,
         icon_caption_model_name: str = "florence2",
         icon_caption_model_path: str = str(Path(__file__).parent.parent / ICON_CAPTION_MODEL_PATH),
-        device: Optional[torch.device] = None
+        device: Optional[torch.device] = None,
+        caption_cache: Optional[CaptionCache] = None,
+        backend: str = INFERENCE_BACKEND,
+        quantize: bool = INT8_QUANTIZE,
+        onnx_cache_path: str = str(Path(__file__).parent.parent / ONNX_CACHE_PATH),
+        artifacts: Optional[ArtifactStore] = None,
+        profile: Optional[TuningProfile] = None
     ):
+        """
+        Args:
+            backend: "torch" or "onnx" for the icon detector, see `backends`
+            quantize: int8 dynamic quantization of the detector (onnx backend) and the caption model (CPU)
+            onnx_cache_path: Directory for exported ONNX models, reused across restarts
+            artifacts: Where labeled images are saved, a bounded store over api_results when None
+            profile: This host's tuning profile (see `tuning.load_profile`), sets the default imgsz and
+                caption batch size of jobs that leave them None
+        """
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.icon_detect_model = get_yolo_model(icon_detect_model_path)
+        self.backend = backend
+        self.quantize = quantize
+        self.onnx_cache_path = onnx_cache_path
+        self.profile = profile
+        self.imgsz = profile.imgsz if profile else 640
+        self.icon_process_batch_size = profile.icon_process_batch_size if profile else 32
+        self._load_models(icon_detect_model_path, icon_caption_model_name, icon_caption_model_path)
+        self.artifacts = artifacts or ArtifactStore(
+            f"{IMAGE_BASE_PATH}/{RESULT_IMG_FOLDER_NAME}", ARTIFACT_MAX_BYTES, ARTIFACT_TTL_SECONDS,
+            BackgroundWriter(ARTIFACT_QUEUE_SIZE)
+        )
+        # OCR runs next to YOLO detection, early icon captioning next to the box merge
+        self._ocr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+        self._caption_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="caption")
+        self.caption_cache = caption_cache
+        # Caption model seconds per crop (cache hits excluded) by caption device and batch size, sizes the
+        # batches of deadline jobs. Seeded from the tuning profile, then kept current by every model call
+        self._caption_seconds_per_crop: Dict[Tuple[str, int], float] = {}
+        if profile is not None and profile.caption_seconds_per_crop:
+            key = (self.__caption_device(), profile.icon_process_batch_size)
+            self._caption_seconds_per_crop[key] = profile.caption_seconds_per_crop
+
+    def _load_models(self, icon_detect_model_path: str, icon_caption_model_name: str, icon_caption_model_path: str) -> None:
+        self.icon_detect_model = load_detector(
+            icon_detect_model_path, self.backend, self.onnx_cache_path, quantize=self.quantize and self.backend == "onnx"
+        )
         self.icon_caption_model = get_caption_model_processor(
             model_name=icon_caption_model_name,
             model_name_or_path=icon_caption_model_path
         )
+        if self.quantize:
+            self.icon_caption_model = quantize_caption_model(self.icon_caption_model)
 
     def process_image(
         self,
-        image_path: str,
-        result_image_name: str,
+        image: ImageSource,
+        result_image_name: Optional[str] = None,
         box_threshold: float = 0.01,
         iou_threshold: float = 0.9,
         use_paddleocr: bool = False,
-        imgsz: int = 640,
-        icon_process_batch_size: int = 32
+        imgsz: Optional[int] = None,
+        icon_process_batch_size: Optional[int] = None,
+        adaptive: bool = False,
+        regions: Optional[List[Region]] = None,
+        tier: str = "full",
+        budget_ms: Optional[float] = None
     ) -> Tuple[str, Dict[str, Any], List[Any]]:
         """
         Process an image through OCR and SOM model pipeline
-        
+
         Args:
-            image_path: Path to the input image
+            image: Input image as a path, encoded bytes, PIL image or RGB array
+            result_image_name: File name for the labeled image in api_results, not saved when None
             box_threshold: Confidence threshold for box detection
             iou_threshold: IOU threshold for box merging
             use_paddleocr: Whether to use PaddleOCR instead of EasyOCR
-            imgsz: Input image size for the model
-            icon_process_batch_size: Batch size for icon processing
-            
+            imgsz: Input image size for the model, the processor's (tuned) default when None
+            icon_process_batch_size: Batch size for icon processing, the processor's (tuned) default when None
+            adaptive: Ignore imgsz, pick the detection resolution from the image size and tile very large images
+            regions: Parse only these x1, y1, x2, y2 pixel rectangles, coordinates are still full-frame.
+                Overlapping rectangles are parsed as their bounding box
+            tier: "ocr", "detect" or "full", see FIDELITY_TIERS
+            budget_ms: Stop captioning this long after the call, remaining icons are marked `uncaptioned`
+
         Returns:
             Tuple containing:
             - Base64 encoded labeled image
             - Dictionary of label coordinates
             - List of parsed content
         """
-        # Get OCR results
+        result = self.process_batch([ParseJob(
+            image=image,
+            result_image_name=result_image_name,
+            box_threshold=box_threshold,
+            iou_threshold=iou_threshold,
+            use_paddleocr=use_paddleocr,
+            imgsz=imgsz,
+            icon_process_batch_size=icon_process_batch_size,
+            adaptive=adaptive,
+            regions=regions,
+            tier=tier,
+            deadline=time.monotonic() + budget_ms / 1000 if budget_ms is not None else None
+        )])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def process_batch(
+        self,
+        jobs: List[ParseJob]
+    ) -> List[Union[Tuple[str, Dict[str, Any], List[Any]], Exception]]:
+        """
+        Process several images together: one YOLO call per parameter group and
+        icon crops from every image pooled into shared caption batches.
+
+        Args:
+            jobs: Images to parse and their parameters
+
+        Returns:
+            One entry per job, in order: the `process_image` tuple, or the exception
+            that job failed with (a failing image does not fail the rest of the batch)
+        """
+        results: List[Any] = self.parse_batch(jobs)
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                continue
+            image_np, elements = result
+            try:
+                if jobs[i].render:
+                    with timed('render', [jobs[i].trace]):
+                        dino_labeled_img, label_coordinates = self.label_image(image_np, elements, jobs[i].result_image_name)
+                else:
+                    dino_labeled_img = None
+                    label_coordinates = self.label_coordinates(elements, (image_np.shape[1], image_np.shape[0]))
+                results[i] = (dino_labeled_img, label_coordinates, elements)
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def parse_batch(
+        self,
+        jobs: List[ParseJob]
+    ) -> List[Union[Tuple[np.ndarray, List[Dict[str, Any]]], Exception]]:
+        """
+        Run OCR, detection, box merging and captioning for several images, without drawing labels
+
+        Args:
+            jobs: Images to parse and their parameters
+
+        Returns:
+            One entry per job, in order: the decoded RGB pixels and the parsed elements
+            (bboxes in ratio coordinates), or the exception that job failed with
+        """
+        if not any(job.regions for job in jobs):
+            return self.__parse_frames(jobs)
+
+        # Each region is parsed as its own crop, batched with the other jobs, so the cost follows
+        # the area of the regions. Overlapping regions are merged first, or their elements would repeat.
+        results: List[Any] = [None] * len(jobs)
+        frames: Dict[int, Image.Image] = {}
+        sub_jobs, owners = [], []
+        for i, job in enumerate(jobs):
+            if not job.regions:
+                sub_jobs.append(job)
+                owners.append((i, None))
+                continue
+            try:
+                with timed('decode', [job.trace]) if not isinstance(job.image, Image.Image) else nullcontext():
+                    frames[i] = load_image(job.image)
+                regions = merge_regions(clip_regions(job.regions, frames[i].size))
+            except Exception as e:
+                results[i] = e
+                frames.pop(i, None)
+                continue
+            for region in regions:
+                on_event = partial(self.__emit_region, job, region, frames[i].size) if job.on_event else None
+                sub_jobs.append(replace(job, image=frames[i].crop(region), regions=None, on_event=on_event))
+                owners.append((i, region))
+
+        elements = defaultdict(list)
+        for (i, region), result in zip(owners, self.__parse_frames(sub_jobs)):
+            if results[i] is not None:
+                continue
+            if isinstance(result, Exception) or region is None:
+                results[i] = result
+                continue
+            elements[i].extend(dict(elem, bbox=region_to_frame(elem['bbox'], region, frames[i].size)) for elem in result[1])
+        for i, frame in frames.items():
+            if results[i] is None:
+                results[i] = (np.asarray(frame), elements[i])
+        return results
+
+    def __parse_frames(
+        self,
+        jobs: List[ParseJob]
+    ) -> List[Union[Tuple[np.ndarray, List[Dict[str, Any]]], Exception]]:
+        # parse_batch for whole images
+        results: List[Any] = [None] * len(jobs)
+        states: Dict[int, Dict[str, Any]] = {}
+
+        for i, job in enumerate(jobs):
+            try:
+                # Images the server already decoded on upload are not counted again
+                with timed('decode', [job.trace]) if not isinstance(job.image, Image.Image) else nullcontext():
+                    states[i] = {'image': load_image(job.image)}
+            except Exception as e:
+                results[i] = e
+
+        # Stage1: OCR on the OCR worker, it only has to be done before the merge
+        ocr_futures = {
+            i: self._ocr_executor.submit(self.__timed_ocr, state['image'], jobs[i])
+            for i, state in states.items()
+        }
+        for i, future in ocr_futures.items():
+            if jobs[i].on_event:
+                future.add_done_callback(partial(self.__emit_ocr, jobs[i], states[i]['image'].size))
+
+        # Stage2: Icon detection meanwhile, one batched call per (box_threshold, imgsz) group.
+        # Adaptive jobs pick imgsz from their size and very large images add one entry per tile
+        groups = defaultdict(list)
+        for i in states:
+            if jobs[i].tier == "ocr":
+                states[i]['tiles'] = []
+                continue
+            if jobs[i].adaptive:
+                imgsz, tiles = self.__plan_detection(states[i]['image'].size)
+            else:
+                imgsz, tiles = jobs[i].imgsz or self.imgsz, [None]
+            states[i]['tiles'], states[i]['tile_boxes'] = tiles, {}
+            for tile in tiles:
+                groups[(jobs[i].box_threshold, imgsz)].append((i, tile))
+        for (box_threshold, imgsz), entries in groups.items():
+            try:
+                with timed('detection', {jobs[i].trace for i, _ in entries}):
+                    detections = self._detect_icons(
+                        [states[i]['image'] if tile is None else states[i]['image'].crop(tile) for i, tile in entries],
+                        box_threshold, imgsz
+                    )
+                for (i, tile), icon_xyxy in zip(entries, detections):
+                    states[i]['tile_boxes'][tile] = icon_xyxy
+            except Exception as e:
+                for i, _ in entries:
+                    results[i] = e
+        for i in [i for i in states if results[i] is None]:
+            state = states[i]
+            if not state['tiles']:
+                state['icon_xyxy'] = torch.zeros((0, 4))
+            elif state['tiles'] == [None]:
+                state['icon_xyxy'] = state['tile_boxes'][None]
+            else:
+                with timed('tile_merge', [jobs[i].trace]):
+                    boxes, keep = merge_tile_boxes([state['tile_boxes'][tile] for tile in state['tiles']], state['tiles'])
+                state['icon_xyxy'] = boxes[keep]
+            w, h = state['image'].size
+            self.__emit(jobs[i], 'detections', {'boxes': (state['icon_xyxy'] / torch.Tensor([w, h, w, h])).tolist()})
+
+        for i, future in ocr_futures.items():
+            try:
+                states[i]['ocr_text'], states[i]['ocr_bbox'] = future.result()
+            except Exception as e:
+                results[i] = e
+        for i in [i for i in states if results[i] is not None]:
+            del states[i]
+
+        # Stage3: Icons that survive icon-icon suppression and touch no OCR box are certain to need a
+        # caption, start captioning them while the full merge runs. Deadline jobs caption after the
+        # merge instead, in priority order over all their icons
+        early_crops, early_owners = [], []
+        for i in list(states):
+            state = states[i]
+            try:
+                state['image_np'] = np.asarray(state['image'])
+                state['icon_elements'], state['ocr_elements'] = self._build_elements(
+                    state['icon_xyxy'], state['ocr_bbox'], state['ocr_text'], state['image'].size
+                )
+                if jobs[i].tier != "full" or jobs[i].deadline is not None:
+                    continue
+                sure_icons = self._icons_free_of_ocr(state['icon_elements'], state['ocr_elements'], jobs[i].iou_threshold)
+                early_crops.extend(self._crop_icons(state['image_np'], sure_icons))
+                early_owners.extend((i, elem) for elem in sure_icons)
+            except Exception as e:
+                results[i] = e
+                del states[i]
+        # Pooled crops run at the smallest batch size any job asked for, a caller's size can be a memory bound
+        caption_batch_size = min((jobs[i].icon_process_batch_size or self.icon_process_batch_size for i in states), default=1)
+        streaming = any(jobs[i].on_event for i in states)
+        early_future = self._caption_executor.submit(
+            self.__timed_captions, early_crops, caption_batch_size,
+            partial(self.__emit_captions, jobs, early_owners) if streaming else None,
+            {jobs[i].trace for i, _ in early_owners}
+        ) if early_crops else None
+
+        # Stage4: Merge OCR and icon boxes, collect crops of the remaining icons without content.
+        # Elements are matched by their bbox list, which the merge carries over as-is
+        late_crops, late_owners = [], []
+        budget_crops, budget_owners = [], []
+        for i in list(states):
+            state = states[i]
+            try:
+                with timed('merge', [jobs[i].trace]):
+                    state['elements'] = self._merge_boxes(state['icon_elements'], state['ocr_elements'], jobs[i].iou_threshold)
+                state['pending'] = {id(elem['bbox']): elem for elem in state['elements'] if elem['content'] is None}
+                captioned = jobs[i].tier == "full"
+                if captioned and jobs[i].deadline is not None:
+                    # Most interactive, then largest first
+                    icons = sorted(state['pending'].values(), key=lambda elem: (
+                        not elem.get('interactivity'), -(elem['bbox'][2] - elem['bbox'][0]) * (elem['bbox'][3] - elem['bbox'][1])
+                    ))
+                    budget_crops.extend(self._crop_icons(state['image_np'], icons))
+                    budget_owners.extend((i, elem) for elem in icons)
+                elif captioned:
+                    early_boxes = {id(elem['bbox']) for owner, elem in early_owners if owner == i}
+                    late_icons = [elem for box, elem in state['pending'].items() if box not in early_boxes]
+                    late_crops.extend(self._crop_icons(state['image_np'], late_icons))
+                    late_owners.extend((i, elem) for elem in late_icons)
+                self.__emit(jobs[i], 'merged', {
+                    'elements': [elem for elem in state['elements'] if elem['content'] is not None],
+                    'pending_captions': len(state['pending']) if captioned else 0
+                })
+            except Exception as e:
+                results[i] = e
+                del states[i]
+
+        # Stage5: Caption the rest and fill in contents
+        try:
+            captions = early_future.result() if early_future else []
+            if late_crops:
+                captions += self.__timed_captions(
+                    late_crops, caption_batch_size,
+                    partial(self.__emit_captions, jobs, late_owners) if streaming else None,
+                    {jobs[i].trace for i, _ in late_owners}
+                )
+            owners = early_owners + late_owners
+            if budget_crops:
+                budgeted = self.__budgeted_captions(budget_crops, budget_owners, jobs, caption_batch_size, streaming)
+                owners += [budget_owners[n] for n in budgeted]
+                captions += list(budgeted.values())
+            for (i, owner_elem), caption in zip(owners, captions):
+                elem = states[i]['pending'].get(id(owner_elem['bbox'])) if i in states else None
+                if elem is not None:
+                    elem['content'] = caption
+        except Exception as e:
+            for i in states:
+                results[i] = e
+            states = {}
+        # Icons left without a caption by the tier or the deadline
+        for state in states.values():
+            for elem in state['pending'].values():
+                if elem['content'] is None:
+                    elem['uncaptioned'] = True
+
+        for i, state in states.items():
+            results[i] = (state['image_np'], state['elements'])
+        return results
+
+    def label_image(
+        self,
+        image_np: np.ndarray,
+        elements: List[Dict[str, Any]],
+        result_image_name: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Draw the set-of-marks labels for parsed elements, saving happens in the background
+
+        Returns:
+            Tuple of the base64 encoded labeled image and the label coordinates
+        """
+        dino_labeled_img, label_coordinates = self._annotate(image_np, elements)
+        if result_image_name:
+            self.__save_labeled_image(dino_labeled_img, result_image_name)
+        return dino_labeled_img, label_coordinates
+
+    def label_coordinates(self, elements: List[Dict[str, Any]], image_size: Tuple[int, int]) -> Dict[str, np.ndarray]:
+        """
+        xywh pixel coordinates per label, the same values `annotate` returns, without drawing
+        """
+        w, h = image_size
+        boxes = torch.tensor([elem['bbox'] for elem in elements]).reshape(-1, 4)
+        boxes = box_convert(boxes=boxes, in_fmt="xyxy", out_fmt="cxcywh") * torch.Tensor([w, h, w, h])
+        xywh = box_convert(boxes=boxes, in_fmt="cxcywh", out_fmt="xywh").numpy()
+        return {str(i): box for i, box in enumerate(xywh)}
+
+    def render_labeled_image(self, image_np: np.ndarray, elements: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Draw the set-of-marks boxes and label indices over the image
+        """
+        boxes = torch.tensor([elem['bbox'] for elem in elements]).reshape(-1, 4)
+        boxes = box_convert(boxes=boxes, in_fmt="xyxy", out_fmt="cxcywh")
+        phrases = [i for i in range(len(boxes))]
+        annotated_frame, _ = annotate(
+            image_source=image_np, boxes=boxes, logits=None, phrases=phrases, text_scale=0.4, text_padding=5
+        )
+        return annotated_frame
+
+    def warm_up(self, imgsz: Optional[int] = None) -> float:
+        """
+        Run OCR, the detector and the caption model once on a small synthetic frame, so lazy
+        initialization (reader and session setup, kernel selection, weights paging in) is paid
+        here rather than by the first request
+
+        Returns:
+            Seconds the warm-up took
+        """
+        imgsz = imgsz or self.imgsz
+        image = Image.new('RGB', (imgsz, imgsz), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.text((16, 16), "File Edit View", fill='black')
+        draw.rectangle((16, 48, 80, 112), outline='black', width=3)
+        start = time.perf_counter()
+        with timed('warm_up'):
+            self._run_ocr(image, False)
+            self._detect_icons([image], 0.01, imgsz)
+            # Directly, a cold first call would inflate the per-crop estimate
+            self._caption_crops([image.crop((16, 48, 80, 112))], 1)
+        return time.perf_counter() - start
+
+    def _run_ocr(self, image: Image.Image, use_paddleocr: bool) -> Tuple[List[str], List[List[float]]]:
+        # check_ocr_box takes the decoded PIL image directly, no re-read from disk
         ocr_bbox_rslt, _ = check_ocr_box(
-            image_path,
+            image,
             display_img=False,
             output_bb_format='xyxy',
             easyocr_args={'paragraph': False, 'text_threshold': 0.9},
             use_paddleocr=use_paddleocr
         )
         ocr_text, ocr_bbox = ocr_bbox_rslt
-        print ('OCR done')
+        return ocr_text, ocr_bbox
 
-        # Process with SOM model
-        dino_labeled_img, label_coordinates, parsed_content_list = get_som_labeled_img(
-            image_path,
-            model=self.icon_detect_model,
-            BOX_TRESHOLD=box_threshold,
-            iou_threshold=iou_threshold,
-            caption_model_processor=self.icon_caption_model,
-            ocr_bbox=ocr_bbox,
-            ocr_text=ocr_text,
+    def _detect_icons(self, images: List[Image.Image], box_threshold: float, imgsz: int) -> List[torch.Tensor]:
+        """
+        Run YOLO over a list of images in one call, returns xyxy pixel boxes per image
+        """
+        results = self.icon_detect_model.predict(
+            source=images,
+            conf=box_threshold,
+            iou=0.1,
             imgsz=imgsz,
-            batch_size=icon_process_batch_size
+            verbose=False
+        )
+        return [result.boxes.xyxy.cpu() for result in results]
+
+    def _build_elements(
+        self,
+        icon_xyxy: torch.Tensor,
+        ocr_bbox: List[List[float]],
+        ocr_text: List[str],
+        image_size: Tuple[int, int]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Turn pixel boxes into icon and OCR elements in ratio coordinates, dropping empty boxes
+        """
+        w, h = image_size
+        scale = torch.Tensor([w, h, w, h])
+        icon_boxes = (icon_xyxy / scale).tolist()
+        ocr_boxes = (torch.tensor(ocr_bbox) / scale).tolist() if ocr_bbox else []
+
+        ocr_elements = [
+            {'type': 'text', 'bbox': box, 'interactivity': False, 'content': txt, 'source': 'box_ocr_content_ocr'}
+            for box, txt in zip(ocr_boxes, ocr_text) if int_box_area(box, w, h) > 0
+        ]
+        icon_elements = [
+            {'type': 'icon', 'bbox': box, 'interactivity': True, 'content': None}
+            for box in icon_boxes if int_box_area(box, w, h) > 0
+        ]
+        return icon_elements, ocr_elements
+
+    def _merge_boxes(
+        self,
+        icon_elements: List[Dict[str, Any]],
+        ocr_elements: List[Dict[str, Any]],
+        iou_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop overlapping icons and attach OCR text to icons, same result as OmniParser's remove_overlap_new.
+        Elements that still need a caption (content None) are sorted to the end.
+        """
+        filtered = merge_elements(icon_elements, ocr_elements, iou_threshold)
+        return sorted(filtered, key=lambda elem: elem['content'] is None)
+
+    def _icons_free_of_ocr(
+        self,
+        icon_elements: List[Dict[str, Any]],
+        ocr_elements: List[Dict[str, Any]],
+        iou_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Icons `_merge_boxes` is certain to keep without content: not suppressed by a larger
+        overlapping icon and not intersecting any OCR box
+        """
+        return icons_free_of_ocr(icon_elements, ocr_elements, iou_threshold)
+
+    def _crop_icons(self, image_np: np.ndarray, elements: List[Dict[str, Any]]) -> List[Image.Image]:
+        h, w = image_np.shape[:2]
+        crops = []
+        for elem in elements:
+            x1, y1, x2, y2 = elem['bbox']
+            cropped = image_np[int(y1 * h):int(y2 * h), int(x1 * w):int(x2 * w), :]
+            crops.append(Image.fromarray(cv2.resize(cropped, (64, 64))))
+        return crops
+
+    def _caption_crops(
+        self,
+        crops: List[Image.Image],
+        batch_size: int,
+        on_batch: Optional[Callable[[List[Tuple[int, str]]], None]] = None
+    ) -> List[str]:
+        """
+        Caption icon crops with the caption model, mirrors OmniParser's get_parsed_content_icon.
+        `on_batch` receives (crop index, caption) pairs as each batch finishes.
+        """
+        model, processor = self.icon_caption_model['model'], self.icon_caption_model['processor']
+        is_florence = 'florence' in model.config.name_or_path
+        prompt = "<CAPTION>" if is_florence else "The image shows"
+
+        captions = []
+        for start in range(0, len(crops), batch_size):
+            batch = crops[start:start + batch_size]
+            if model.device.type == 'cuda':
+                inputs = processor(images=batch, text=[prompt] * len(batch), return_tensors="pt", do_resize=False).to(device=model.device, dtype=torch.float16)
+            else:
+                inputs = processor(images=batch, text=[prompt] * len(batch), return_tensors="pt").to(device=model.device)
+            if is_florence:
+                generated_ids = model.generate(input_ids=inputs["input_ids"], pixel_values=inputs["pixel_values"], max_new_tokens=20, num_beams=1, do_sample=False)
+            else:
+                generated_ids = model.generate(**inputs, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=True, num_return_sequences=1)
+            generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)
+            CAPTION_BATCH_SIZE.observe(len(batch))
+            CAPTION_CROPS.inc(len(batch))
+            captions.extend(text.strip() for text in generated_text)
+            if on_batch:
+                on_batch([(start + offset, text.strip()) for offset, text in enumerate(generated_text)])
+        return captions
+
+    def _caption_with_cache(
+        self,
+        crops: List[Image.Image],
+        batch_size: int,
+        on_batch: Optional[Callable[[List[Tuple[int, str]]], None]] = None
+    ) -> List[str]:
+        """
+        Caption crops, sending only crops the caption cache has not seen to the caption model.
+        Flat crops have no usable hash, they always go to the model and are not cached.
+        """
+        if self.caption_cache is None:
+            return self.__model_captions(crops, batch_size, on_batch)
+
+        # Flat crops get a distinct negative key each, perceptual hashes are never negative
+        hashes = [perceptual_hash(crop) for crop in crops]
+        hashes = [phash if phash is not None else -1 - index for index, phash in enumerate(hashes)]
+        hashed = [phash for phash in hashes if phash >= 0]
+        cached = iter(self.caption_cache.get_many(hashed) if hashed else [])
+        captions = [next(cached) if phash >= 0 else None for phash in hashes]
+        # Identical crops within the batch are captioned once
+        missing: Dict[int, Image.Image] = {}
+        for phash, crop, caption in zip(hashes, crops, captions):
+            if caption is None and phash not in missing:
+                missing[phash] = crop
+        if on_batch:
+            on_batch([(index, caption) for index, caption in enumerate(captions) if caption is not None])
+        if missing:
+            # Map progress on the de-duplicated crops back to every crop sharing the hash
+            positions = defaultdict(list)
+            for index, (phash, caption) in enumerate(zip(hashes, captions)):
+                if caption is None:
+                    positions[phash].append(index)
+            missing_hashes = list(missing)
+
+            def missing_batch(pairs: List[Tuple[int, str]]) -> None:
+                on_batch([(index, caption) for offset, caption in pairs for index in positions[missing_hashes[offset]]])
+            new_captions = dict(zip(missing, self.__model_captions(
+                list(missing.values()), batch_size, missing_batch if on_batch else None
+            )))
+            self.caption_cache.put_many({phash: caption for phash, caption in new_captions.items() if phash >= 0})
+            captions = [caption if caption is not None else new_captions[phash] for phash, caption in zip(hashes, captions)]
+        return captions
+
+    def _annotate(self, image_np: np.ndarray, elements: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Draw the set-of-marks labels, returns the base64 PNG and the xywh pixel coordinates per label
+        """
+        annotated_frame = self.render_labeled_image(image_np, elements)
+        label_coordinates = self.label_coordinates(elements, (image_np.shape[1], image_np.shape[0]))
+        buffered = io.BytesIO()
+        Image.fromarray(annotated_frame).save(buffered, format="PNG")
+        return base64.b64encode(buffered.getvalue()).decode('ascii'), label_coordinates
+
+
+    def __plan_detection(self, image_size: Tuple[int, int]) -> Tuple[int, List[Tile]]:
+        return plan_detection(
+            image_size, ADAPTIVE_MIN_IMGSZ, ADAPTIVE_MAX_IMGSZ, ADAPTIVE_TILE_SIZE, ADAPTIVE_TILE_OVERLAP, ADAPTIVE_MAX_DOWNSCALE
         )
-        print ('Image processed')
-        # Save image locally
-        self.__save_labeled_image(dino_labeled_img, result_image_name)
-        print ('Image saved')
 
-        return dino_labeled_img, label_coordinates, parsed_content_list
+    def __timed_ocr(self, image: Image.Image, job: ParseJob) -> Tuple[List[str], List[List[float]]]:
+        with timed('ocr', [job.trace]):
+            tiles = self.__plan_detection(image.size)[1] if job.adaptive else []
+            if len(tiles) < 2:
+                return self._run_ocr(image, job.use_paddleocr)
+            # OCR downsizes very large inputs too, read each tile at full resolution instead
+            texts, tile_boxes = [], []
+            for tile in tiles:
+                tile_text, tile_bbox = self._run_ocr(image.crop(tile), job.use_paddleocr)
+                texts.extend(tile_text)
+                tile_boxes.append(torch.tensor(tile_bbox, dtype=torch.float32).reshape(-1, 4))
+            boxes, keep = merge_tile_boxes(tile_boxes, tiles)
+            return [text for text, kept in zip(texts, keep.tolist()) if kept], boxes[keep].tolist()
+
+    def caption_estimate(self, batch_size: Optional[int] = None) -> Optional[float]:
+        """
+        Caption model seconds per crop on this processor's caption device at `batch_size` (the
+        default batch size when None). Without a measurement at that size, the one of the nearest
+        smaller batch size measured, which is slower per crop. None when there is neither.
+        """
+        batch_size = batch_size or self.icon_process_batch_size
+        device = self.__caption_device()
+        measured = [size for d, size in self._caption_seconds_per_crop if d == device and size <= batch_size]
+        return self._caption_seconds_per_crop[(device, max(measured))] if measured else None
+
+    def __caption_device(self) -> str:
+        model = self.icon_caption_model['model'] if self.icon_caption_model else None
+        return str(getattr(model, 'device', 'cpu'))
+
+    def __model_captions(
+        self,
+        crops: List[Image.Image],
+        batch_size: int,
+        on_batch: Optional[Callable[[List[Tuple[int, str]]], None]] = None
+    ) -> List[str]:
+        # _caption_crops, timed into the per-crop estimate
+        start = time.perf_counter()
+        captions = self._caption_crops(crops, batch_size, on_batch)
+        if crops:
+            per_crop = (time.perf_counter() - start) / len(crops)
+            key = (self.__caption_device(), batch_size)
+            estimate = self._caption_seconds_per_crop.get(key)
+            self._caption_seconds_per_crop[key] = per_crop if estimate is None else 0.7 * estimate + 0.3 * per_crop
+        return captions
+
+    def __timed_captions(
+        self,
+        crops: List[Image.Image],
+        batch_size: int,
+        on_batch: Optional[Callable[[List[Tuple[int, str]]], None]],
+        traces: Set[Optional[Trace]]
+    ) -> List[str]:
+        # Pooled crops of several jobs, each job is charged the whole call
+        with timed('captioning', traces):
+            return self._caption_with_cache(crops, batch_size, on_batch)
+
+    def __budgeted_captions(
+        self,
+        crops: List[Image.Image],
+        owners: List[Tuple[int, Dict[str, Any]]],
+        jobs: List[ParseJob],
+        batch_size: int,
+        streaming: bool
+    ) -> Dict[int, str]:
+        """
+        Caption crops of deadline jobs in the given priority order, one batch at a time.
+
+        Crops whose job has less time left than one crop is expected to take are dropped, and
+        each batch is cut to what the earliest deadline in it still allows, by `caption_estimate`
+        at the batch size it would run with. Without an estimate yet, the first batch has
+        BUDGET_PROBE_BATCH crops. The first batch always captions at least one crop, so an
+        estimate that is too high still gets measured again and corrected.
+
+        Returns:
+            Caption per crop index, for the crops that were captioned
+        """
+        captions: Dict[int, str] = {}
+        queue = list(range(len(crops)))
+        while queue:
+            now = time.monotonic()
+            estimate = self.caption_estimate(batch_size)
+            if captions:
+                queue = [n for n in queue if jobs[owners[n][0]].deadline - now > (estimate or 0.0)]
+                if not queue:
+                    break
+            if estimate is None:
+                size = min(batch_size, BUDGET_PROBE_BATCH)
+            else:
+                remaining = min(jobs[owners[n][0]].deadline for n in queue[:batch_size]) - now
+                size = max(1, min(batch_size, int(remaining / estimate)))
+                # Smaller batches take longer per crop
+                size = max(1, min(size, int(remaining / (self.caption_estimate(size) or estimate))))
+            batch, queue = queue[:size], queue[size:]
+            batch_owners = [owners[n] for n in batch]
+            batch_captions = self.__timed_captions(
+                [crops[n] for n in batch], size,
+                partial(self.__emit_captions, jobs, batch_owners) if streaming else None,
+                {jobs[i].trace for i, _ in batch_owners}
+            )
+            captions.update(zip(batch, batch_captions))
+        return captions
+
+    def __emit(self, job: ParseJob, event: str, payload: Dict[str, Any]) -> None:
+        if job.on_event is None:
+            return
+        try:
+            job.on_event(event, payload)
+        except Exception as e:
+            print (f'Event handler failed: {e}')
+
+    def __emit_region(self, job: ParseJob, region: Region, frame_size: Tuple[int, int], event: str, payload: Dict[str, Any]) -> None:
+        # Events of a region's crop, with boxes mapped back to the full frame
+        payload = dict(payload)
+        if 'elements' in payload:
+            payload['elements'] = [dict(elem, bbox=region_to_frame(elem['bbox'], region, frame_size)) for elem in payload['elements']]
+        if 'boxes' in payload:
+            payload['boxes'] = [region_to_frame(box, region, frame_size) for box in payload['boxes']]
+        self.__emit(job, event, payload)
+
+    def __emit_ocr(self, job: ParseJob, image_size: Tuple[int, int], future) -> None:
+        if future.exception() is not None:
+            return
+        ocr_text, ocr_bbox = future.result()
+        _, ocr_elements = self._build_elements(torch.zeros((0, 4)), ocr_bbox, ocr_text, image_size)
+        self.__emit(job, 'ocr', {'elements': ocr_elements})
 
+    def __emit_captions(self, jobs: List[ParseJob], owners: List[Tuple[int, Dict[str, Any]]], pairs: List[Tuple[int, str]]) -> None:
+        by_job = defaultdict(list)
+        for crop_index, caption in pairs:
+            i, elem = owners[crop_index]
+            by_job[i].append(dict(elem, content=caption, source=elem.get('source', 'box_yolo_content_yolo')))
+        for i, elements in by_job.items():
+            self.__emit(jobs[i], 'captions', {'elements': elements})
 
     def __save_labeled_image(self, dino_labeled_img: str, file_name: str) -> None:
-        labeled_img_path = f"{IMAGE_BASE_PATH}/{RESULT_IMG_FOLDER_NAME}/{file_name}"
-        with open(labeled_img_path, "wb") as f:
-            f.write(base64.b64decode(dino_labeled_img))
-        
\ No newline at end of file
+        if not self.artifacts.put(file_name, base64.b64decode(dino_labeled_img)):
+            print (f'Artifact queue full, labeled image {file_name} not saved')
@@ -0,0 +1,194 @@
+"""
+Spatial and text index over the parsed elements of one result, answering point, rectangle,
+k-nearest and text queries without scanning the element list.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+import heapq
+import math
+import re
+
+import numpy as np
+
+TEXT_MATCHES = ("tokens", "exact", "contains", "regex")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class ElementIndex:
+    """
+    Elements bucketed on a uniform grid over the image, in pixel coordinates, plus an inverted
+    index from content tokens (and normalised full content) to element ids.
+
+    An element id is its position in parsed_content_list, which is also its label index.
+    The cell size follows the typical element size, so a cell holds a handful of elements.
+    """
+
+    def __init__(self, elements: List[Dict[str, Any]], image_size: Tuple[int, int]):
+        w, h = image_size
+        self.elements = elements
+        self.image_size = image_size
+        self.boxes = np.array([elem['bbox'] for elem in elements], dtype=np.float64).reshape(-1, 4) * [w, h, w, h]
+        sizes = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+        self.cell = float(max(2 * np.median(sizes), 16.0)) if len(elements) else float(max(w, h, 1))
+        self.cols = max(1, math.ceil(w / self.cell))
+        self.rows = max(1, math.ceil(h / self.cell))
+        self._grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (x1, y1, x2, y2) in enumerate(self.boxes.tolist()):
+            for cell in self.__cells(x1, y1, x2, y2):
+                self._grid[cell].append(i)
+
+        self._tokens: Dict[str, Set[int]] = defaultdict(set)
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        for i, elem in enumerate(elements):
+            content = elem.get('content')
+            if not isinstance(content, str):
+                continue
+            for token in tokenize(content):
+                self._tokens[token].add(i)
+            self._exact[' '.join(tokenize(content))].append(i)
+
+    def at(self, x: float, y: float, **filters: Any) -> List[int]:
+        """
+        Elements containing the point, innermost (smallest) first
+        """
+        col, row = self.__cell_of(x, y)
+        hits = [
+            i for i in self._grid.get((col, row), ())
+            if self.boxes[i, 0] <= x <= self.boxes[i, 2] and self.boxes[i, 1] <= y <= self.boxes[i, 3]
+        ]
+        return sorted(self.__filter(hits, **filters), key=self.__area)
+
+    def in_rect(self, x1: float, y1: float, x2: float, y2: float, within: bool = False, **filters: Any) -> List[int]:
+        """
+        Elements intersecting the rectangle, or lying entirely inside it with `within`, in id order
+        """
+        hits = set()
+        for cell in self.__cells(x1, y1, x2, y2):
+            hits.update(self._grid.get(cell, ()))
+        boxes = self.boxes
+        if within:
+            keep = [i for i in hits if boxes[i, 0] >= x1 and boxes[i, 1] >= y1 and boxes[i, 2] <= x2 and boxes[i, 3] <= y2]
+        else:
+            keep = [i for i in hits if boxes[i, 0] <= x2 and boxes[i, 2] >= x1 and boxes[i, 1] <= y2 and boxes[i, 3] >= y1]
+        return sorted(self.__filter(keep, **filters))
+
+    def nearest(self, x: float, y: float, k: int = 1, exclude: Iterable[int] = (), **filters: Any) -> List[Tuple[int, float]]:
+        """
+        The k elements closest to the point, by distance from the point to each box (0 inside it).
+
+        Grid rings around the point's cell are visited outwards and the search stops once k
+        elements are closer than anything in the unvisited rings can be.
+
+        Returns:
+            (element id, distance in pixels) pairs, closest first
+        """
+        excluded = set(exclude)
+        col, row = self.__cell_of(x, y)
+        # Distance from the point to the edge of its own cell, rings beyond ring r are at least this much plus r cells away
+        inner = min(x - col * self.cell, (col + 1) * self.cell - x, y - row * self.cell, (row + 1) * self.cell - y)
+        seen: Set[int] = set()
+        best: List[Tuple[float, int]] = []  # max-heap of the k best as (-distance, -id)
+        max_ring = max(col, self.cols - 1 - col, row, self.rows - 1 - row)
+        for ring in range(max_ring + 1):
+            for cell in self.__ring(col, row, ring):
+                for i in self._grid.get(cell, ()):
+                    if i in seen or i in excluded:
+                        continue
+                    seen.add(i)
+                    if not self.__filter([i], **filters):
+                        continue
+                    candidate = (-self.__distance(i, x, y), -i)
+                    if len(best) < k:
+                        heapq.heappush(best, candidate)
+                    elif candidate > best[0]:
+                        heapq.heapreplace(best, candidate)
+            if len(best) == k and -best[0][0] <= max(0.0, inner) + ring * self.cell:
+                break
+        return [(-neg_id, -neg_distance) for neg_distance, neg_id in sorted(best, reverse=True)]
+
+    def search(self, query: str, match: str = "tokens", **filters: Any) -> List[int]:
+        """
+        Elements whose content matches the query, in id order
+
+        - tokens: every word of the query is a word of the content (case-insensitive)
+        - exact: the content equals the query, ignoring case, punctuation and spacing
+        - contains: the query is a case-insensitive substring of the content
+        - regex: the query is a regular expression searched in the content
+
+        tokens and exact are index lookups, contains and regex check every element with text.
+
+        Raises:
+            ValueError: unknown match mode or invalid regular expression
+        """
+        if match not in TEXT_MATCHES:
+            raise ValueError(f"match must be one of {', '.join(TEXT_MATCHES)}")
+        if match == "tokens":
+            postings = [self._tokens.get(token, set()) for token in tokenize(query)]
+            hits = set.intersection(*postings) if postings else set()
+        elif match == "exact":
+            hits = set(self._exact.get(' '.join(tokenize(query)), ()))
+        else:
+            if match == "regex":
+                try:
+                    pattern = re.compile(query, re.IGNORECASE)
+                except re.error as e:
+                    raise ValueError(f"Invalid regular expression: {e}")
+            else:
+                pattern = re.compile(re.escape(query), re.IGNORECASE)
+            hits = {
+                i for i, elem in enumerate(self.elements)
+                if isinstance(elem.get('content'), str) and pattern.search(elem['content'])
+            }
+        return sorted(self.__filter(hits, **filters))
+
+    def describe(self, i: int, **extra: Any) -> Dict[str, Any]:
+        """
+        One element as returned by the query endpoints: its id, parsed_content_list entry and pixel box
+        """
+        return {"id": i, **self.elements[i], "box": [round(v, 2) for v in self.boxes[i].tolist()], **extra}
+
+    def __filter(self, ids: Iterable[int], type: Optional[str] = None, interactivity: Optional[bool] = None) -> List[int]:
+        return [
+            i for i in ids
+            if (type is None or self.elements[i].get('type') == type)
+            and (interactivity is None or bool(self.elements[i].get('interactivity')) == interactivity)
+        ]
+
+    def __area(self, i: int) -> float:
+        x1, y1, x2, y2 = self.boxes[i]
+        return (x2 - x1) * (y2 - y1)
+
+    def __distance(self, i: int, x: float, y: float) -> float:
+        x1, y1, x2, y2 = self.boxes[i]
+        dx = max(x1 - x, 0.0, x - x2)
+        dy = max(y1 - y, 0.0, y - y2)
+        return math.hypot(dx, dy)
+
+    def __cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return (
+            min(max(int(x // self.cell), 0), self.cols - 1),
+            min(max(int(y // self.cell), 0), self.rows - 1)
+        )
+
+    def __cells(self, x1: float, y1: float, x2: float, y2: float) -> Iterable[Tuple[int, int]]:
+        c1, r1 = self.__cell_of(x1, y1)
+        c2, r2 = self.__cell_of(x2, y2)
+        return ((c, r) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+
+    def __ring(self, col: int, row: int, ring: int) -> Iterable[Tuple[int, int]]:
+        if ring == 0:
+            yield col, row
+            return
+        for c in range(col - ring, col + ring + 1):
+            for r in (row - ring, row + ring):
+                if 0 <= c < self.cols and 0 <= r < self.rows:
+                    yield c, r
+        for r in range(row - ring + 1, row + ring):
+            for c in (col - ring, col + ring):
+                if 0 <= c < self.cols and 0 <= r < self.rows:
+                    yield c, r
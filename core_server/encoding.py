@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional, without it every response is JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _accept_quality(accept: str) -> Dict[str, float]:
+    qualities = {}
+    for part in accept.split(','):
+        media_type, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type:
+            qualities[media_type.lower()] = q
+    return qualities
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """
+    True when the Accept header prefers MessagePack over JSON, JSON stays the default
+    """
+    if not accept or msgpack is None:
+        return False
+    qualities = _accept_quality(accept)
+    packed = max(qualities.get(t, 0.0) for t in MSGPACK_MEDIA_TYPES)
+    json_q = max(qualities.get(JSON_MEDIA_TYPE, 0.0), qualities.get("application/*", 0.0), qualities.get("*/*", 0.0))
+    return packed > 0 and packed >= json_q
+
+
+def pack_result(label_coordinates: Dict[str, Any], parsed_content_list: List[Dict[str, Any]], **extra: Any) -> bytes:
+    """
+    Columnar MessagePack encoding of a parse result.
+
+    `boxes` holds the label coordinates (xywh, pixels) and `bbox` the element boxes
+    (xyxy, 0-1), each as little-endian float32 bytes of shape (count, 4) in label order.
+    Every other element field becomes one list column, e.g. `type`, `interactivity`, `content`.
+    Remaining response fields (result_id, labeled_image_path, ...) are passed through as-is.
+    """
+    count = len(parsed_content_list)
+    boxes = np.asarray([label_coordinates[str(i)] for i in range(count)], dtype='<f4').reshape(count, 4)
+    bbox = np.asarray([elem['bbox'] for elem in parsed_content_list], dtype='<f4').reshape(count, 4)
+    fields = []
+    for elem in parsed_content_list:
+        fields.extend(key for key in elem if key != 'bbox' and key not in fields)
+    payload = {
+        **extra,
+        "count": count,
+        "boxes": boxes.tobytes(),
+        "bbox": bbox.tobytes(),
+        "columns": {field: [elem.get(field) for elem in parsed_content_list] for field in fields}
+    }
+    return msgpack.packb(payload, use_bin_type=True)
@@ -0,0 +1,89 @@
+from PIL import Image
+from typing import List, Tuple, Union
+from pathlib import Path
+import io
+import math
+
+import numpy as np
+
+ImageSource = Union[str, Path, bytes, Image.Image, np.ndarray]
+
+
+def load_image(source: ImageSource) -> Image.Image:
+    """
+    Decode any supported image source once into a loaded RGB PIL image
+
+    Args:
+        source: File path, encoded image bytes, PIL image or HxWxC uint8 RGB(A) array
+
+    Returns:
+        RGB image whose pixel buffer is shared by OCR, detection and cropping
+    """
+    if isinstance(source, (str, Path)):
+        image = Image.open(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    elif isinstance(source, np.ndarray):
+        if source.ndim == 3 and source.shape[2] == 4:
+            source = source[:, :, :3]
+        image = Image.fromarray(np.ascontiguousarray(source))
+    elif isinstance(source, Image.Image):
+        image = source
+    else:
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.load()
+    return image
+
+
+Region = Tuple[int, int, int, int]  # x1, y1, x2, y2 in pixels
+
+
+def clip_regions(regions: List[Region], image_size: Tuple[int, int]) -> List[Region]:
+    """
+    Clamp pixel regions to the image, raises ValueError for a non-finite coordinate or a region left empty
+    """
+    w, h = image_size
+    clipped = []
+    for region in regions:
+        if not all(math.isfinite(v) for v in region):
+            raise ValueError(f"Region {list(region)} has a non-finite coordinate")
+        x1, y1, x2, y2 = (int(round(v)) for v in region)
+        x1, x2 = max(0, min(x1, w)), max(0, min(x2, w))
+        y1, y2 = max(0, min(y1, h)), max(0, min(y2, h))
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Region {list(region)} is empty or outside the {w}x{h} image")
+        clipped.append((x1, y1, x2, y2))
+    return clipped
+
+
+def merge_regions(regions: List[Region]) -> List[Region]:
+    """
+    Replace overlapping regions with their bounding box until none overlap, so no pixel is parsed twice
+    """
+    merged: List[Region] = []
+    for region in regions:
+        while True:
+            overlapping = [r for r in merged if region[0] < r[2] and r[0] < region[2] and region[1] < r[3] and r[1] < region[3]]
+            if not overlapping:
+                break
+            for r in overlapping:
+                merged.remove(r)
+                region = (min(region[0], r[0]), min(region[1], r[1]), max(region[2], r[2]), max(region[3], r[3]))
+        merged.append(region)
+    return merged
+
+
+def region_to_frame(bbox: List[float], region: Region, frame_size: Tuple[int, int]) -> List[float]:
+    """
+    Map a bbox in ratio coordinates of a region crop to ratio coordinates of the full frame
+    """
+    x1, y1, x2, y2 = region
+    w, h = frame_size
+    rw, rh = x2 - x1, y2 - y1
+    return [
+        (x1 + bbox[0] * rw) / w, (y1 + bbox[1] * rh) / h,
+        (x1 + bbox[2] * rw) / w, (y1 + bbox[3] * rh) / h
+    ]
@@ -0,0 +1,154 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+import uuid
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram with optional labels
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': repr(float(bound))})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+
+def render_gauges(name: str, help: str, values: Dict[str, float], label: Optional[str] = None) -> List[str]:
+    """
+    Gauge lines for values read at scrape time, one unlabelled value or one series per `label` value
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        lines.append(f"{name}{_format_labels({label: key} if label else {})} {value}")
+    return lines
+
+
+STAGE_SECONDS = Histogram(
+    'omniparser_stage_seconds',
+    'Duration of one pipeline stage call (batched stages are observed once per batch)',
+    labelnames=('stage',)
+)
+REQUEST_SECONDS = Histogram(
+    'omniparser_request_seconds',
+    'End-to-end request latency',
+    labelnames=('endpoint', 'status')
+)
+CAPTION_BATCH_SIZE = Histogram(
+    'omniparser_caption_batch_size',
+    'Icon crops per caption model call',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+CAPTION_CROPS = Counter('omniparser_caption_crops_total', 'Icon crops sent to the caption model')
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, CAPTION_BATCH_SIZE, CAPTION_CROPS]
+
+
+def render_metrics(extra_lines: Iterable[str] = ()) -> str:
+    lines = [line for metric in REGISTRY for line in metric.render()]
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """
+    Per-request stage durations, tagged with a trace id. A stage that runs several times
+    for one request (e.g. early and late captioning) accumulates.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"trace_id": self.trace_id, "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()}}
+
+    def server_timing(self) -> str:
+        # Server-Timing header value, shown per request in browser dev tools
+        with self._lock:
+            return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+@contextmanager
+def timed(stage: str, traces: Iterable[Optional[Trace]] = ()):
+    """
+    Observe the duration of the block in the stage histogram and add it to every given trace
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        for trace in traces:
+            if trace is not None:
+                trace.add(stage, elapsed)
@@ -0,0 +1,191 @@
+"""
+Vectorized box overlap and merge, producing exactly what OmniParser's `remove_overlap_new`
+produces for the same input.
+
+remove_overlap_new compares every icon with every icon and every kept icon with every
+OCR box in Python. Here the same tests run as NumPy matrices. Past `DENSE_MAX_PAIRS`
+box pairs, a uniform grid first narrows the comparison to boxes that share a cell.
+Every rule needs a non-empty intersection, so that prefilter loses nothing.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DENSE_MAX_PAIRS = 512 * 512
+INSIDE_RATIO = 0.80  # remove_overlap_new's is_inside
+
+
+def box_areas(boxes: np.ndarray) -> np.ndarray:
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def pair_intersections(a: np.ndarray, b: np.ndarray, ia: np.ndarray, ib: np.ndarray) -> np.ndarray:
+    width = np.minimum(a[ia, 2], b[ib, 2]) - np.maximum(a[ia, 0], b[ib, 0])
+    height = np.minimum(a[ia, 3], b[ib, 3]) - np.maximum(a[ia, 1], b[ib, 1])
+    return np.maximum(0, width) * np.maximum(0, height)
+
+
+def _grid_cells(boxes: np.ndarray, cell: float, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    # (box index, cell id) for every grid cell each box touches
+    lo = np.floor(boxes[:, :2] / cell).astype(np.int64).clip(0, cols - 1)
+    hi = np.floor(boxes[:, 2:] / cell).astype(np.int64).clip(0, cols - 1)
+    spans = hi - lo + 1
+    counts = spans[:, 0] * spans[:, 1]
+    owner = np.repeat(np.arange(len(boxes)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    x = lo[owner, 0] + offset % spans[owner, 0]
+    y = lo[owner, 1] + offset // spans[owner, 0]
+    return owner, y * cols + x
+
+
+def candidate_pairs(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Index pairs (into a, into b) that may intersect: all pairs for small inputs, otherwise
+    pairs sharing a grid cell. Boxes are in 0-1 ratio coordinates.
+    """
+    if len(a) * len(b) <= DENSE_MAX_PAIRS:
+        ia, ib = np.meshgrid(np.arange(len(a)), np.arange(len(b)), indexing='ij')
+        return ia.ravel(), ib.ravel()
+
+    both = np.concatenate([a, b])
+    sizes = np.maximum(both[:, 2] - both[:, 0], both[:, 3] - both[:, 1])
+    cell = float(np.clip(2 * np.median(sizes), 1 / 256, 1.0))
+    cols = int(np.ceil(1 / cell)) + 1
+    a_owner, a_cell = _grid_cells(a, cell, cols)
+    b_owner, b_cell = _grid_cells(b, cell, cols)
+
+    # Join on cell id: for every (a, cell) entry, every b entry in the same cell
+    order = np.argsort(b_cell, kind='stable')
+    b_owner, b_cell = b_owner[order], b_cell[order]
+    start = np.searchsorted(b_cell, a_cell, side='left')
+    stop = np.searchsorted(b_cell, a_cell, side='right')
+    counts = stop - start
+    ia = np.repeat(a_owner, counts)
+    ib = b_owner[np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+    # Boxes sharing several cells are paired once
+    keys = np.unique(ia * len(b) + ib)
+    return keys // len(b), keys % len(b)
+
+
+def suppressed_icons(icons: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    remove_overlap_new's icon rule: an icon is dropped when another icon of smaller area
+    overlaps it by more than `iou_threshold` (max of IoU and both containment ratios)
+    """
+    area = box_areas(icons)
+    if iou_threshold < 0:
+        # Every pair passes the overlap test, only areas decide
+        return area > area.min() if len(icons) else np.zeros(0, dtype=bool)
+    ia, ib = candidate_pairs(icons, icons)
+    distinct = ia != ib
+    ia, ib = ia[distinct], ib[distinct]
+    inter = pair_intersections(icons, icons, ia, ib)
+    area_a, area_b = area[ia], area[ib]
+    union = area_a + area_b - inter + 1e-6
+    both_positive = (area_a > 0) & (area_b > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio1 = np.where(both_positive, inter / area_a, 0)
+        ratio2 = np.where(both_positive, inter / area_b, 0)
+    iou = np.maximum(inter / union, np.maximum(ratio1, ratio2))
+    hit = (iou > iou_threshold) & (area_a > area_b)
+    suppressed = np.zeros(len(icons), dtype=bool)
+    suppressed[ia[hit]] = True
+    return suppressed
+
+
+def merge_elements(
+    icon_elements: List[Dict[str, Any]],
+    ocr_elements: Optional[List[Dict[str, Any]]],
+    iou_threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Same result as `remove_overlap_new(icon_elements, iou_threshold, ocr_elements)`,
+    with bare icon boxes (the no-OCR case) wrapped into icon elements.
+
+    For each kept icon, OCR boxes are scanned in order. A box mostly inside the icon is
+    absorbed: its text is appended to the icon's content and it is removed from the
+    output. The scan stops at the first OCR box the icon lies inside, and then the icon
+    is dropped. Boxes absorbed before that point stay removed.
+    """
+    if not icon_elements:
+        return list(ocr_elements or [])
+    icons = np.array([elem['bbox'] for elem in icon_elements], dtype=np.float64).reshape(-1, 4)
+    kept = np.flatnonzero(~suppressed_icons(icons, iou_threshold))
+    if not ocr_elements:
+        return [
+            {'type': 'icon', 'bbox': icon_elements[k]['bbox'], 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'}
+            for k in kept
+        ]
+
+    ocr = np.array([elem['bbox'] for elem in ocr_elements], dtype=np.float64).reshape(-1, 4)
+    m = len(ocr)
+    ik, io = candidate_pairs(icons[kept], ocr)
+    inter = pair_intersections(icons[kept], ocr, ik, io)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ocr_in_icon = inter / box_areas(ocr)[io] > INSIDE_RATIO
+        icon_in_ocr = inter / box_areas(icons)[kept][ik] > INSIDE_RATIO
+    # A non-string text raises inside remove_overlap_new's try before the removal, the box is skipped
+    has_text = np.array([isinstance(elem['content'], str) for elem in ocr_elements])
+    absorbs = ocr_in_icon & has_text[io]
+    stops = ~ocr_in_icon & icon_in_ocr
+
+    stop_at = np.full(len(kept), m)
+    np.minimum.at(stop_at, ik[stops], io[stops])
+    absorbed = absorbs & (io < stop_at[ik])
+    ik, io = ik[absorbed], io[absorbed]
+    order = np.lexsort((io, ik))
+    labels: Dict[int, str] = {}
+    for k, o in zip(ik[order].tolist(), io[order].tolist()):
+        labels[k] = labels.get(k, '') + ocr_elements[o]['content'] + ' '
+
+    removed = _removed_by_value(ocr_elements, np.bincount(io, minlength=m))
+    merged = [elem for elem, gone in zip(ocr_elements, removed) if not gone]
+    for k in np.flatnonzero(stop_at == m).tolist():
+        icon = icon_elements[kept[k]]
+        if k in labels:
+            merged.append({'type': 'icon', 'bbox': icon['bbox'], 'interactivity': True, 'content': labels[k], 'source': 'box_yolo_content_ocr'})
+        else:
+            merged.append({'type': 'icon', 'bbox': icon['bbox'], 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'})
+    return merged
+
+
+def _element_key(elem: Dict[str, Any]) -> Tuple:
+    return tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(elem.items()))
+
+
+def _removed_by_value(ocr_elements: List[Dict[str, Any]], absorptions: np.ndarray) -> np.ndarray:
+    """
+    remove_overlap_new drops absorbed boxes with list.remove, which takes the first
+    remaining *equal* element. Each absorption of a box therefore removes the earliest
+    remaining of its equal copies. So a group of identical boxes absorbed E times loses
+    its first E members, whichever of them was absorbed.
+    """
+    groups: Dict[Tuple, List[int]] = {}
+    for index, elem in enumerate(ocr_elements):
+        groups.setdefault(_element_key(elem), []).append(index)
+    removed = np.zeros(len(ocr_elements), dtype=bool)
+    for members in groups.values():
+        count = int(absorptions[members].sum())
+        removed[members[:count]] = True
+    return removed
+
+
+def icons_free_of_ocr(
+    icon_elements: List[Dict[str, Any]],
+    ocr_elements: List[Dict[str, Any]],
+    iou_threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Icons `merge_elements` is certain to keep without content: not suppressed by another
+    icon and not intersecting any OCR box
+    """
+    if not icon_elements:
+        return []
+    icons = np.array([elem['bbox'] for elem in icon_elements], dtype=np.float64).reshape(-1, 4)
+    keep = ~suppressed_icons(icons, iou_threshold)
+    if ocr_elements:
+        ocr = np.array([elem['bbox'] for elem in ocr_elements], dtype=np.float64).reshape(-1, 4)
+        ia, io = candidate_pairs(icons, ocr)
+        touching = pair_intersections(icons, ocr, ia, io) > 0
+        keep[ia[touching]] = False
+    return [elem for elem, kept in zip(icon_elements, keep) if kept]
@@ -0,0 +1,226 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pathlib import Path
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .metrics import timed
+
+
+class BackgroundWriter:
+    """
+    Single background thread for writing request artifacts, keeps disk I/O off the request path
+
+    At most `queue_size` writes wait at once, further ones are dropped instead of blocking the
+    request. The thread starts on the first write, so a writer created before the server forks
+    its workers still gets a live thread in each of them.
+    """
+
+    def __init__(self, queue_size: int = 256, idle_interval: float = 60.0):
+        """
+        Args:
+            idle_interval: Seconds between `on_idle` callbacks while no writes arrive
+        """
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._idle_interval = idle_interval
+        self._idle_callbacks: List[Callable[[], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._owner_pid = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, fn: Callable, *args: Any) -> Optional[Future]:
+        """
+        Returns:
+            Future of the call, None when the queue is full and the write was dropped
+        """
+        self.__ensure_thread()
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        future.add_done_callback(self.__report_error)
+        return future
+
+    def on_idle(self, callback: Callable[[], None]) -> None:
+        self._idle_callbacks.append(callback)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), "queue_size": self._queue.maxsize, "dropped": self.dropped}
+
+    def __ensure_thread(self) -> None:
+        with self._start_lock:
+            if self._thread is None or self._owner_pid != os.getpid():
+                self._owner_pid = os.getpid()
+                self._thread = threading.Thread(target=self.__run, name="artifact-writer", daemon=True)
+                self._thread.start()
+
+    def __run(self) -> None:
+        while True:
+            try:
+                future, fn, args = self._queue.get(timeout=self._idle_interval)
+            except queue.Empty:
+                for callback in self._idle_callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print (f'Background idle task failed: {e}')
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    @staticmethod
+    def __report_error(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print (f'Background write failed: {future.exception()}')
+
+
+class ArtifactStore:
+    """
+    Directory of request artifacts (uploads, labeled images) capped by total size and age.
+
+    Files are written through a `BackgroundWriter`. Every file is recorded in a SQLite index
+    next to the directory, with its size and write time, and a running total of the bytes
+    kept. Each eviction reads the oldest row through the write-time index and unlinks one
+    file instead of scanning the directory. Pre-fork workers share the index file, so the
+    cap holds for the directory and not per worker. Files already in the directory when the
+    index is created are indexed once, by modification time, so leftovers from earlier runs
+    are evicted too.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        ttl_seconds: Optional[float],
+        writer: Optional[BackgroundWriter] = None
+    ):
+        """
+        Args:
+            max_bytes: Total size kept, oldest files are evicted beyond it
+            ttl_seconds: Files older than this are evicted, None keeps them until evicted by size
+            writer: Shared background writer, a private one when None
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = str(self.directory.with_name(self.directory.name + '.index.sqlite3'))
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.writer = writer or BackgroundWriter()
+        self._evictions = 0
+        self._local = threading.local()
+        self.__init_index()
+        # Expire files even when nothing new is written
+        self.writer.on_idle(self.__evict)
+
+    def put(self, name: str, data: bytes) -> bool:
+        """
+        Queue `data` to be written as `name`
+
+        Returns:
+            False when the writer's queue was full and the artifact was dropped
+        """
+        return self.writer.submit(self.__store, name, data) is not None
+
+    def path(self, name: str) -> str:
+        return str(self.directory / name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.__connection().execute("SELECT 1 FROM files WHERE name = ?", (name,)).fetchone() is not None
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.__connection()
+        files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        total = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+        return {
+            "directory": str(self.directory),
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self._evictions,  # by this process
+            **self.writer.stats()
+        }
+
+    def __init_index(self) -> None:
+        with self.__transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, bytes INTEGER NOT NULL, written_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_written_at ON files (written_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            if conn.execute("SELECT 1 FROM totals").fetchone() is not None:
+                return
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime))
+            conn.executemany("INSERT OR REPLACE INTO files (name, bytes, written_at) VALUES (?, ?, ?)", files)
+            conn.execute("INSERT INTO totals (id, bytes) VALUES (0, ?)", (sum(size for _, size, _ in files),))
+
+    def __store(self, name: str, data: bytes) -> None:
+        path = self.directory / name
+        tmp_path = path.with_name(path.name + '.tmp')
+        with timed('persist'):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self.__transaction() as conn:
+            previous = conn.execute("SELECT bytes FROM files WHERE name = ?", (name,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO files (name, bytes, written_at) VALUES (?, ?, ?)", (name, len(data), time.time()))
+            conn.execute("UPDATE totals SET bytes = bytes + ?", (len(data) - (previous[0] if previous else 0),))
+        self.__evict()
+
+    def __evict(self) -> None:
+        expired_before = time.time() - self.ttl_seconds if self.ttl_seconds is not None else None
+        evicted = []
+        with self.__transaction() as conn:
+            total = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+            while True:
+                oldest = conn.execute("SELECT name, bytes, written_at FROM files ORDER BY written_at LIMIT 1").fetchone()
+                if oldest is None:
+                    break
+                name, size, written_at = oldest
+                if total <= self.max_bytes and (expired_before is None or written_at >= expired_before):
+                    break
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+                total -= size
+                evicted.append(name)
+            conn.execute("UPDATE totals SET bytes = ?", (total,))
+        self._evictions += len(evicted)
+        for name in evicted:
+            try:
+                os.unlink(self.directory / name)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def __transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so workers never deadlock upgrading a read
+        conn = self.__connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def __connection(self) -> sqlite3.Connection:
+        # Per thread and per process, a connection must not be used across a fork
+        conn, pid = getattr(self._local, 'conn', (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (conn, os.getpid())
+        return conn
@@ -0,0 +1,213 @@
+from PIL import Image
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import io
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .imaging import load_image
+from .element_index import ElementIndex
+
+RENDER_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+RENDER_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+@dataclass
+class ResultRecord:
+    image_bytes: bytes  # the upload as received, decoded again only when a render is requested
+    image_size: Tuple[int, int]
+    elements: List[Dict[str, Any]]
+    created_at: float
+    index: Optional[ElementIndex] = None  # built on the first query
+
+
+class SharedResults:
+    """
+    Parse results in a SQLite file, so every worker process on the host can answer for a result
+    any of them produced. Oldest results beyond `max_results` or `max_bytes` of uploads are deleted.
+    """
+
+    def __init__(self, path: str, max_results: int = 1024, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self.__connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, created_at REAL NOT NULL, width INTEGER NOT NULL, "
+                "height INTEGER NOT NULL, elements TEXT NOT NULL, image BLOB NOT NULL, bytes INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+
+    def put(self, result_id: str, record: ResultRecord) -> None:
+        conn = self.__connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (id, created_at, width, height, elements, image, bytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (result_id, record.created_at, record.image_size[0], record.image_size[1],
+                 json.dumps(record.elements), record.image_bytes, len(record.image_bytes))
+            )
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+            while count > 1 and (count > self.max_results or total > self.max_bytes):
+                oldest, size = conn.execute("SELECT id, bytes FROM results ORDER BY created_at LIMIT 1").fetchone()
+                conn.execute("DELETE FROM results WHERE id = ?", (oldest,))
+                count, total = count - 1, total - size
+
+    def get(self, result_id: str) -> Optional[ResultRecord]:
+        row = self.__connection().execute(
+            "SELECT image, width, height, elements, created_at FROM results WHERE id = ?", (result_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        image_bytes, width, height, elements, created_at = row
+        return ResultRecord(image_bytes=bytes(image_bytes), image_size=(width, height), elements=json.loads(elements), created_at=created_at)
+
+    def __connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class ResultStore:
+    """
+    Parse results kept by id so the labeled image can be drawn on request instead of on every parse.
+
+    Records hold the encoded upload and the parsed elements and are evicted least recently used
+    once either `max_results` or `max_bytes` of uploads is exceeded. Rendered images are kept
+    in a small LRU keyed on (result id, format, width, quality).
+
+    With `shared`, every record is also written there and ids this process does not hold are
+    looked up in it, for pre-fork workers answering for each other's results.
+    """
+
+    def __init__(
+        self,
+        renderer: Callable[[np.ndarray, List[Dict[str, Any]]], np.ndarray],
+        max_results: int = 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        render_cache_size: int = 32,
+        shared: Optional[SharedResults] = None
+    ):
+        self.renderer = renderer
+        self.shared = shared
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.render_cache_size = render_cache_size
+
+        self._records: "OrderedDict[str, ResultRecord]" = OrderedDict()
+        self._bytes = 0
+        self._renders: "OrderedDict[Tuple[str, str, Optional[int], int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.render_hits = 0
+
+    def put(self, image_bytes: bytes, image_size: Tuple[int, int], elements: List[Dict[str, Any]]) -> str:
+        result_id = uuid.uuid4().hex
+        record = ResultRecord(image_bytes=image_bytes, image_size=image_size, elements=elements, created_at=time.time())
+        if self.shared is not None:
+            self.shared.put(result_id, record)
+        self.__keep(result_id, record)
+        return result_id
+
+    def get(self, result_id: str) -> Optional[ResultRecord]:
+        with self._lock:
+            record = self._records.get(result_id)
+            if record is not None:
+                self._records.move_to_end(result_id)
+                return record
+        if self.shared is None:
+            return None
+        record = self.shared.get(result_id)
+        if record is not None:
+            self.__keep(result_id, record)
+        return record
+
+    def __keep(self, result_id: str, record: ResultRecord) -> None:
+        with self._lock:
+            previous = self._records.pop(result_id, None)
+            if previous is not None:
+                self._bytes -= len(previous.image_bytes)
+            self._records[result_id] = record
+            self._bytes += len(record.image_bytes)
+            while self._records and (len(self._records) > self.max_results or self._bytes > self.max_bytes):
+                evicted_id, evicted = self._records.popitem(last=False)
+                self._bytes -= len(evicted.image_bytes)
+                for key in [key for key in self._renders if key[0] == evicted_id]:
+                    del self._renders[key]
+
+    def index(self, result_id: str) -> Optional[ElementIndex]:
+        """
+        Spatial and text index over a result's elements, built on first use
+        """
+        record = self.get(result_id)
+        if record is None:
+            return None
+        if record.index is None:
+            # Two concurrent first queries may both build it, either copy is the same
+            record.index = ElementIndex(record.elements, record.image_size)
+        return record.index
+
+    def render(self, result_id: str, fmt: str = "png", max_width: Optional[int] = None, quality: int = 85) -> Optional[bytes]:
+        """
+        Encoded labeled image for a result, drawn at full size and then downscaled to `max_width`
+
+        Raises:
+            ValueError: unknown format
+        """
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(RENDER_FORMATS)}")
+        record = self.get(result_id)
+        if record is None:
+            return None
+        if max_width is not None and max_width >= record.image_size[0]:
+            max_width = None
+        # Quality has no effect on PNG, don't let it split the cache
+        key = (result_id, fmt, max_width, quality if fmt != "png" else 0)
+        with self._lock:
+            cached = self._renders.get(key)
+            if cached is not None:
+                self._renders.move_to_end(key)
+                self.render_hits += 1
+                return cached
+
+        image_np = np.asarray(load_image(record.image_bytes))
+        labeled = Image.fromarray(self.renderer(image_np, record.elements))
+        if max_width is not None:
+            w, h = labeled.size
+            labeled = labeled.resize((max_width, max(1, round(h * max_width / w))), Image.LANCZOS)
+        buffered = io.BytesIO()
+        if fmt == "png":
+            labeled.save(buffered, format="PNG")
+        else:
+            labeled.save(buffered, format=RENDER_FORMATS[fmt], quality=quality)
+        data = buffered.getvalue()
+
+        with self._lock:
+            self.renders += 1
+            if result_id in self._records:
+                self._renders[key] = data
+                while len(self._renders) > self.render_cache_size:
+                    self._renders.popitem(last=False)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "results": len(self._records),
+                "bytes": self._bytes,
+                "cached_renders": len(self._renders),
+                "renders": self.renders,
+                "render_hits": self.render_hits
+            }
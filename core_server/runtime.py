@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Optional
+import json
+import os
+
+# Set by the pre-fork master (core_server.serve) before workers import the server module
+PRELOADED_PROCESSOR = None
+WORKERS_FILE_ENV = "OMNIPARSER_WORKERS_FILE"
+WORKER_COUNT_ENV = "OMNIPARSER_WORKER_COUNT"
+
+
+def worker_count() -> int:
+    """
+    Number of pre-fork workers serving this port, 1 under plain uvicorn
+    """
+    return int(os.environ.get(WORKER_COUNT_ENV, "1"))
+
+
+def process_memory(pid: int) -> Dict[str, Any]:
+    """
+    Memory of one process in MiB, from /proc (Linux only).
+
+    PSS splits every shared page evenly between the processes mapping it, so the sum of
+    PSS over all workers is their true combined footprint, unlike the sum of RSS.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError as e:
+        return {"pid": pid, "error": str(e)}
+    return {
+        "pid": pid,
+        "rss_mib": fields.get('Rss', 0.0),
+        "pss_mib": fields.get('Pss', 0.0),
+        "shared_mib": fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+        "private_mib": fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    }
+
+
+def write_workers_file(path: str, master_pid: int, workers: List[Dict[str, Any]]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"master": master_pid, "workers": workers}, f)
+    os.replace(tmp_path, path)
+
+
+def workers_memory_report() -> Optional[Dict[str, Any]]:
+    """
+    Per-process memory for the master and every worker, None when not running under the pre-fork master
+    """
+    path = os.environ.get(WORKERS_FILE_ENV)
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        layout = json.load(f)
+    workers = []
+    for worker in layout["workers"]:
+        workers.append({**process_memory(worker["pid"]), "cores": worker["cores"], "torch_threads": worker["torch_threads"]})
+    measured = [w for w in workers if "error" not in w]
+    return {
+        "master": process_memory(layout["master"]),
+        "workers": workers,
+        "total_rss_mib": sum(w["rss_mib"] for w in measured),
+        "total_pss_mib": sum(w["pss_mib"] for w in measured)
+    }
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset this process's peak RSS (VmHWM), so the next `peak_rss_mib` covers only what ran since.
+    Linux only, returns False when the peak could not be reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mib() -> Optional[float]:
+    """
+    Peak RSS of this process in MiB since start or the last `reset_peak_rss`, None where /proc is missing
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
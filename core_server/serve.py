@@ -0,0 +1,173 @@
+"""
+Pre-fork server: load the models once, then fork uvicorn workers that share them.
+
+The master process builds the ImageProcessor (YOLO, Florence and the OCR readers), optionally
+moves the model weights into shared memory, binds the listening socket and forks the workers.
+Weight pages are inherited copy-on-write and never written by inference, so every worker
+maps the same physical memory. Each worker is pinned to its own slice of the CPU cores and
+sets its torch thread count to match, or to this host's tuning profile (see `autotune`) when
+that is lower. The master restarts workers that exit.
+
+    python -m core_server.serve --workers 4 --port 8000
+
+No inference may run in the master before forking: OpenMP thread pools started before a
+fork are not usable in the children.
+"""
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+import torch
+
+from . import runtime
+from .core import ImageProcessor
+from .backends import BACKENDS
+from .tuning import TuningProfile, ensure_profile
+from .constants import ICON_DETECT_MODEL_PATH, IMAGE_BASE_PATH, INFERENCE_BACKEND, INT8_QUANTIZE
+
+
+def split_cores(cores: List[int], workers: int) -> List[List[int]]:
+    """
+    Contiguous, nearly equal slices of the available cores, one per worker
+    """
+    if workers > len(cores):
+        # More workers than cores, let them share round-robin
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    slices, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+def worker_threads(cores: List[int], profile: Optional[TuningProfile]) -> int:
+    return min(profile.torch_threads, len(cores)) if profile is not None else len(cores)
+
+
+def share_model_memory(processor: ImageProcessor) -> None:
+    # Explicit shared-memory tensors, so even pages touched by a worker are never copied
+    for module in (processor.icon_detect_model.model, processor.icon_caption_model['model']):
+        # ONNX Runtime sessions own their weights, only torch modules can be moved
+        if isinstance(module, torch.nn.Module):
+            module.share_memory()
+
+
+def run_worker(sock: socket.socket, cores: List[int], interop_threads: Optional[int], profile: Optional[TuningProfile], args) -> None:
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(worker_threads(cores, profile))
+    if interop_threads is None:
+        interop_threads = profile.interop_threads if profile is not None else 1
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # Only settable before any inter-op work has started in this process
+        pass
+
+    import uvicorn
+    from .server import app
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--interop-threads', type=int, help="Overrides the tuning profile, 1 without one")
+    parser.add_argument('--share-memory', action='store_true', help="Move model weights into shared memory before forking")
+    parser.add_argument('--backend', choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument('--int8', action='store_true', default=INT8_QUANTIZE, help="int8 dynamic quantization, see core_server.backends")
+    parser.add_argument('--keep-alive', type=int, default=5)
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    core_slices = split_cores(available, args.workers)
+    # Tuned for the cores of one worker, the tuner runs in its own process so the master stays inference-free
+    profile = ensure_profile(args.backend, args.int8, max_threads=min(len(cores) for cores in core_slices))
+
+    print ('Loading models in the master process')
+    runtime.PRELOADED_PROCESSOR = ImageProcessor(
+        icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH),
+        backend=args.backend,
+        quantize=args.int8,
+        profile=profile
+    )
+    if args.share_memory:
+        share_model_memory(runtime.PRELOADED_PROCESSOR)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers_file = str(Path(IMAGE_BASE_PATH).resolve() / f"workers-{os.getpid()}.json")
+    os.environ[runtime.WORKERS_FILE_ENV] = workers_file
+    os.environ[runtime.WORKER_COUNT_ENV] = str(args.workers)
+
+    children = {}
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(sock, core_slices[slot], args.interop_threads, profile, args)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        runtime.write_workers_file(workers_file, os.getpid(), [
+            {"pid": child, "cores": core_slices[s], "torch_threads": worker_threads(core_slices[s], profile)}
+            for child, s in sorted(children.items(), key=lambda item: item[1])
+        ])
+        print (f'Worker {slot} started (pid {pid}, cores {core_slices[slot]})')
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(args.workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        if not stopping:
+            print (f'Worker {slot} (pid {pid}) exited with status {status}, restarting')
+            time.sleep(1)
+            spawn(slot)
+
+    if os.path.exists(workers_file):
+        os.remove(workers_file)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
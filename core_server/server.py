@@ -1,23 +1,238 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Header, Request, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
+import asyncio
 import io
+import json
+import os
+import time
 from PIL import Image
 import base64
 import uuid
+from concurrent.futures import Future
+from dataclasses import asdict
 from pathlib import Path
+from typing import List, Optional
 
-from .core import ImageProcessor
-from .constants import IMAGE_BASE_PATH, UPLOAD_IMG_FOLDER_NAME, ICON_DETECT_MODEL_PATH
+import torch
+
+from .core import ImageProcessor, ParseJob, FIDELITY_TIERS
+from .batching import MicroBatcher
+from .cache import ResultCache, image_digest, make_cache_key
+from .workers import InferencePool, QueueFullError, track
+from .imaging import Region, load_image, clip_regions
+from .persistence import ArtifactStore
+from .sessions import IncrementalParser, SessionStore
+from .caption_cache import CaptionCache
+from .bulk import ARCHIVE_ERRORS, iter_upload_images, spool, chunked
+from .results import ResultStore, SharedResults, RENDER_MEDIA_TYPES
+from .element_index import ElementIndex, TEXT_MATCHES
+from .encoding import wants_msgpack, pack_result, MSGPACK_MEDIA_TYPES
+from .metrics import Trace, timed, render_metrics, render_gauges, REQUEST_SECONDS, STAGE_SECONDS
+from .tuning import ensure_profile, apply_threads
+from . import runtime
+from .constants import (
+    IMAGE_BASE_PATH, UPLOAD_IMG_FOLDER_NAME, RESULT_IMG_FOLDER_NAME, ICON_DETECT_MODEL_PATH,
+    RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_DISK_PATH, RESULT_CACHE_DISK_MAX_BYTES,
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+    INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT_SECONDS,
+    PERSIST_UPLOADS, PERSIST_RESULTS, ARTIFACT_MAX_BYTES, ARTIFACT_TTL_SECONDS,
+    SESSION_MAX_SESSIONS, SESSION_TTL_SECONDS, INCREMENTAL_TILE_SIZE, INCREMENTAL_TILE_THRESHOLD,
+    INCREMENTAL_MAX_CHANGED_RATIO, INCREMENTAL_MARGIN,
+    CAPTION_CACHE_PATH, CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_MAX_DISTANCE,
+    BULK_CHUNK_SIZE,
+    RESULT_STORE_MAX_RESULTS, RESULT_STORE_MAX_BYTES, RESULT_STORE_SHARED_PATH, RENDER_CACHE_SIZE,
+    INFERENCE_BACKEND, INT8_QUANTIZE, WARM_UP_ON_STARTUP
+)
 
 app = FastAPI(title="OmniParser API")
 
+# Labeled images saved by the bulk endpoint (and renders kept with PERSIST_RESULTS)
+RESULT_IMG_DIR = f"{IMAGE_BASE_PATH}/{RESULT_IMG_FOLDER_NAME}"
+os.makedirs(RESULT_IMG_DIR, exist_ok=True)
+app.mount("/static", StaticFiles(directory=RESULT_IMG_DIR), name="static")
+
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route templates, not raw paths, keep /results/{result_id} to one series
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        endpoint=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    return response
+
 
 # Initialize image processor
-IMAGE_PROCESSOR = ImageProcessor(
-    icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH)
+CAPTION_CACHE = CaptionCache(
+    CAPTION_CACHE_PATH,
+    max_entries=CAPTION_CACHE_MAX_ENTRIES,
+    max_distance=CAPTION_CACHE_MAX_DISTANCE
+) if CAPTION_CACHE_PATH else None
+
+if runtime.PRELOADED_PROCESSOR is not None:
+    # Weights were loaded once by the pre-fork master (core_server.serve) and are shared copy-on-write
+    IMAGE_PROCESSOR = runtime.PRELOADED_PROCESSOR
+    IMAGE_PROCESSOR.caption_cache = CAPTION_CACHE
+else:
+    # Tuned imgsz, caption batch size and thread counts for this host, the built-in defaults without a profile
+    profile = ensure_profile(INFERENCE_BACKEND, INT8_QUANTIZE)
+    if profile is not None:
+        apply_threads(profile)
+    IMAGE_PROCESSOR = ImageProcessor(
+        icon_detect_model_path=str(Path(__file__).parent.parent / ICON_DETECT_MODEL_PATH),
+        caption_cache=CAPTION_CACHE,
+        profile=profile
+    )
+
+if WARM_UP_ON_STARTUP:
+    # Runs in each worker, the pre-fork master must not run inference
+    print (f'Models warmed up in {IMAGE_PROCESSOR.warm_up():.2f}s')
+
+# Parse results keyed on decoded pixels + parameters, agents often re-send identical frames
+RESULT_CACHE = ResultCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+    disk_path=RESULT_CACHE_DISK_PATH,
+    disk_max_bytes=RESULT_CACHE_DISK_MAX_BYTES
 )
 
+# Concurrent requests are grouped into one detection + caption pass
+BATCHER = MicroBatcher(
+    IMAGE_PROCESSOR.process_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS
+)
+
+# Blocking inference runs here, never on the event loop
+INFERENCE_POOL = InferencePool(
+    num_workers=INFERENCE_WORKERS,
+    max_queue_size=INFERENCE_QUEUE_SIZE
+)
+
+# api_results is the processor's store, api_images shares its background writer
+RESULT_ARTIFACTS = IMAGE_PROCESSOR.artifacts
+UPLOAD_ARTIFACTS = ArtifactStore(
+    f"{IMAGE_BASE_PATH}/{UPLOAD_IMG_FOLDER_NAME}", ARTIFACT_MAX_BYTES, ARTIFACT_TTL_SECONDS, RESULT_ARTIFACTS.writer
+) if PERSIST_UPLOADS else None
+
+# The kernel hands each connection to any pre-fork worker, state kept in process memory is only
+# seen by the worker that created it. Results are then also shared through SQLite, sessions are refused
+MULTI_WORKER = runtime.worker_count() > 1
+
+# Labeled images are drawn only when a client asks for one
+RESULT_STORE = ResultStore(
+    IMAGE_PROCESSOR.render_labeled_image,
+    max_results=RESULT_STORE_MAX_RESULTS,
+    max_bytes=RESULT_STORE_MAX_BYTES,
+    render_cache_size=RENDER_CACHE_SIZE,
+    shared=SharedResults(RESULT_STORE_SHARED_PATH, RESULT_STORE_MAX_RESULTS, RESULT_STORE_MAX_BYTES) if MULTI_WORKER else None
+)
+
+def submit_parse(job: ParseJob) -> Future:
+    # Tracked, so a request that times out also withdraws its job from the batcher queue
+    return track(BATCHER.submit(job))
+
+
+# Session mode keeps each session's last frame and re-parses only what changed
+INCREMENTAL_PARSER = IncrementalParser(
+    IMAGE_PROCESSOR,
+    SessionStore(max_sessions=SESSION_MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS),
+    tile_size=INCREMENTAL_TILE_SIZE,
+    tile_threshold=INCREMENTAL_TILE_THRESHOLD,
+    max_changed_ratio=INCREMENTAL_MAX_CHANGED_RATIO,
+    margin=INCREMENTAL_MARGIN,
+    submit=submit_parse
+)
+
+
+def run_parse_job(job: ParseJob):
+    # Runs on an inference worker
+    return submit_parse(job).result()
+
+
+def run_parse_jobs(jobs: List[ParseJob]) -> list:
+    """
+    Runs on an inference worker. Every model call goes through BATCHER, its single thread is
+    the only one using the models, the jobs join its batches like any other request.
+
+    Returns:
+        One entry per job, the `process_image` tuple or the exception it failed with
+    """
+    futures = [submit_parse(job) for job in jobs]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def parse_regions(value: Optional[str], image_size: tuple) -> Optional[List[Region]]:
+    """
+    `regions` query value "x1,y1,x2,y2;x1,y1,x2,y2" in pixels, clamped to the image.
+    Raises ValueError for malformed, non-finite or empty regions.
+    """
+    if not value:
+        return None
+    regions = []
+    for part in value.split(';'):
+        coords = part.split(',')
+        if len(coords) != 4:
+            raise ValueError(f"Region '{part}' must be x1,y1,x2,y2")
+        regions.append(tuple(float(v) for v in coords))
+    return clip_regions(regions, image_size)
+
+
+def fidelity_error(tier: str, budget_ms: Optional[float], trace: Trace) -> Optional[JSONResponse]:
+    headers = {"X-Trace-Id": trace.trace_id}
+    if tier not in FIDELITY_TIERS:
+        return JSONResponse(status_code=400, content={"error": f"tier must be one of {', '.join(FIDELITY_TIERS)}"}, headers=headers)
+    if budget_ms is not None and budget_ms <= 0:
+        return JSONResponse(status_code=400, content={"error": "budget_ms must be positive"}, headers=headers)
+    return None
+
+
+def fidelity_summary(tier: str, budget_ms: Optional[float], parsed_content_list: list) -> dict:
+    return {
+        "tier": tier,
+        "budget_ms": budget_ms,
+        "uncaptioned": sum(1 for elem in parsed_content_list if elem.get('uncaptioned'))
+    }
+
+
+def build_result(result_image_name: Optional[str], label_coordinates: dict, parsed_content_list: list) -> dict:
+    return {
+        "labeled_image_path": f"static/{result_image_name}" if result_image_name else None,
+        "label_coordinates": {k: v.tolist() if hasattr(v, 'tolist') else v for k, v in label_coordinates.items()},
+        "parsed_content_list": parsed_content_list
+    }
+
+
+def store_result(image_bytes: bytes, image_size: tuple, result: dict) -> dict:
+    """
+    Keep the result for on-demand rendering, returns it with its result_id and image path
+    """
+    result_id = RESULT_STORE.put(image_bytes, image_size, result["parsed_content_list"])
+    return {**result, "result_id": result_id, "labeled_image_path": f"results/{result_id}/image.png"}
+
+
+def negotiate(result: dict, accept: Optional[str], headers: Optional[dict] = None) -> Response:
+    """
+    JSON by default, columnar MessagePack when the Accept header asks for it
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if wants_msgpack(accept):
+        extra = {k: v for k, v in result.items() if k not in ("label_coordinates", "parsed_content_list")}
+        content = pack_result(result["label_coordinates"], result["parsed_content_list"], **extra)
+        return Response(content=content, media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return JSONResponse(result, headers=headers)
+
 
 @app.post("/parse-screenshot")
 async def parse_screenshot(
@@ -25,49 +240,583 @@ async def parse_screenshot(
     box_threshold: float = 0.01,
     iou_threshold: float = 0.9,
     use_paddleocr: bool = False,
-    imgsz: int = 640,
-    icon_process_batch_size: int = 32
+    imgsz: Optional[int] = None,
+    icon_process_batch_size: Optional[int] = None,
+    adaptive: bool = False,
+    regions: Optional[str] = None,
+    tier: str = "full",
+    budget_ms: Optional[float] = None,
+    use_cache: bool = True,
+    timeout: float = INFERENCE_TIMEOUT_SECONDS,
+    session_id: Optional[str] = None,
+    timing: bool = False,
+    accept: Optional[str] = Header(None),
+    x_trace_id: Optional[str] = Header(None)
 ):
+    """
+    Parse one screenshot. Responds with JSON, or with the compact columnar MessagePack
+    encoding (see `encoding.pack_result`) when sent `Accept: application/msgpack`.
+    Every response carries an X-Trace-Id (the request's own if it sent one), `timing`
+    adds the per-stage breakdown as a Server-Timing header.
+    `regions` ("x1,y1,x2,y2;..." in pixels) restricts parsing to those rectangles, coordinates
+    in the response stay full-frame.
+    `tier` is ocr (text only), detect (icons without captions) or full. `budget_ms` bounds the
+    request: icons are captioned most interactive and largest first until it runs out, the
+    rest come back with content None and `uncaptioned: true`.
+    `imgsz` and `icon_process_batch_size` default to this host's tuning profile (see `autotune`).
+    """
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms else None
+    trace = Trace(x_trace_id)
+    error = fidelity_error(tier, budget_ms, trace)
+    if error is not None:
+        return error
     try:
-        # Read and save the uploaded image
+        # Read and decode the uploaded image once, the pixels are shared by every stage
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        with timed('decode', [trace]):
+            image = await asyncio.to_thread(load_image, image_bytes)
+        try:
+            region_list = parse_regions(regions, image.size)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)}, headers={"X-Trace-Id": trace.trace_id})
+        if region_list and session_id:
+            return JSONResponse(
+                status_code=400, content={"error": "regions cannot be combined with session_id"}, headers={"X-Trace-Id": trace.trace_id}
+            )
+        if session_id and MULTI_WORKER:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "session_id needs a single worker process, sessions live in the memory of one worker"},
+                headers={"X-Trace-Id": trace.trace_id}
+            )
+
+        # Step0: Return cached result for identical pixels + parameters, session frames always diff against their predecessor
+        cache_key = None
+        if use_cache and not session_id:
+            cache_key = make_cache_key(
+                await asyncio.to_thread(image_digest, image),
+                box_threshold=box_threshold,
+                iou_threshold=iou_threshold,
+                use_paddleocr=use_paddleocr,
+                imgsz=imgsz or IMAGE_PROCESSOR.imgsz,
+                adaptive=adaptive,
+                regions=region_list,
+                tier=tier
+            )
+            # Anything cached is complete for its tier, so it also answers budgeted requests.
+            # The disk tier does file I/O, off the event loop
+            cached_result = await asyncio.to_thread(RESULT_CACHE.get, cache_key)
+            if cached_result is not None:
+                result = await asyncio.to_thread(store_result, image_bytes, image.size, cached_result)
+                result["fidelity"] = fidelity_summary(tier, budget_ms, result["parsed_content_list"])
+                return negotiate(result, accept, {"X-Cache": "HIT", "X-Trace-Id": trace.trace_id})
         
-        # Step1: Save image temporarily
+        # Step1: Keep a copy of the upload, written in the background as received
         image_uuid = uuid.uuid4().hex[:5]
-        file_name = ''.join(file.filename.split('.')[:-1])
-        print (file.filename, file_name)
-        temp_path = f"{IMAGE_BASE_PATH}/{UPLOAD_IMG_FOLDER_NAME}/{image_uuid}-{file.filename}"
-        image.save(temp_path)
-        print ('Save imaged temporarily')
-
-        # Step2, Process the image using the ImageProcessor
-        result_image_name = f"{image_uuid}-labeled_img-{file.filename}"
-        dino_labeled_img, label_coordinates, parsed_content_list = IMAGE_PROCESSOR.process_image(
-            image_path=temp_path,
-            result_image_name=result_image_name,
+        if UPLOAD_ARTIFACTS is not None:
+            UPLOAD_ARTIFACTS.put(f"{image_uuid}-{Path(file.filename).name}", image_bytes)
+
+        # Step2, Process the in-memory image on the inference pool, the labeled image is drawn only on request
+        job = ParseJob(
+            image=image,
             box_threshold=box_threshold,
             iou_threshold=iou_threshold,
             use_paddleocr=use_paddleocr,
             imgsz=imgsz,
             icon_process_batch_size=icon_process_batch_size,
+            adaptive=adaptive,
+            regions=region_list,
+            tier=tier,
+            deadline=deadline,
+            render=False,
+            trace=trace
         )
-        print ('Image processed & Saved')
+        incremental_info = None
+        if session_id:
+            (dino_labeled_img, label_coordinates, parsed_content_list, incremental_info), queue_wait = await INFERENCE_POOL.run(
+                INCREMENTAL_PARSER.parse, session_id, job, timeout=timeout
+            )
+        else:
+            (dino_labeled_img, label_coordinates, parsed_content_list), queue_wait = await INFERENCE_POOL.run(
+                run_parse_job, job, timeout=timeout
+            )
+        trace.add('queue', queue_wait)
+        STAGE_SECONDS.observe(queue_wait, stage='queue')
+        print (f'Image processed {json.dumps(trace.to_dict())}')
         
         # Step3: Return results
-        return JSONResponse({
-            "labeled_image_path": f"static/{result_image_name}",
-            "label_coordinates": {k: v.tolist() if hasattr(v, 'tolist') else v for k, v in label_coordinates.items()},
-            "parsed_content_list": parsed_content_list
-        })
-        
-    except Exception as e:
+        result = build_result(None, label_coordinates, parsed_content_list)
+        if incremental_info is not None:
+            result["incremental"] = incremental_info
+        fidelity = fidelity_summary(tier, budget_ms, parsed_content_list)
+        # A budget that cut captioning short leaves a result that is not worth caching
+        if cache_key is not None and not (tier == "full" and fidelity["uncaptioned"]):
+            await asyncio.to_thread(RESULT_CACHE.put, cache_key, result)
+        result = await asyncio.to_thread(store_result, image_bytes, image.size, result)
+        result["fidelity"] = fidelity
+        headers = {
+            "X-Cache": "MISS" if cache_key is not None else "BYPASS",
+            "X-Queue-Wait-Ms": f"{queue_wait * 1000:.1f}",
+            "X-Trace-Id": trace.trace_id
+        }
+        if timing:
+            headers["Server-Timing"] = trace.server_timing()
+        return negotiate(result, accept, headers)
+
+    except QueueFullError as e:
         print (str(e))
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after), "X-Trace-Id": trace.trace_id}
+        )
+    except asyncio.TimeoutError:
+        print (f'[{trace.trace_id}] Parse timed out after {timeout}s')
+        return JSONResponse(
+            status_code=504,
+            content={"error": f"Parse did not finish within {timeout}s"},
+            headers={"X-Trace-Id": trace.trace_id}
+        )
+    except Exception as e:
+        print (f'[{trace.trace_id}] {e}')
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)},
+            headers={"X-Trace-Id": trace.trace_id}
+        )
+
+
+@app.post("/parse-screenshot/stream")
+async def parse_screenshot_stream(
+    file: UploadFile = File(...),
+    box_threshold: float = 0.01,
+    iou_threshold: float = 0.9,
+    use_paddleocr: bool = False,
+    imgsz: Optional[int] = None,
+    icon_process_batch_size: Optional[int] = None,
+    adaptive: bool = False,
+    regions: Optional[str] = None,
+    tier: str = "full",
+    budget_ms: Optional[float] = None,
+    timeout: float = INFERENCE_TIMEOUT_SECONDS,
+    format: str = "ndjson",
+    x_trace_id: Optional[str] = Header(None)
+):
+    """
+    Same parse as /parse-screenshot, but sends an event as each stage finishes:
+    ocr, detections, merged, captions (one per caption batch) and finally result
+    (the /parse-screenshot response plus its stage timings) or error. `format` is ndjson or sse.
+    With `regions`, every region sends its own stage events, boxes already mapped to the full frame.
+    `tier` and `budget_ms` work as on /parse-screenshot.
+    """
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms else None
+    trace = Trace(x_trace_id)
+    if format not in ("ndjson", "sse"):
+        return JSONResponse(status_code=400, content={"error": "format must be ndjson or sse"}, headers={"X-Trace-Id": trace.trace_id})
+    error = fidelity_error(tier, budget_ms, trace)
+    if error is not None:
+        return error
+    try:
+        image_bytes = await file.read()
+        with timed('decode', [trace]):
+            image = await asyncio.to_thread(load_image, image_bytes)
+        try:
+            region_list = parse_regions(regions, image.size)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)}, headers={"X-Trace-Id": trace.trace_id})
+
+        image_uuid = uuid.uuid4().hex[:5]
+        if UPLOAD_ARTIFACTS is not None:
+            UPLOAD_ARTIFACTS.put(f"{image_uuid}-{Path(file.filename).name}", image_bytes)
+
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        job = ParseJob(
+            image=image,
+            box_threshold=box_threshold,
+            iou_threshold=iou_threshold,
+            use_paddleocr=use_paddleocr,
+            imgsz=imgsz,
+            icon_process_batch_size=icon_process_batch_size,
+            adaptive=adaptive,
+            regions=region_list,
+            tier=tier,
+            deadline=deadline,
+            on_event=lambda event, payload: loop.call_soon_threadsafe(events.put_nowait, (event, payload)),
+            render=False,
+            trace=trace
+        )
+        future = INFERENCE_POOL.submit(run_parse_job, job)
+    except QueueFullError as e:
+        print (f'[{trace.trace_id}] {e}')
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after), "X-Trace-Id": trace.trace_id}
+        )
+    except Exception as e:
+        print (f'[{trace.trace_id}] {e}')
         return JSONResponse(
             status_code=500,
-            content={"error": str(e)}
+            content={"error": str(e)},
+            headers={"X-Trace-Id": trace.trace_id}
         )
 
+    def encode(event: str, payload: dict) -> str:
+        data = json.dumps(payload)
+        if format == "sse":
+            return f"event: {event}\ndata: {data}\n\n"
+        return json.dumps({"event": event, **payload}) + "\n"
+
+    async def event_stream():
+        start = time.perf_counter()
+        done = asyncio.ensure_future(INFERENCE_POOL.wait(future, timeout))
+        while True:
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, done}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                break
+            event, payload = next_event.result()
+            yield encode(event, {"elapsed_ms": round((time.perf_counter() - start) * 1000, 1), **payload})
+        while not events.empty():
+            event, payload = events.get_nowait()
+            yield encode(event, {"elapsed_ms": round((time.perf_counter() - start) * 1000, 1), **payload})
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            (_, label_coordinates, parsed_content_list), _ = done.result()
+            print (f'Image processed {json.dumps(trace.to_dict())}')
+            result = await asyncio.to_thread(store_result, image_bytes, image.size, build_result(None, label_coordinates, parsed_content_list))
+            yield encode("result", {
+                "elapsed_ms": elapsed_ms, **result,
+                "fidelity": fidelity_summary(tier, budget_ms, parsed_content_list), "timing": trace.to_dict()
+            })
+        except asyncio.TimeoutError:
+            yield encode("error", {"elapsed_ms": elapsed_ms, "error": f"Parse did not finish within {timeout}s"})
+        except Exception as e:
+            print (f'[{trace.trace_id}] {e}')
+            yield encode("error", {"elapsed_ms": elapsed_ms, "error": str(e)})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Trace-Id": trace.trace_id})
+
+
+@app.post("/parse-screenshot/batch")
+async def parse_screenshot_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    box_threshold: float = 0.01,
+    iou_threshold: float = 0.9,
+    use_paddleocr: bool = False,
+    imgsz: Optional[int] = None,
+    icon_process_batch_size: Optional[int] = None,
+    adaptive: bool = False,
+    save_labeled_images: bool = False
+):
+    """
+    Parse many screenshots in one request, sent as multipart `files` and/or a zip/tar `archive`.
+    Streams one NDJSON line per image keyed by filename, with either the /parse-screenshot
+    result fields or an `error`, then a final summary line.
+    Images are read from the uploads BULK_CHUNK_SIZE at a time, parsed and sent before the
+    next chunk is read, so memory does not grow with the size of the upload.
+    """
+    # Our own disk copies, the request's upload files are closed once this handler returns
+    spooled = []
+
+    def spool_uploads():
+        for upload in files or []:
+            spooled.append(spool(upload.file))
+        if archive is not None:
+            spooled.append(spool(archive.file))
+
+    def close_uploads():
+        for file in spooled:
+            file.close()
+
+    async def result_stream(chunks, chunk, batch_uuid):
+        index, errors = 0, 0
+        try:
+            while chunk is not None:
+                jobs = [
+                    ParseJob(
+                        image=image_bytes,
+                        result_image_name=f"{batch_uuid}-{index + n}-labeled_img-{Path(name).name}" if save_labeled_images else None,
+                        box_threshold=box_threshold,
+                        iou_threshold=iou_threshold,
+                        use_paddleocr=use_paddleocr,
+                        imgsz=imgsz,
+                        icon_process_batch_size=icon_process_batch_size,
+                        adaptive=adaptive,
+                        render=save_labeled_images
+                    )
+                    for n, (name, image_bytes) in enumerate(chunk)
+                ]
+                while True:
+                    try:
+                        results, _ = await INFERENCE_POOL.run(run_parse_jobs, jobs)
+                        break
+                    except QueueFullError as e:
+                        # Offline work waits for capacity instead of failing
+                        await asyncio.sleep(e.retry_after)
+                    except Exception as e:
+                        results = [e] * len(jobs)
+                        break
+                for (name, _), job, result in zip(chunk, jobs, results):
+                    if isinstance(result, Exception):
+                        errors += 1
+                        line = {"index": index, "filename": name, "error": str(result)}
+                    else:
+                        _, label_coordinates, parsed_content_list = result
+                        line = {"index": index, "filename": name, **build_result(job.result_image_name, label_coordinates, parsed_content_list)}
+                    index += 1
+                    yield json.dumps(line) + "\n"
+                try:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                except Exception as e:
+                    # A corrupt member ends the archive, what was parsed so far stands
+                    errors += 1
+                    yield json.dumps({"index": index, "error": f"Reading the upload failed: {e}"}) + "\n"
+                    break
+            yield json.dumps({"summary": {"images": index, "errors": errors}}) + "\n"
+        finally:
+            close_uploads()
+
+    # Closed here on every early return, by the stream once it has been handed out
+    streaming = False
+    try:
+        await asyncio.to_thread(spool_uploads)
+        uploads = list(zip([upload.filename for upload in files or []], spooled))
+        archive_copy = spooled[-1] if archive is not None else None
+        chunks = chunked(iter_upload_images(uploads, archive_copy), BULK_CHUNK_SIZE)
+        try:
+            first_chunk = await asyncio.to_thread(next, chunks, None)
+        except ARCHIVE_ERRORS as e:
+            return JSONResponse(status_code=400, content={"error": f"Reading the upload failed: {e}"})
+        if first_chunk is None:
+            return JSONResponse(status_code=400, content={"error": "No images in the request"})
+        response = StreamingResponse(result_stream(chunks, first_chunk, uuid.uuid4().hex[:5]), media_type="application/x-ndjson")
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            close_uploads()
+
+
+# Declared before /results/{result_id} so "stats" is not taken for an id
+@app.get("/results/stats")
+async def result_store_stats():
+    return JSONResponse(RESULT_STORE.stats())
+
+
+@app.get("/results/{result_id}")
+async def get_result(result_id: str, accept: Optional[str] = Header(None)):
+    record = RESULT_STORE.get(result_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown or expired result id"})
+    label_coordinates = await asyncio.to_thread(IMAGE_PROCESSOR.label_coordinates, record.elements, record.image_size)
+    return negotiate({
+        "result_id": result_id,
+        **build_result(None, label_coordinates, record.elements),
+        "labeled_image_path": f"results/{result_id}/image.png"
+    }, accept)
+
+
+@app.get("/results/{result_id}/image.{fmt}")
+async def get_result_image(
+    result_id: str,
+    fmt: str,
+    max_width: Optional[int] = Query(None, ge=1),
+    quality: int = Query(85, ge=1, le=100)
+):
+    """
+    Labeled image for a parse result, drawn on first request. `fmt` is png, webp or jpeg,
+    `max_width` downscales, `quality` applies to webp and jpeg.
+    """
+    if fmt not in RENDER_MEDIA_TYPES:
+        return JSONResponse(status_code=400, content={"error": f"format must be one of {', '.join(RENDER_MEDIA_TYPES)}"})
+    with timed('render'):
+        data = await asyncio.to_thread(RESULT_STORE.render, result_id, fmt, max_width, quality)
+    if data is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown or expired result id"})
+    if PERSIST_RESULTS and fmt == "png" and max_width is None and f"{result_id}.png" not in RESULT_ARTIFACTS:
+        RESULT_ARTIFACTS.put(f"{result_id}.png", data)
+    return Response(content=data, media_type=RENDER_MEDIA_TYPES[fmt], headers={"Cache-Control": "private, max-age=3600"})
+
+
+def unknown_result() -> JSONResponse:
+    return JSONResponse(status_code=404, content={"error": "Unknown or expired result id"})
+
+
+def element_hits(result_id: str, index: ElementIndex, hits: list, limit: Optional[int] = None) -> JSONResponse:
+    return JSONResponse({
+        "result_id": result_id,
+        "count": len(hits),
+        "elements": [index.describe(i) for i in hits[:limit]]
+    })
+
+
+# Element queries over a stored result, coordinates are pixels of the parsed image (as in label_coordinates).
+# `type` (text/icon) and `interactivity` filter every query.
+@app.get("/results/{result_id}/elements/at")
+async def elements_at(result_id: str, x: float, y: float, type: Optional[str] = None, interactivity: Optional[bool] = None):
+    """
+    Elements containing the point (x, y), innermost first
+    """
+    index = await asyncio.to_thread(RESULT_STORE.index, result_id)
+    if index is None:
+        return unknown_result()
+    return element_hits(result_id, index, index.at(x, y, type=type, interactivity=interactivity))
+
+
+@app.get("/results/{result_id}/elements/in")
+async def elements_in(
+    result_id: str, x1: float, y1: float, x2: float, y2: float, within: bool = False,
+    type: Optional[str] = None, interactivity: Optional[bool] = None
+):
+    """
+    Elements intersecting the rectangle, or entirely inside it with `within`
+    """
+    if x2 < x1 or y2 < y1:
+        return JSONResponse(status_code=400, content={"error": "x2, y2 must not be less than x1, y1"})
+    index = await asyncio.to_thread(RESULT_STORE.index, result_id)
+    if index is None:
+        return unknown_result()
+    return element_hits(result_id, index, index.in_rect(x1, y1, x2, y2, within=within, type=type, interactivity=interactivity))
+
+
+@app.get("/results/{result_id}/elements/nearest")
+async def elements_nearest(
+    result_id: str, x: Optional[float] = None, y: Optional[float] = None, element: Optional[int] = None, k: int = 1,
+    type: Optional[str] = None, interactivity: Optional[bool] = None
+):
+    """
+    The `k` elements closest to (x, y), or to the centre of element id `element` (itself excluded),
+    measured to the nearest edge of each box, with their distance in pixels
+    """
+    if k < 1:
+        return JSONResponse(status_code=400, content={"error": "k must be positive"})
+    if element is None and (x is None or y is None):
+        return JSONResponse(status_code=400, content={"error": "pass x and y, or element"})
+    index = await asyncio.to_thread(RESULT_STORE.index, result_id)
+    if index is None:
+        return unknown_result()
+    exclude = ()
+    if element is not None:
+        if not 0 <= element < len(index.elements):
+            return JSONResponse(status_code=404, content={"error": f"Unknown element {element}"})
+        x1, y1, x2, y2 = index.boxes[element].tolist()
+        x, y, exclude = (x1 + x2) / 2, (y1 + y2) / 2, (element,)
+    hits = index.nearest(x, y, k, exclude=exclude, type=type, interactivity=interactivity)
+    return JSONResponse({
+        "result_id": result_id,
+        "count": len(hits),
+        "elements": [index.describe(i, distance=round(distance, 2)) for i, distance in hits]
+    })
+
+
+@app.get("/results/{result_id}/elements/search")
+async def elements_search(
+    result_id: str, q: str, match: str = "tokens", limit: Optional[int] = None,
+    type: Optional[str] = None, interactivity: Optional[bool] = None
+):
+    """
+    Elements whose content matches `q`, `match` is one of tokens, exact, contains or regex
+    (see `ElementIndex.search`)
+    """
+    if match not in TEXT_MATCHES:
+        return JSONResponse(status_code=400, content={"error": f"match must be one of {', '.join(TEXT_MATCHES)}"})
+    index = await asyncio.to_thread(RESULT_STORE.index, result_id)
+    if index is None:
+        return unknown_result()
+    try:
+        hits = await asyncio.to_thread(index.search, q, match, type=type, interactivity=interactivity)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return element_hits(result_id, index, hits, limit)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition: stage and request latency histograms, caption batch sizes,
+    and the inference pool state at scrape time
+    """
+    pool = INFERENCE_POOL.stats()
+    artifacts = artifact_stats()
+    extra = (
+        render_gauges('omniparser_inference_queue_depth', 'Jobs waiting for an inference worker', {'': pool['queue_depth']}) +
+        render_gauges('omniparser_inference_running', 'Jobs running on inference workers', {'': pool['running']}) +
+        render_gauges(
+            'omniparser_artifact_bytes', 'Bytes kept in each artifact directory',
+            {kind: stats['bytes'] for kind, stats in artifacts.items()}, label='store'
+        ) +
+        render_gauges('omniparser_artifact_writes_dropped', 'Artifact writes dropped on a full queue', {'': RESULT_ARTIFACTS.writer.dropped})
+    )
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health():
+    return JSONResponse({"status": "ok"})
+
+
+@app.get("/pool/stats")
+async def pool_stats():
+    return JSONResponse(INFERENCE_POOL.stats())
+
+
+@app.get("/workers/memory")
+async def workers_memory():
+    report = await asyncio.to_thread(runtime.workers_memory_report)
+    if report is None:
+        # Single process (plain uvicorn), report this process only
+        report = {"master": None, "workers": [runtime.process_memory(os.getpid())]}
+    return JSONResponse(report)
+
+
+def artifact_stats() -> dict:
+    stats = {"results": RESULT_ARTIFACTS.stats()}
+    if UPLOAD_ARTIFACTS is not None:
+        stats["uploads"] = UPLOAD_ARTIFACTS.stats()
+    return stats
+
+
+@app.get("/artifacts/stats")
+async def artifacts_stats():
+    return JSONResponse(artifact_stats())
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return JSONResponse(RESULT_CACHE.stats())
+
+
+@app.get("/caption-cache/stats")
+async def caption_cache_stats():
+    if CAPTION_CACHE is None:
+        return JSONResponse({"enabled": False})
+    return JSONResponse(CAPTION_CACHE.stats())
+
+
+@app.get("/batching/stats")
+async def batching_stats():
+    return JSONResponse(BATCHER.stats())
+
+
+@app.get("/tuning/profile")
+async def tuning_profile():
+    # The defaults this worker applies, and the profile they came from (None without one)
+    profile = IMAGE_PROCESSOR.profile
+    return JSONResponse({
+        "imgsz": IMAGE_PROCESSOR.imgsz,
+        "icon_process_batch_size": IMAGE_PROCESSOR.icon_process_batch_size,
+        "torch_threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "profile": asdict(profile) if profile is not None else None
+    })
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,269 @@
+from typing import Tuple, Dict, List, Any, Optional, Callable
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+import threading
+import time
+
+import numpy as np
+
+from .core import ImageProcessor, ParseJob
+from .imaging import Region, load_image
+from .metrics import timed
+
+
+@dataclass
+class SessionFrame:
+    """
+    Last parsed frame of a session, elements are in ratio coordinates of the full frame
+    """
+    image_np: np.ndarray
+    elements: List[Dict[str, Any]]
+    params: Tuple
+
+
+class SessionStore:
+    """
+    LRU of the last frame per session id, idle sessions expire after `ttl_seconds`
+    """
+
+    def __init__(self, max_sessions: int = 64, ttl_seconds: float = 900):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._frames: "OrderedDict[str, Tuple[float, SessionFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[SessionFrame]:
+        with self._lock:
+            entry = self._frames.get(session_id)
+            if entry is None:
+                return None
+            updated, frame = entry
+            if time.time() - updated > self.ttl_seconds:
+                del self._frames[session_id]
+                return None
+            self._frames.move_to_end(session_id)
+            return frame
+
+    def put(self, session_id: str, frame: SessionFrame) -> None:
+        with self._lock:
+            self._frames[session_id] = (time.time(), frame)
+            self._frames.move_to_end(session_id)
+            while len(self._frames) > self.max_sessions:
+                self._frames.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+def changed_tile_mask(previous: np.ndarray, current: np.ndarray, tile_size: int, threshold: float) -> np.ndarray:
+    """
+    Mark tiles whose mean absolute pixel difference is above `threshold` (0-255 scale)
+
+    Returns:
+        Boolean array of shape (tile rows, tile cols)
+    """
+    diff = np.maximum(previous, current) - np.minimum(previous, current)
+    h, w = diff.shape[:2]
+    rows, cols = -(-h // tile_size), -(-w // tile_size)
+    diff = np.pad(diff, ((0, rows * tile_size - h), (0, cols * tile_size - w), (0, 0)))
+    tile_sums = diff.reshape(rows, tile_size, cols, tile_size, -1).sum(axis=(1, 3, 4), dtype=np.uint64)
+    return tile_sums / (tile_size * tile_size * diff.shape[2]) > threshold
+
+
+def tile_regions(mask: np.ndarray, tile_size: int, image_size: Tuple[int, int], margin: int) -> List[Region]:
+    """
+    Bounding boxes (pixel xyxy) of 8-connected groups of changed tiles, padded by `margin`
+    """
+    w, h = image_size
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    regions = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        seen[r, c] = True
+        queue = deque([(r, c)])
+        r1, c1, r2, c2 = r, c, r, c
+        while queue:
+            cr, cc = queue.popleft()
+            r1, c1, r2, c2 = min(r1, cr), min(c1, cc), max(r2, cr), max(c2, cc)
+            for nr in range(max(0, cr - 1), min(rows, cr + 2)):
+                for nc in range(max(0, cc - 1), min(cols, cc + 2)):
+                    if mask[nr, nc] and not seen[nr, nc]:
+                        seen[nr, nc] = True
+                        queue.append((nr, nc))
+        regions.append((
+            max(0, int(c1) * tile_size - margin),
+            max(0, int(r1) * tile_size - margin),
+            min(w, (int(c2) + 1) * tile_size + margin),
+            min(h, (int(r2) + 1) * tile_size + margin)
+        ))
+    return regions
+
+
+def _intersects(a: Region, b: Tuple[float, float, float, float]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _union(a: Region, b: Tuple[float, float, float, float]) -> Region:
+    return (
+        int(min(a[0], b[0])), int(min(a[1], b[1])),
+        int(np.ceil(max(a[2], b[2]))), int(np.ceil(max(a[3], b[3])))
+    )
+
+
+def grow_regions(regions: List[Region], element_boxes: List[Tuple[float, float, float, float]]) -> List[Region]:
+    """
+    Grow regions until no previous element straddles a region edge, merging regions that overlap
+    """
+    regions = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        for i, region in enumerate(regions):
+            for box in element_boxes:
+                if _intersects(region, box):
+                    grown = _union(region, box)
+                    if grown != region:
+                        region = grown
+                        changed = True
+            regions[i] = region
+        merged = []
+        for region in regions:
+            for j, other in enumerate(merged):
+                if _intersects(region, other):
+                    merged[j] = _union(other, region)
+                    changed = True
+                    break
+            else:
+                merged.append(region)
+        regions = merged
+    return regions
+
+
+class IncrementalParser:
+    """
+    Re-parses only the parts of a frame that changed since the session's previous frame.
+
+    Changed tiles are grouped into regions, grown so they fully contain any previous element
+    they touch, and parsed as one batch. Previous elements outside every region are reused.
+    On the full tier, previous icons left uncaptioned by a latency budget count as changed.
+    Falls back to a full parse for a new session, a resolution or parameter change, or when
+    more than `max_changed_ratio` of the tiles changed.
+
+    Frames of one session are parsed one at a time, each diffs against the one before it.
+    """
+
+    def __init__(
+        self,
+        processor: ImageProcessor,
+        store: SessionStore,
+        tile_size: int = 32,
+        tile_threshold: float = 1.0,
+        max_changed_ratio: float = 0.5,
+        margin: int = 16,
+        submit: Optional[Callable[[ParseJob], Future]] = None,
+        lock_stripes: int = 64
+    ):
+        """
+        Args:
+            submit: Queues a job for `processor.process_batch` (the server's MicroBatcher), the
+                processor is called directly on the caller's thread when None
+            lock_stripes: Number of per-session locks, sessions hashing to the same one wait for each other
+        """
+        self.processor = processor
+        self.store = store
+        self.tile_size = tile_size
+        self.tile_threshold = tile_threshold
+        self.max_changed_ratio = max_changed_ratio
+        self.margin = margin
+        self.submit = submit
+        self._session_locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def parse(self, session_id: str, job: ParseJob) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Parse a session frame, reusing unchanged elements from the previous frame
+
+        Returns:
+            Tuple containing:
+            - Base64 encoded labeled image
+            - Dictionary of label coordinates
+            - List of parsed content, each element flagged with `reused`
+            - Summary of the incremental step (mode, regions, reused and recomputed counts)
+        """
+        # Held from reading the previous frame to storing this one
+        with self._session_locks[hash(session_id) % len(self._session_locks)]:
+            return self.__parse_frame(session_id, job)
+
+    def __parse_frame(self, session_id: str, job: ParseJob) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]:
+        image = load_image(job.image)
+        image_np = np.asarray(image)
+        h, w = image_np.shape[:2]
+        params = (job.box_threshold, job.iou_threshold, job.use_paddleocr, job.imgsz, job.adaptive, job.tier)
+
+        previous = self.store.get(session_id)
+        regions = self.__dirty_regions(previous, image_np, params)
+        if regions is None:
+            reused, recomputed = [], self.__parse(replace(job, image=image, regions=None, render=False))
+            regions = [(0, 0, w, h)]
+            mode = 'full'
+        else:
+            reused = [
+                elem for elem in previous.elements
+                if not any(_intersects(region, self.__to_pixels(elem['bbox'], w, h)) for region in regions)
+            ]
+            # Regions never overlap after grow_regions, the processor maps their boxes to the full frame
+            recomputed = self.__parse(replace(job, image=image, regions=regions, render=False)) if regions else []
+            mode = 'incremental'
+
+        elements = reused + recomputed
+        if job.render:
+            with timed('render', [job.trace]):
+                dino_labeled_img, label_coordinates = self.processor.label_image(image_np, elements, job.result_image_name)
+        else:
+            dino_labeled_img, label_coordinates = None, self.processor.label_coordinates(elements, (w, h))
+        self.store.put(session_id, SessionFrame(image_np=image_np, elements=elements, params=params))
+
+        parsed_content_list = (
+            [dict(elem, reused=True) for elem in reused] +
+            [dict(elem, reused=False) for elem in recomputed]
+        )
+        info = {
+            "mode": mode,
+            "regions": [list(region) for region in regions],
+            "reused": len(reused),
+            "recomputed": len(recomputed)
+        }
+        return dino_labeled_img, label_coordinates, parsed_content_list, info
+
+    def __dirty_regions(self, previous: Optional[SessionFrame], image_np: np.ndarray, params: Tuple) -> Optional[List[Region]]:
+        # None means the whole frame has to be parsed
+        if previous is None or previous.params != params or previous.image_np.shape != image_np.shape:
+            return None
+        mask = changed_tile_mask(previous.image_np, image_np, self.tile_size, self.tile_threshold)
+        if mask.mean() > self.max_changed_ratio:
+            return None
+        h, w = image_np.shape[:2]
+        regions = tile_regions(mask, self.tile_size, (w, h), self.margin)
+        element_boxes = [self.__to_pixels(elem['bbox'], w, h) for elem in previous.elements]
+        # Icons a latency budget left without a caption are parsed again instead of reused forever.
+        # Below the full tier every icon is uncaptioned by design and stays reused (params[5] is the tier)
+        if previous.params[5] == "full":
+            regions += [
+                (max(0, int(x1)), max(0, int(y1)), min(w, int(np.ceil(x2))), min(h, int(np.ceil(y2))))
+                for elem, (x1, y1, x2, y2) in zip(previous.elements, element_boxes) if elem.get('uncaptioned')
+            ]
+        return grow_regions(regions, element_boxes)
+
+    def __parse(self, job: ParseJob) -> List[Dict[str, Any]]:
+        if self.submit is not None:
+            return self.submit(job).result()[2]
+        result = self.processor.process_batch([job])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result[2]
+
+    @staticmethod
+    def __to_pixels(bbox: List[float], w: int, h: int) -> Tuple[float, float, float, float]:
+        return bbox[0] * w, bbox[1] * h, bbox[2] * w, bbox[3] * h
@@ -0,0 +1,118 @@
+from typing import List, Tuple
+import math
+
+import torch
+
+Tile = Tuple[int, int, int, int]  # x1, y1, x2, y2 in pixels
+
+
+def _round_to_stride(value: float, stride: int = 32) -> int:
+    return int(math.ceil(value / stride) * stride)
+
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: int) -> List[Tile]:
+    """
+    Grid of tiles covering the image, neighbours share `overlap` pixels and the last
+    row/column is aligned to the image edge
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        count = math.ceil((length - tile_size) / (tile_size - overlap)) + 1
+        step = (length - tile_size) / (count - 1)
+        return [round(n * step) for n in range(count)]
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def plan_detection(
+    image_size: Tuple[int, int],
+    min_imgsz: int,
+    max_imgsz: int,
+    tile_size: int,
+    overlap: int,
+    max_downscale: float
+) -> Tuple[int, List[Tile]]:
+    """
+    Detection resolution and tiles for an image.
+
+    Images whose long side fits in `max_imgsz * max_downscale` are detected in one pass at
+    their own size clamped to [min_imgsz, max_imgsz]. Larger ones are cut into overlapping
+    `tile_size` tiles, each detected at `max_imgsz`, so the per-tile cost stays bounded and
+    small elements keep enough pixels.
+
+    Returns:
+        The imgsz and the tiles, a single full-image tile when not tiling
+    """
+    w, h = image_size
+    long_side = max(w, h)
+    if long_side <= max_imgsz * max_downscale:
+        return min(max(_round_to_stride(long_side), min_imgsz), max_imgsz), [(0, 0, w, h)]
+    return max_imgsz, plan_tiles(w, h, tile_size, overlap)
+
+
+def merge_tile_boxes(
+    tile_boxes: List[torch.Tensor],
+    tiles: List[Tile],
+    iou_threshold: float = 0.5,
+    containment_threshold: float = 0.8,
+    edge_margin: float = 2.0
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Move per-tile xyxy boxes into image coordinates and drop duplicates across tile seams.
+
+    Only boxes reaching into an area shared by several tiles can be duplicated, so the
+    pairwise test runs on those alone. A box is dropped when a larger box from another tile
+    overlaps it by `iou_threshold` IoU. A box within `edge_margin` pixels of an inner edge of
+    its own tile is also dropped when a larger box from another tile contains
+    `containment_threshold` of its area (a fragment cut at that edge and seen whole in the
+    neighbour). Whole boxes are never dropped for containment, small icons nested in a
+    larger element near a seam survive.
+
+    Returns:
+        The boxes in image coordinates and a keep mask over them
+    """
+    offsets = torch.tensor([[x1, y1, x1, y1] for x1, y1, _, _ in tiles], dtype=torch.float32)
+    boxes = torch.cat([b.float().reshape(-1, 4) + offsets[t] for t, b in enumerate(tile_boxes)])
+    tile_ids = torch.cat([torch.full((len(b),), t, dtype=torch.long) for t, b in enumerate(tile_boxes)])
+    keep = torch.ones(len(boxes), dtype=torch.bool)
+    if len(tiles) < 2 or len(boxes) < 2:
+        return boxes, keep
+
+    tile_rects = torch.tensor(tiles, dtype=torch.float32)
+    covering = (
+        (boxes[:, None, 0] < tile_rects[None, :, 2]) & (boxes[:, None, 2] > tile_rects[None, :, 0]) &
+        (boxes[:, None, 1] < tile_rects[None, :, 3]) & (boxes[:, None, 3] > tile_rects[None, :, 1])
+    ).sum(dim=1)
+    candidates = (covering > 1).nonzero().flatten()
+    if len(candidates) < 2:
+        return boxes, keep
+
+    sub, sub_tiles = boxes[candidates], tile_ids[candidates]
+    # Touching an edge of its tile that is not also the image edge, so possibly cut off there
+    own_tiles = tile_rects[sub_tiles]
+    image_rect = torch.cat([tile_rects[:, :2].min(dim=0).values, tile_rects[:, 2:].max(dim=0).values])
+    inner_edge = (own_tiles[:, :2] > image_rect[:2]) & (sub[:, :2] <= own_tiles[:, :2] + edge_margin)
+    inner_edge |= (own_tiles[:, 2:] < image_rect[2:]) & (sub[:, 2:] >= own_tiles[:, 2:] - edge_margin)
+    clipped = inner_edge.any(dim=1)
+    areas = (sub[:, 2] - sub[:, 0]).clamp(min=0) * (sub[:, 3] - sub[:, 1]).clamp(min=0)
+    # Rank by area, larger first, ties broken by position for a strict order
+    order = torch.argsort(-areas, stable=True)
+    rank = torch.empty_like(order)
+    rank[order] = torch.arange(len(order))
+
+    top_left = torch.max(sub[:, None, :2], sub[None, :, :2])
+    bottom_right = torch.min(sub[:, None, 2:], sub[None, :, 2:])
+    inter = (bottom_right - top_left).clamp(min=0).prod(dim=2)
+    union = areas[:, None] + areas[None, :] - inter
+    iou = inter / union.clamp(min=1e-6)
+    contained = inter / areas[:, None].clamp(min=1e-6)  # share of row box i inside column box j
+
+    dominated = (rank[None, :] < rank[:, None]) & (sub_tiles[None, :] != sub_tiles[:, None])
+    duplicate = dominated & ((iou > iou_threshold) | (clipped[:, None] & (contained > containment_threshold)))
+    keep[candidates[duplicate.any(dim=1)]] = False
+    return boxes, keep
@@ -0,0 +1,123 @@
+"""
+Per-host tuning profile: the caption batch size, torch thread counts and detection resolution
+that `python -m core_server.autotune` measured as fastest on this machine.
+"""
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import torch
+
+from .constants import AUTOTUNE_PROFILE_DIR, AUTOTUNE_ON_STARTUP
+
+
+@dataclass
+class TuningProfile:
+    imgsz: int
+    icon_process_batch_size: int
+    torch_threads: int
+    interop_threads: int
+    host: Dict[str, Any]  # `host_fingerprint` at tuning time, the profile is ignored when it changes
+    p50_ms: float
+    p90_ms: float
+    peak_memory_mib: Optional[float]
+    caption_seconds_per_crop: Optional[float] = None  # seeds the latency-budget estimate, see ImageProcessor.caption_estimate
+    created_at: float = field(default_factory=time.time)
+    measurements: List[Dict[str, Any]] = field(default_factory=list)  # every configuration the sweep measured
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def host_fingerprint(backend: str, quantize: bool) -> Dict[str, Any]:
+    """
+    What a profile was measured on, any change (other hardware, torch upgrade, backend) invalidates it
+    """
+    return {
+        "hostname": socket.gethostname(),
+        "cpu": cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "device": torch.cuda.get_device_name(0) if torch.cuda.is_available() else "cpu",
+        "torch": torch.__version__,
+        "backend": backend,
+        "quantize": quantize
+    }
+
+
+def profile_path(directory: str = AUTOTUNE_PROFILE_DIR) -> str:
+    return str(Path(directory) / f"{socket.gethostname()}.json")
+
+
+def save_profile(profile: TuningProfile, path: str) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(asdict(profile), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_profile(backend: str, quantize: bool, path: Optional[str] = None) -> Optional[TuningProfile]:
+    """
+    This host's profile, None when there is none or it was measured on a different setup
+    """
+    path = path or profile_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            profile = TuningProfile(**json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        print (f'Ignoring unreadable tuning profile {path}: {e}')
+        return None
+    if profile.host != host_fingerprint(backend, quantize):
+        print (f'Ignoring tuning profile {path}, it was measured on a different host or setup')
+        return None
+    return profile
+
+
+def ensure_profile(backend: str, quantize: bool, max_threads: Optional[int] = None) -> Optional[TuningProfile]:
+    """
+    This host's profile. With AUTOTUNE_ON_STARTUP a missing one is measured first, in a separate
+    process so the sweep's thread settings and memory don't carry over into the server.
+
+    Args:
+        max_threads: Tune for at most this many threads, the cores one pre-fork worker gets
+    """
+    profile = load_profile(backend, quantize)
+    if profile is None and AUTOTUNE_ON_STARTUP:
+        print ('No tuning profile for this host, running the autotuner')
+        command = [sys.executable, '-m', 'core_server.autotune', '--backend', backend]
+        if quantize:
+            command.append('--int8')
+        if max_threads:
+            command += ['--max-threads', str(max_threads)]
+        subprocess.run(command, check=False)
+        profile = load_profile(backend, quantize)
+    return profile
+
+
+def apply_threads(profile: TuningProfile, max_threads: Optional[int] = None) -> None:
+    """
+    Set this process's torch intra-op and inter-op thread counts from the profile
+    """
+    torch.set_num_threads(min(profile.torch_threads, max_threads) if max_threads else profile.torch_threads)
+    try:
+        torch.set_num_interop_threads(profile.interop_threads)
+    except RuntimeError:
+        # Only settable before any inter-op work has started in this process
+        pass
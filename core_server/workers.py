@@ -0,0 +1,166 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import threading
+import time
+
+# The pool job running on the current worker thread, see `track`
+_current = threading.local()
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the inference queue has no free slot, carries a retry hint in seconds
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def track(future: Future) -> Future:
+    """
+    Tie a future that the running pool job created (e.g. a MicroBatcher submission) to that job.
+    When the job's wait times out the future is cancelled too, so work it queued elsewhere is
+    dropped if it has not started yet. Outside a pool job this does nothing.
+    """
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        with job['lock']:
+            job['children'].append(future)
+            abandoned = job['abandoned']
+        if abandoned:
+            future.cancel()
+    return future
+
+
+class InferencePool:
+    """
+    Fixed pool of worker threads for blocking inference, with a bounded wait queue.
+
+    `run` is awaited from the event loop, so a long parse never blocks other requests.
+    When `max_queue_size` jobs are already waiting, new jobs are rejected with QueueFullError
+    instead of piling up.
+    """
+
+    def __init__(self, num_workers: int = 8, max_queue_size: int = 32):
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_times = deque(maxlen=1000)
+        self._service_times = deque(maxlen=100)
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Tuple[Any, float]:
+        """
+        Run `fn(*args)` on a worker
+
+        Returns:
+            Tuple of the function's result and the seconds the job waited in the queue
+
+        Raises:
+            QueueFullError: the wait queue is full
+            asyncio.TimeoutError: the job did not finish within `timeout` seconds
+        """
+        return await self.wait(self.submit(fn, *args), timeout)
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """
+        Queue `fn(*args)` without waiting for it, admission is decided right away
+
+        Raises:
+            QueueFullError: the wait queue is full
+        """
+        with self._lock:
+            if self._queued >= self.max_queue_size:
+                self.rejected += 1
+                raise QueueFullError(self.__retry_after())
+            self._queued += 1
+
+        submitted = time.monotonic()
+        timing = {}
+        job = {'lock': threading.Lock(), 'children': [], 'abandoned': False}
+
+        def task():
+            started = time.monotonic()
+            timing['wait'] = started - submitted
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_times.append(timing['wait'])
+            _current.job = job
+            try:
+                return fn(*args)
+            finally:
+                _current.job = None
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self._service_times.append(time.monotonic() - started)
+
+        future = self._executor.submit(task)
+        future.timing = timing
+        future.job = job
+        return future
+
+    async def wait(self, future: Future, timeout: Optional[float] = None) -> Tuple[Any, float]:
+        """
+        Await a job from `submit`, returns its result and queue wait in seconds.
+
+        On timeout the job is cancelled if it has not started, and so is every future it
+        registered with `track`. A batch the models are already running finishes anyway, its
+        result is discarded.
+        """
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+                # A job cancelled before it started never decrements the queue itself
+                if future.cancel():
+                    self._queued -= 1
+            self.__abandon(future.job)
+            raise
+        return result, future.timing['wait']
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._wait_times)
+            return {
+                "workers": self.num_workers,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "max_queue_size": self.max_queue_size,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "wait_mean_s": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95_s": waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_max_s": waits[-1] if waits else 0.0
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def __abandon(job: Dict[str, Any]) -> None:
+        with job['lock']:
+            job['abandoned'] = True
+            children: List[Future] = list(job['children'])
+        for child in children:
+            child.cancel()
+
+    def __retry_after(self) -> int:
+        # Time for the workers to drain what is already queued and running
+        if not self._service_times:
+            return 1
+        mean_service = sum(self._service_times) / len(self._service_times)
+        backlog = self._queued + self._running
+        return max(1, math.ceil(mean_service * backlog / self.num_workers))
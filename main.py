@@ -206,6 +206,8 @@ class ScreenshotApp(QMainWindow):
             response = requests.get(f"{ENDPOINT}/{labeled_image_path}")
             print(f"[DEBUG] Download response status: {response.status_code}")
             image_name = os.path.basename(labeled_image_path)
+            if 'result_id' in json_response:
+                image_name = f"{json_response['result_id']}-{image_name}"
             downloaded_image_path = os.path.join(SCREENSHOT_DIR, image_name)
             with open(downloaded_image_path, 'wb') as f:
                 f.write(response.content)
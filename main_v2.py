@@ -3,48 +3,180 @@ import os
 import mss
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, 
-    QPushButton, QLabel, QTextEdit, QFrame, QProgressBar
+    QPushButton, QLabel, QTextEdit, QFrame, QProgressBar, QHBoxLayout, QCheckBox, QToolTip,
+    QComboBox, QDialog, QRubberBand
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject
-from PyQt6.QtGui import QPixmap, QImage
-from PIL import Image
+from PyQt6.QtCore import Qt, QThread, QTimer, QRect, QRectF, QSize, pyqtSignal, QObject
+from PyQt6.QtGui import QPixmap, QImage, QPainter, QPen, QColor
+from PIL import Image, ImageChops
 import requests
 from io import BytesIO
 import json
 import time
+from array import array
+from collections import deque
 
 ENDPOINT = "http://localhost:8000"
 PARSE_API = "parse-screenshot"
 SCREENSHOT_DIR = os.path.expanduser("~/Desktop/screenshots")
+# Ask the server for the columnar MessagePack response instead of JSON (needs `msgpack`)
+COMPACT_RESPONSES = False
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Captures are encoded in memory and uploaded directly: "png", "webp" or "jpeg"
+CAPTURE_FORMAT = "png"
+CAPTURE_PNG_LEVEL = 1  # zlib level, far faster than the default 6 for slightly larger uploads
+CAPTURE_QUALITY = 85  # webp / jpeg
+# Downscale so the long side is at most this many pixels before upload, None keeps full resolution.
+# The server detects in one pass up to 2560 (ADAPTIVE_MAX_IMGSZ * ADAPTIVE_MAX_DOWNSCALE) and tiles above
+CAPTURE_MAX_SIDE = None
+# Also write every capture to SCREENSHOT_DIR
+SAVE_SCREENSHOTS = False
+# Draw boxes and indices from label_coordinates over the capture instead of downloading the server-rendered image
+CLIENT_OVERLAY = True
+CAPTURE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+# Live mode capture rate. A frame is skipped as unchanged when no pixel of its greyscale
+# LIVE_THUMBNAIL_SIZE thumbnail differs from the last sent frame's by more than LIVE_DIFF_LEVEL
+LIVE_CAPTURE_FPS = 2.0
+LIVE_THUMBNAIL_SIZE = (160, 90)
+LIVE_DIFF_LEVEL = 8
+LIVE_FPS_WINDOW = 10  # parsed frames the displayed rate is averaged over
+
+# One keep-alive connection for every upload and download
+HTTP_SESSION = requests.Session()
+
+
+def capture_region(sct, target=None):
+    """
+    What to grab: `target` (one monitor or a selected region, in mss coordinates), or every monitor
+    """
+    return target or sct.monitors[0]
+
+
+def frame_thumbnail(sct_img):
+    return Image.frombuffer('RGB', sct_img.size, sct_img.bgra, 'raw', 'BGRX').resize(
+        LIVE_THUMBNAIL_SIZE, Image.Resampling.BOX
+    ).convert('L')
+
+
+def frames_match(thumbnail, previous):
+    changed = ImageChops.difference(thumbnail, previous).point(lambda v: 255 if v > LIVE_DIFF_LEVEL else 0)
+    return changed.getbbox() is None
+
+
+def encode_capture(sct_img, fmt=CAPTURE_FORMAT, quality=CAPTURE_QUALITY, png_level=CAPTURE_PNG_LEVEL, max_side=CAPTURE_MAX_SIDE):
+    """
+    Encode an mss grab straight from its BGRA buffer, without a round trip through disk
+
+    Returns:
+        The encoded bytes and the scale applied to the capture (1.0 when not downscaled)
+    """
+    if fmt not in CAPTURE_MEDIA_TYPES:
+        raise ValueError(f"fmt must be one of {', '.join(CAPTURE_MEDIA_TYPES)}")
+    image = Image.frombuffer('RGB', sct_img.size, sct_img.bgra, 'raw', 'BGRX')
+    scale = 1.0
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.BILINEAR)
+
+    buffer = BytesIO()
+    if fmt == "png":
+        image.save(buffer, format='PNG', compress_level=png_level)
+    elif fmt == "webp":
+        image.save(buffer, format='WEBP', quality=quality, method=0)
+    else:
+        image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue(), scale
+
+
+def capture_to_qimage(sct_img):
+    # mss' BGRA rows are QImage's RGB32 layout, copied so the image outlives the grab
+    return QImage(sct_img.bgra, sct_img.width, sct_img.height, QImage.Format.Format_RGB32).copy()
+
+
+def unpack_compact(content):
+    """
+    Rebuild the JSON response shape from the server's columnar MessagePack encoding
+    """
+    import msgpack
+    payload = msgpack.unpackb(content, raw=False)
+    count = payload.pop('count')
+    boxes, bbox = array('f'), array('f')
+    boxes.frombytes(payload.pop('boxes'))
+    bbox.frombytes(payload.pop('bbox'))
+    if sys.byteorder == 'big':
+        boxes.byteswap()
+        bbox.byteswap()
+    columns = payload.pop('columns')
+    payload['label_coordinates'] = {str(i): list(boxes[i * 4:i * 4 + 4]) for i in range(count)}
+    payload['parsed_content_list'] = [
+        {'bbox': list(bbox[i * 4:i * 4 + 4]), **{field: values[i] for field, values in columns.items()}}
+        for i in range(count)
+    ]
+    return payload
 
 class NetworkWorker(QObject):
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
     progress = pyqtSignal(str)
 
-    def __init__(self, file_path):
+    def __init__(
+        self, image_bytes, filename, media_type="image/png", compact=COMPACT_RESPONSES, timing=None,
+        capture=None, download_labeled=not CLIENT_OVERLAY
+    ):
+        """
+        Args:
+            image_bytes: Encoded capture, or None to encode `capture` on the worker thread
+            timing: Client-side timings so far, `captured_at` (perf_counter at capture) and
+                per-step milliseconds, completed with the upload and reported with the result
+            capture: Raw mss grab, used when `image_bytes` is None
+            download_labeled: Fetch the server-rendered labeled image
+        """
         super().__init__()
-        self.file_path = file_path
+        self.image_bytes = image_bytes
+        self.filename = filename
+        self.media_type = media_type
+        self.compact = compact
+        self.timing = dict(timing or {})
+        self.capture = capture
+        self.download_labeled = download_labeled
 
     def process_request(self):
         try:
+            if self.image_bytes is None:
+                start = time.perf_counter()
+                self.image_bytes, self.timing['scale'] = encode_capture(self.capture)
+                self.timing['encode_ms'] = (time.perf_counter() - start) * 1000
             self.progress.emit("Sending file to server...")
-            files = {
-                'file': (os.path.basename(self.file_path), 
-                        open(self.file_path, 'rb'), 
-                        'image/png')
-            }
+            files = {'file': (self.filename, self.image_bytes, self.media_type)}
             
-            response = requests.post(f"{ENDPOINT}/{PARSE_API}", files=files)
-            data = response.json()
+            headers = {'Accept': MSGPACK_MEDIA_TYPE} if self.compact else {}
+            start = time.perf_counter()
+            response = HTTP_SESSION.post(f"{ENDPOINT}/{PARSE_API}", files=files, headers=headers)
+            response.raise_for_status()
+            if response.headers.get('Content-Type', '').startswith(MSGPACK_MEDIA_TYPE):
+                data = unpack_compact(response.content)
+            else:
+                data = response.json()
+            self.timing['upload_parse_ms'] = (time.perf_counter() - start) * 1000
+            captured_at = self.timing.pop('captured_at', None)
+            if captured_at is not None:
+                self.timing['capture_to_response_ms'] = (time.perf_counter() - captured_at) * 1000
+            self.timing['upload_bytes'] = len(self.image_bytes)
+            print("[TIMING] " + ' '.join(
+                f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}" for key, value in self.timing.items()
+            ))
+            data['client_timing'] = self.timing
             
-            if 'labeled_image_path' in data:
+            if 'labeled_image_path' in data and self.download_labeled:
                 self.progress.emit("Downloading labeled image...")
                 labeled_image_path = data['labeled_image_path']
-                img_response = requests.get(f"{ENDPOINT}/{labeled_image_path}")
+                img_response = HTTP_SESSION.get(f"{ENDPOINT}/{labeled_image_path}")
                 
                 # Save the labeled image
                 image_name = os.path.basename(labeled_image_path)
+                if 'result_id' in data:
+                    image_name = f"{data['result_id']}-{image_name}"
                 downloaded_image_path = os.path.join(SCREENSHOT_DIR, image_name)
                 with open(downloaded_image_path, 'wb') as f:
                     f.write(img_response.content)
@@ -55,6 +187,171 @@ class NetworkWorker(QObject):
         except Exception as e:
             self.error.emit(str(e))
 
+class OverlayView(QLabel):
+    """
+    Screenshot with the parsed elements' boxes and label indices painted over it, hovering
+    a box shows its content
+    """
+    TYPE_COLORS = {'text': QColor(33, 150, 243), 'icon': QColor(76, 175, 80)}
+
+    def __init__(self, text=""):
+        super().__init__(text)
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setMouseTracking(True)
+        self.image = None
+        self.scaled = None
+        self.elements = []  # (index, rect in capture pixels, type, content)
+        self.visible_types = set(self.TYPE_COLORS)
+
+    def set_result(self, image, label_coordinates, parsed_content_list, scale=1.0):
+        """
+        Args:
+            image: The capture as a QImage
+            label_coordinates: xywh boxes in uploaded-image pixels, keyed by label index
+            scale: Downscale applied to the capture before upload
+        """
+        self.image = image
+        self.rescale()
+        self.elements = []
+        for key, (x, y, w, h) in label_coordinates.items():
+            index = int(key)
+            elem = parsed_content_list[index] if index < len(parsed_content_list) else {}
+            rect = QRectF(x / scale, y / scale, w / scale, h / scale)
+            self.elements.append((index, rect, elem.get('type', 'icon'), elem.get('content')))
+        self.update()
+
+    def rescale(self):
+        self.scaled = QPixmap.fromImage(self.image).scaled(
+            self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+
+    def resizeEvent(self, event):
+        if self.image is not None:
+            self.rescale()
+        super().resizeEvent(event)
+
+    def clear_result(self):
+        self.image = None
+        self.scaled = None
+        self.elements = []
+
+    def set_type_visible(self, elem_type, visible):
+        if visible:
+            self.visible_types.add(elem_type)
+        else:
+            self.visible_types.discard(elem_type)
+        self.update()
+
+    def image_rect(self):
+        # Where the scaled capture sits, centred in the label
+        return QRectF(
+            (self.width() - self.scaled.width()) / 2, (self.height() - self.scaled.height()) / 2,
+            self.scaled.width(), self.scaled.height()
+        )
+
+    def paintEvent(self, event):
+        if self.image is None:
+            return super().paintEvent(event)
+        painter = QPainter(self)
+        target = self.image_rect()
+        painter.drawPixmap(target.topLeft(), self.scaled)
+        ratio = target.width() / self.image.width()
+        metrics = painter.fontMetrics()
+        for index, rect, elem_type, _ in self.elements:
+            if elem_type not in self.visible_types:
+                continue
+            color = self.TYPE_COLORS.get(elem_type, QColor(244, 67, 54))
+            box = QRectF(target.x() + rect.x() * ratio, target.y() + rect.y() * ratio, rect.width() * ratio, rect.height() * ratio)
+            painter.setPen(QPen(color, 1))
+            painter.drawRect(box)
+            label = str(index)
+            tag = QRectF(box.x(), box.y(), metrics.horizontalAdvance(label) + 4, metrics.height())
+            painter.fillRect(tag, color)
+            painter.setPen(Qt.GlobalColor.white)
+            painter.drawText(tag, Qt.AlignmentFlag.AlignCenter, label)
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        if self.image is None:
+            return super().mouseMoveEvent(event)
+        target = self.image_rect()
+        ratio = target.width() / self.image.width()
+        pos = event.position()
+        x, y = (pos.x() - target.x()) / ratio, (pos.y() - target.y()) / ratio
+        # The innermost box under the cursor
+        hits = [
+            (rect.width() * rect.height(), index, elem_type, content)
+            for index, rect, elem_type, content in self.elements
+            if elem_type in self.visible_types and rect.contains(x, y)
+        ]
+        if hits:
+            _, index, elem_type, content = min(hits, key=lambda hit: hit[0])
+            QToolTip.showText(event.globalPosition().toPoint(), f"{index} ({elem_type}): {content}", self)
+        else:
+            QToolTip.hideText()
+
+class RegionSelector(QDialog):
+    """
+    Full-screen preview of a capture to drag a rectangle on, `region` is then x1, y1, x2, y2
+    in capture pixels
+    """
+
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.scaled = None
+        self.region = None
+        self.origin = None
+        self.band = QRubberBand(QRubberBand.Shape.Rectangle, self)
+        self.setWindowFlag(Qt.WindowType.FramelessWindowHint)
+        self.setCursor(Qt.CursorShape.CrossCursor)
+
+    def image_rect(self):
+        return QRectF(
+            (self.width() - self.scaled.width()) / 2, (self.height() - self.scaled.height()) / 2,
+            self.scaled.width(), self.scaled.height()
+        )
+
+    def resizeEvent(self, event):
+        self.scaled = QPixmap.fromImage(self.image).scaled(
+            self.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+        if self.scaled is not None:
+            painter.drawPixmap(self.image_rect().topLeft(), self.scaled)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        self.origin = event.position().toPoint()
+        self.band.setGeometry(QRect(self.origin, QSize()))
+        self.band.show()
+
+    def mouseMoveEvent(self, event):
+        if self.origin is not None:
+            self.band.setGeometry(QRect(self.origin, event.position().toPoint()).normalized())
+
+    def mouseReleaseEvent(self, event):
+        if self.origin is None:
+            return
+        selection = self.band.geometry()
+        self.origin = None
+        target = self.image_rect()
+        ratio = self.image.width() / target.width()
+        x1 = max(0, round((selection.left() - target.x()) * ratio))
+        y1 = max(0, round((selection.top() - target.y()) * ratio))
+        x2 = min(self.image.width(), round((selection.right() - target.x()) * ratio))
+        y2 = min(self.image.height(), round((selection.bottom() - target.y()) * ratio))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            # A click or a tiny drag, let the user try again
+            self.band.hide()
+            return
+        self.region = (x1, y1, x2, y2)
+        self.accept()
+
 class NetworkThread(QThread):
     def __init__(self, worker):
         super().__init__()
@@ -94,9 +391,8 @@ class ScreenshotApp(QMainWindow):
         """)
         self.image_frame.setFixedSize(960, 450)
 
-        # Image label
-        self.image_label = QLabel("Image will appear here")
-        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # Image label, also paints the parsed elements over the capture
+        self.image_label = OverlayView("Image will appear here")
         image_layout = QVBoxLayout(self.image_frame)
         image_layout.addWidget(self.image_label)
 
@@ -139,14 +435,75 @@ class ScreenshotApp(QMainWindow):
         self.progress_bar.setFixedSize(200, 20)
         self.progress_bar.hide()
 
+        # Live mode button, captures continuously until pressed again
+        self.live_button = QPushButton("Start Live")
+        self.live_button.setFixedSize(200, 50)
+        self.live_button.setStyleSheet("""
+            QPushButton {
+                background-color: #2196F3;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #1e88e5;
+            }
+            QPushButton:pressed {
+                background-color: #1976d2;
+            }
+        """)
+        self.live_button.clicked.connect(self.toggle_live)
+        self.live_status = QLabel("")
+
+        # What to capture: every monitor, one monitor, or a region dragged on a preview
+        self.capture_target = None
+        self.target_box = QComboBox()
+        self.target_box.addItem("All monitors", 0)
+        with mss.mss() as sct:
+            for n in range(1, len(sct.monitors)):
+                self.target_box.addItem(f"Monitor {n}", n)
+        self.target_box.addItem("Select region...", -1)
+        self.target_box.activated.connect(self.choose_capture_target)
+        self.target_index = 0
+
+        # Element types drawn by the overlay
+        self.type_toggles = []
+        for elem_type, title in (('text', "Text"), ('icon', "Icons")):
+            toggle = QCheckBox(title)
+            toggle.setChecked(True)
+            toggle.toggled.connect(lambda checked, elem_type=elem_type: self.image_label.set_type_visible(elem_type, checked))
+            self.type_toggles.append(toggle)
+
         # Add widgets to layout
         self.layout.addWidget(self.text_area)
-        self.layout.addWidget(self.screenshot_button, alignment=Qt.AlignmentFlag.AlignCenter)
+        button_row = QHBoxLayout()
+        button_row.addStretch()
+        button_row.addWidget(self.screenshot_button)
+        button_row.addWidget(self.live_button)
+        button_row.addWidget(self.target_box)
+        for toggle in self.type_toggles:
+            button_row.addWidget(toggle)
+        button_row.addWidget(self.live_status)
+        button_row.addStretch()
+        self.layout.addLayout(button_row)
         self.layout.addWidget(self.progress_bar, alignment=Qt.AlignmentFlag.AlignCenter)
 
         # Initialize thread-related variables
         self.network_thread = None
         self.network_worker = None
+        self.shot_capture = None
+
+        # Live mode state: at most one frame in flight and one queued, a newer frame replaces the queued one
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.capture_live_frame)
+        self.live_sct = None
+        self.live_last_thumbnail = None
+        self.live_pending = None
+        self.live_in_flight = None
+        self.live_stats = {}
+        self.live_parsed_at = deque(maxlen=LIVE_FPS_WINDOW)
 
     def take_screenshot(self):
         try:
@@ -160,31 +517,38 @@ class ScreenshotApp(QMainWindow):
             QApplication.processEvents()
             
             # Take screenshot
-            file_path = os.path.join(SCREENSHOT_DIR, "screenshot.png")
-            print(f"[DEBUG] Screenshot will be saved to: {file_path}")
             with mss.mss() as sct:
                 print("[DEBUG] MSS initialized")
-                monitor = sct.monitors[0]
-                bbox = {
-                    'top': 0, 
-                    'left': 0, 
-                    'width': monitor['width'], 
-                    'height': monitor['height']
-                }
-                sct_img = sct.grab(bbox)
-                mss.tools.to_png(sct_img.rgb, sct_img.size, output=file_path)
-                print("[DEBUG] Screenshot saved successfully")
+                captured_at = time.perf_counter()
+                sct_img = sct.grab(capture_region(sct, self.capture_target))
+                capture_ms = (time.perf_counter() - captured_at) * 1000
+
+            # Encode in memory with the configured format
+            start = time.perf_counter()
+            image_bytes, scale = encode_capture(sct_img)
+            encode_ms = (time.perf_counter() - start) * 1000
+            filename = f"screenshot.{CAPTURE_FORMAT}"
+            print(f"[DEBUG] Screenshot encoded as {CAPTURE_FORMAT} ({len(image_bytes)} bytes, scale {scale:.2f})")
+
+            self.shot_capture = sct_img
 
             # Show window again
             self.setWindowState(Qt.WindowState.WindowNoState)
             self.showNormal()
             
             # Display the screenshot
-            self.display_image(file_path)
-            self.text_area.append(f"\nScreenshot saved to: {file_path}")
+            self.display_image(image_bytes)
+            if SAVE_SCREENSHOTS:
+                file_path = os.path.join(SCREENSHOT_DIR, filename)
+                with open(file_path, 'wb') as f:
+                    f.write(image_bytes)
+                self.text_area.append(f"\nScreenshot saved to: {file_path}")
             
             # Start network request in background
-            self.start_network_request(file_path)
+            self.start_network_request(image_bytes, filename, {
+                'format': CAPTURE_FORMAT, 'scale': scale, 'captured_at': captured_at,
+                'capture_ms': capture_ms, 'encode_ms': encode_ms
+            })
 
         except Exception as e:
             print(f"[ERROR] Screenshot capture failed: {str(e)}")
@@ -192,14 +556,16 @@ class ScreenshotApp(QMainWindow):
             self.show()
             self.showNormal()
 
-    def start_network_request(self, file_path):
+    def start_network_request(self, image_bytes, filename, timing=None, **worker_options):
         # Clean up any existing thread
         if self.network_thread is not None:
             self.network_thread.quit()
             self.network_thread.wait()
 
         # Create new worker and thread
-        self.network_worker = NetworkWorker(file_path)
+        self.network_worker = NetworkWorker(
+            image_bytes, filename, CAPTURE_MEDIA_TYPES[CAPTURE_FORMAT], timing=timing, **worker_options
+        )
         self.network_thread = NetworkThread(self.network_worker)
 
         # Connect signals
@@ -209,8 +575,9 @@ class ScreenshotApp(QMainWindow):
         self.network_thread.finished.connect(self.cleanup_network_thread)
 
         # Show progress bar and start thread
-        self.progress_bar.setRange(0, 0)  # Indeterminate progress
-        self.progress_bar.show()
+        if not self.live_timer.isActive():
+            self.progress_bar.setRange(0, 0)  # Indeterminate progress
+            self.progress_bar.show()
         self.screenshot_button.setEnabled(False)
         self.network_thread.start()
 
@@ -225,9 +592,19 @@ class ScreenshotApp(QMainWindow):
                 ])
                 self.text_area.setText(content_text)
 
-            # Display the labeled image if available
-            if 'downloaded_image_path' in data:
+            # Draw the elements over the capture, or display the labeled image if downloaded
+            capture = self.live_in_flight if self.live_in_flight is not None else self.shot_capture
+            if CLIENT_OVERLAY and 'label_coordinates' in data and capture is not None:
+                self.show_overlay(capture, data)
+            elif 'downloaded_image_path' in data:
                 self.display_image(data['downloaded_image_path'])
+            elif self.live_in_flight is not None:
+                self.display_image(capture_to_qimage(self.live_in_flight))
+
+            if self.live_in_flight is not None:
+                self.live_stats['parsed'] += 1
+                self.live_parsed_at.append(time.perf_counter())
+                self.update_live_status()
 
         except Exception as e:
             print(f"[ERROR] Failed to process network response: {str(e)}")
@@ -235,29 +612,164 @@ class ScreenshotApp(QMainWindow):
 
         finally:
             self.progress_bar.hide()
-            self.screenshot_button.setEnabled(True)
+            self.screenshot_button.setEnabled(not self.live_timer.isActive())
 
     def handle_network_error(self, error_message):
         self.text_area.append(f"\nNetwork error: {error_message}")
         self.progress_bar.hide()
-        self.screenshot_button.setEnabled(True)
+        self.screenshot_button.setEnabled(not self.live_timer.isActive())
 
     def handle_progress_update(self, message):
-        self.text_area.append(f"\n{message}")
+        if self.live_in_flight is None:
+            self.text_area.append(f"\n{message}")
 
     def cleanup_network_thread(self):
         self.network_thread = None
         self.network_worker = None
-
-    def display_image(self, image_path):
-        print(f"\n[DEBUG] display_image: Loading image from {image_path}")
+        self.live_in_flight = None
+        # Send the newest frame captured while the previous one was being parsed
+        if self.live_pending is not None:
+            frame, self.live_pending = self.live_pending, None
+            self.send_live_frame(frame)
+
+    def choose_capture_target(self, index):
+        choice = self.target_box.itemData(index)
+        if choice == -1:
+            if not self.select_region():
+                self.target_box.setCurrentIndex(self.target_index)
+                return
+        else:
+            with mss.mss() as sct:
+                self.capture_target = dict(sct.monitors[choice]) if choice else None
+        self.target_index = index
+        print(f"[DEBUG] Capture target: {self.capture_target or 'all monitors'}")
+
+    def select_region(self):
+        """
+        Drag a rectangle on a capture of every monitor, it becomes the capture target
+
+        Returns:
+            Whether a region was selected
+        """
+        self.hide()
+        QApplication.processEvents()
+        with mss.mss() as sct:
+            monitor = sct.monitors[0]
+            sct_img = sct.grab(monitor)
+        self.show()
+
+        selector = RegionSelector(capture_to_qimage(sct_img))
+        selector.setWindowState(Qt.WindowState.WindowFullScreen)
+        if selector.exec() != QDialog.DialogCode.Accepted or selector.region is None:
+            return False
+        # Capture pixels to mss coordinates, which differ on HiDPI screens
+        ratio = monitor['width'] / sct_img.width
+        x1, y1, x2, y2 = selector.region
+        self.capture_target = {
+            'left': monitor['left'] + round(x1 * ratio), 'top': monitor['top'] + round(y1 * ratio),
+            'width': round((x2 - x1) * ratio), 'height': round((y2 - y1) * ratio)
+        }
+        self.target_box.setItemText(self.target_box.count() - 1, f"Region {x2 - x1}x{y2 - y1}")
+        return True
+
+    def toggle_live(self):
+        if self.live_timer.isActive():
+            self.stop_live()
+        else:
+            self.start_live()
+
+    def start_live(self):
+        self.live_sct = mss.mss()
+        self.live_last_thumbnail = None
+        self.live_pending = None
+        self.live_stats = {'captured': 0, 'unchanged': 0, 'dropped': 0, 'parsed': 0}
+        self.live_parsed_at.clear()
+        self.live_timer.start(int(1000 / LIVE_CAPTURE_FPS))
+        self.live_button.setText("Stop Live")
+        self.screenshot_button.setEnabled(False)
+        self.text_area.setText(f"Live capture at {LIVE_CAPTURE_FPS} fps...")
+        print(f"[DEBUG] Live capture started at {LIVE_CAPTURE_FPS} fps")
+
+    def stop_live(self):
+        self.live_timer.stop()
+        self.live_pending = None
+        if self.live_sct is not None:
+            self.live_sct.close()
+            self.live_sct = None
+        self.live_button.setText("Start Live")
+        self.screenshot_button.setEnabled(self.network_thread is None)
+        print(f"[DEBUG] Live capture stopped: {self.live_stats}")
+
+    def capture_live_frame(self):
+        try:
+            captured_at = time.perf_counter()
+            sct_img = self.live_sct.grab(capture_region(self.live_sct, self.capture_target))
+            timing = {'format': CAPTURE_FORMAT, 'captured_at': captured_at, 'capture_ms': (time.perf_counter() - captured_at) * 1000}
+            thumbnail = frame_thumbnail(sct_img)
+        except Exception as e:
+            print(f"[ERROR] Live capture failed: {str(e)}")
+            self.text_area.append(f"\nLive capture failed: {str(e)}")
+            self.stop_live()
+            return
+
+        self.live_stats['captured'] += 1
+        if self.live_last_thumbnail is not None and frames_match(thumbnail, self.live_last_thumbnail):
+            self.live_stats['unchanged'] += 1
+        else:
+            self.live_last_thumbnail = thumbnail
+            if self.network_thread is None:
+                self.send_live_frame((sct_img, timing))
+            else:
+                # Latest frame wins, a queued frame that was never sent is replaced by this newer one
+                if self.live_pending is not None:
+                    self.live_stats['dropped'] += 1
+                self.live_pending = (sct_img, timing)
+        self.update_live_status()
+
+    def send_live_frame(self, frame):
+        sct_img, timing = frame
+        self.live_in_flight = sct_img
+        # Encoded on the worker thread so the timer keeps its rate, the labeled image is not downloaded
+        self.start_network_request(None, f"live.{CAPTURE_FORMAT}", timing, capture=sct_img, download_labeled=False)
+
+    def update_live_status(self):
+        parsed_at = self.live_parsed_at
+        elapsed = parsed_at[-1] - parsed_at[0] if len(parsed_at) > 1 else 0
+        fps = (len(parsed_at) - 1) / elapsed if elapsed > 0 else 0.0
+        self.live_status.setText(
+            f"{fps:.1f} fps parsed | captured {self.live_stats['captured']} | "
+            f"unchanged {self.live_stats['unchanged']} | dropped {self.live_stats['dropped']}"
+        )
+
+    def show_image_frame(self):
+        # Insert image on top
+        if self.image_frame not in [child for child in self.layout.children()]:
+            self.layout.insertWidget(0, self.image_frame)
+
+    def show_overlay(self, capture, data):
+        self.show_image_frame()
+        self.image_label.set_result(
+            capture_to_qimage(capture), data['label_coordinates'], data.get('parsed_content_list', []),
+            data.get('client_timing', {}).get('scale', 1.0)
+        )
+
+    def display_image(self, image):
+        """
+        Show an image file path, encoded image bytes or QImage
+        """
+        print(f"\n[DEBUG] display_image: Loading image from {image if isinstance(image, str) else 'memory'}")
         try:
-            # Insert image on top
-            if self.image_frame not in [child for child in self.layout.children()]:
-                self.layout.insertWidget(0, self.image_frame)
+            self.show_image_frame()
+            self.image_label.clear_result()
 
             # Load and resize image
-            pixmap = QPixmap(image_path)
+            if isinstance(image, str):
+                pixmap = QPixmap(image)
+            elif isinstance(image, QImage):
+                pixmap = QPixmap.fromImage(image)
+            else:
+                pixmap = QPixmap()
+                pixmap.loadFromData(image)
             scaled_pixmap = pixmap.scaled(
                 940, 440,
                 Qt.AspectRatioMode.KeepAspectRatio,
@@ -0,0 +1,175 @@
+"""
+The vectorized box merge (`core_server.overlap.merge_elements`) must return exactly what
+OmniParser's `remove_overlap_new` returns, on the dense path and the grid prefilter alike.
+The reference below is a copy of remove_overlap_new, so this runs without OmniParser.
+
+    python -m pytest tests
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import random
+
+import pytest
+
+from core_server import overlap
+from core_server.overlap import merge_elements
+
+CASES = 500
+
+
+def remove_overlap_new(boxes: List[Dict[str, Any]], iou_threshold: float, ocr_bbox: Optional[List[Dict[str, Any]]] = None) -> list:
+    # OmniParser's utils.remove_overlap_new, unchanged apart from formatting
+    def box_area(box):
+        return (box[2] - box[0]) * (box[3] - box[1])
+
+    def intersection_area(box1, box2):
+        x1 = max(box1[0], box2[0])
+        y1 = max(box1[1], box2[1])
+        x2 = min(box1[2], box2[2])
+        y2 = min(box1[3], box2[3])
+        return max(0, x2 - x1) * max(0, y2 - y1)
+
+    def IoU(box1, box2):
+        intersection = intersection_area(box1, box2)
+        union = box_area(box1) + box_area(box2) - intersection + 1e-6
+        if box_area(box1) > 0 and box_area(box2) > 0:
+            ratio1 = intersection / box_area(box1)
+            ratio2 = intersection / box_area(box2)
+        else:
+            ratio1, ratio2 = 0, 0
+        return max(intersection / union, ratio1, ratio2)
+
+    def is_inside(box1, box2):
+        intersection = intersection_area(box1, box2)
+        ratio1 = intersection / box_area(box1)
+        return ratio1 > 0.80
+
+    filtered_boxes = []
+    if ocr_bbox:
+        filtered_boxes.extend(ocr_bbox)
+    for i, box1_elem in enumerate(boxes):
+        box1 = box1_elem['bbox']
+        is_valid_box = True
+        for j, box2_elem in enumerate(boxes):
+            # keep the smaller box
+            box2 = box2_elem['bbox']
+            if i != j and IoU(box1, box2) > iou_threshold and box_area(box1) > box_area(box2):
+                is_valid_box = False
+                break
+        if is_valid_box:
+            if ocr_bbox:
+                # keep yolo boxes + prioritize ocr label
+                box_added = False
+                ocr_labels = ''
+                for box3_elem in ocr_bbox:
+                    if not box_added:
+                        box3 = box3_elem['bbox']
+                        if is_inside(box3, box1):  # ocr inside icon
+                            try:
+                                # gather all ocr labels
+                                ocr_labels += box3_elem['content'] + ' '
+                                filtered_boxes.remove(box3_elem)
+                            except Exception:
+                                continue
+                        elif is_inside(box1, box3):  # icon inside ocr
+                            box_added = True
+                            break
+                        else:
+                            continue
+                if not box_added:
+                    if ocr_labels:
+                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': ocr_labels, 'source': 'box_yolo_content_ocr'})
+                    else:
+                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'})
+            else:
+                filtered_boxes.append(box1)
+    return filtered_boxes
+
+
+def reference_merge(icons: List[Dict[str, Any]], ocr: List[Dict[str, Any]], iou_threshold: float) -> List[Dict[str, Any]]:
+    # Without OCR boxes remove_overlap_new returns bare bboxes, merge_elements always returns elements
+    result = remove_overlap_new(boxes=copy.deepcopy(icons), iou_threshold=iou_threshold, ocr_bbox=copy.deepcopy(ocr) or None)
+    return [
+        elem if isinstance(elem, dict) else
+        {'type': 'icon', 'bbox': elem, 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'}
+        for elem in result
+    ]
+
+
+def random_case(rng: random.Random) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], float]:
+    """
+    Nested and duplicate boxes, boxes snapped to a coarse grid so edges coincide, empty OCR
+    text and negative thresholds
+    """
+    snapped = rng.random() < 0.5
+
+    def coord() -> float:
+        return rng.randint(0, 20) / 20 if snapped else rng.random()
+
+    def box() -> List[float]:
+        x1, x2 = sorted((coord(), coord()))
+        y1, y2 = sorted((coord(), coord()))
+        if x2 - x1 < 0.01 or y2 - y1 < 0.01:
+            return [0.1, 0.1, 0.2, 0.2]
+        return [x1, y1, x2, y2]
+
+    icons = [{'type': 'icon', 'bbox': box(), 'interactivity': True, 'content': None} for _ in range(rng.randint(0, 30))]
+    ocr = [
+        {'type': 'text', 'bbox': box(), 'interactivity': False, 'content': rng.choice(['a', 'b', '']), 'source': 'box_ocr_content_ocr'}
+        for _ in range(rng.randint(0, 30))
+    ]
+    if icons and rng.random() < 0.3:
+        icons.append(copy.deepcopy(rng.choice(icons)))
+    if ocr and rng.random() < 0.3:
+        ocr.append(copy.deepcopy(rng.choice(ocr)))
+    for icon in icons[:rng.randint(0, 3)]:
+        x1, y1, x2, y2 = icon['bbox']
+        inset = min(x2 - x1, y2 - y1) / 10
+        ocr.insert(rng.randint(0, len(ocr)), {
+            'type': 'text', 'bbox': [x1 + inset, y1 + inset, x2 - inset, y2 - inset],
+            'interactivity': False, 'content': 'inside', 'source': 'box_ocr_content_ocr'
+        })
+    return icons, ocr, rng.choice([0.9, 0.7, 0.5, 0.1, 0.0, -0.1])
+
+
+def dense_screen(total: int, seed: int = 0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Rows of OCR words, with every fifth box an icon detected around a word or standing alone
+    """
+    rng = random.Random(seed)
+    rows = max(1, int((total / 12) ** 0.5 * 1.5))
+    per_row = max(1, total // rows)
+    icons, ocr = [], []
+    for n in range(total):
+        row, col = divmod(n, per_row)
+        x = col / per_row + rng.random() * 0.2 / per_row
+        y = row / rows + rng.random() * 0.2 / rows
+        w, h = 0.7 / per_row * rng.uniform(0.6, 1.0), 0.6 / rows
+        if n % 5 == 0:
+            pad = rng.choice([0.0, 0.1]) * w
+            icons.append({'type': 'icon', 'bbox': [x - pad, y - pad, x + w + pad, y + h + pad], 'interactivity': True, 'content': None})
+        else:
+            ocr.append({'type': 'text', 'bbox': [x, y, x + w, y + h], 'interactivity': False, 'content': f"w{n}", 'source': 'box_ocr_content_ocr'})
+    return icons, ocr
+
+
+@pytest.mark.parametrize("dense_max_pairs", [overlap.DENSE_MAX_PAIRS, 0], ids=["dense", "grid"])
+def test_random_boxes_match_reference(monkeypatch, dense_max_pairs):
+    monkeypatch.setattr(overlap, "DENSE_MAX_PAIRS", dense_max_pairs)
+    for seed in range(CASES):
+        icons, ocr, iou_threshold = random_case(random.Random(seed))
+        assert merge_elements(icons, ocr, iou_threshold) == reference_merge(icons, ocr, iou_threshold), (
+            f"seed {seed}, {len(icons)} icons, {len(ocr)} OCR boxes, iou_threshold={iou_threshold}"
+        )
+
+
+@pytest.mark.parametrize("dense_max_pairs", [overlap.DENSE_MAX_PAIRS, 0], ids=["dense", "grid"])
+@pytest.mark.parametrize("total", [100, 1000])
+def test_dense_screen_matches_reference(monkeypatch, dense_max_pairs, total):
+    monkeypatch.setattr(overlap, "DENSE_MAX_PAIRS", dense_max_pairs)
+    icons, ocr = dense_screen(total)
+    assert merge_elements(icons, ocr, 0.7) == reference_merge(icons, ocr, 0.7)
+
+
+def test_empty_input():
+    assert merge_elements([], [], 0.7) == reference_merge([], [], 0.7)